@@ -0,0 +1,189 @@
+import time
+import uuid
+
+import numpy as np
+from faker import Faker
+from werkzeug.security import generate_password_hash
+
+import config
+from api.job.like_generator import generate_likes, load_likes
+from api.job.movie_loader import load_movies
+from api.model.bulk import batched
+from api.model.movie import Movie
+from api.model.user_profile import UserProfile, bulk_create_users
+from app import db
+
+# the generated users share this password, hashed once
+DATASET_PASSWORD = "12345"
+NAMES_POOL_SIZE = 1000
+WORDS_POOL_SIZE = 2000
+FIRST_RELEASE_YEAR = 1920
+LAST_RELEASE_YEAR = 2022
+# the genres of IMDb, each movie has one to three
+GENRES = [
+    "Action",
+    "Adventure",
+    "Animation",
+    "Biography",
+    "Comedy",
+    "Crime",
+    "Documentary",
+    "Drama",
+    "Family",
+    "Fantasy",
+    "Film-Noir",
+    "History",
+    "Horror",
+    "Music",
+    "Musical",
+    "Mystery",
+    "News",
+    "Romance",
+    "Sci-Fi",
+    "Sport",
+    "Thriller",
+    "War",
+    "Western",
+]
+
+
+def random_uuids(rng, count):
+    """
+    Generates count uuid4 strings from the random generator, so they repeat with
+    its seed
+    """
+    random_bytes = rng.bytes(16 * count)
+    return [
+        str(uuid.UUID(bytes=random_bytes[start : start + 16], version=4))
+        for start in range(0, 16 * count, 16)
+    ]
+
+
+def generate_users(count, rng, fake, banned_ratio=0.0):
+    """
+    Streams count users named after combinations of pools of Faker names, with
+    usernames made unique by a number suffix
+    """
+    first_names = [fake.first_name() for _ in range(NAMES_POOL_SIZE)]
+    last_names = [fake.last_name() for _ in range(NAMES_POOL_SIZE)]
+    password_hash = generate_password_hash(DATASET_PASSWORD)
+    usernames = {"admin"}
+
+    for start in range(0, count, config.BULK_INSERT_BATCH_SIZE):
+        size = min(config.BULK_INSERT_BATCH_SIZE, count - start)
+        first = rng.integers(NAMES_POOL_SIZE, size=size).tolist()
+        last = rng.integers(NAMES_POOL_SIZE, size=size).tolist()
+        banned = (rng.random(size) < banned_ratio).tolist()
+
+        for index, public_id in enumerate(random_uuids(rng, size)):
+            name = f"{first_names[first[index]]} {last_names[last[index]]}"
+            base_username = "_".join(name.lower().split())
+            username = base_username
+            suffix = 1
+            while username in usernames:
+                suffix += 1
+                username = f"{base_username}_{suffix}"
+            usernames.add(username)
+
+            yield {
+                "public_id": public_id,
+                "username": username,
+                "password_hash": password_hash,
+                "name": name,
+                "banned": banned[index],
+            }
+
+
+def generate_movies(count, rng, fake):
+    """
+    Streams count movies titled with one to four words of a pool of Faker words,
+    with one to three genres
+    """
+    words = [word.title() for word in fake.words(WORDS_POOL_SIZE)]
+
+    for start in range(0, count, config.BULK_INSERT_BATCH_SIZE):
+        size = min(config.BULK_INSERT_BATCH_SIZE, count - start)
+        lengths = rng.integers(1, 5, size=size).tolist()
+        title_words = rng.integers(WORDS_POOL_SIZE, size=(size, 4)).tolist()
+        years = rng.integers(
+            FIRST_RELEASE_YEAR, LAST_RELEASE_YEAR + 1, size=size
+        ).tolist()
+        genre_counts = rng.integers(1, 4, size=size).tolist()
+        genres = rng.integers(len(GENRES), size=(size, 3)).tolist()
+
+        for index, public_id in enumerate(random_uuids(rng, size)):
+            yield {
+                "public_id": public_id,
+                "title": " ".join(
+                    words[word] for word in title_words[index][: lengths[index]]
+                ),
+                "release_year": years[index],
+                "poster_img_url": "",
+                "genres": [
+                    GENRES[genre] for genre in genres[index][: genre_counts[index]]
+                ],
+            }
+
+
+def generate_dataset(
+    users,
+    movies,
+    likes_per_user,
+    seed=0,
+    exponent=1.0,
+    banned_ratio=0.0,
+    progress=print,
+):
+    """
+    Fills the empty database with an admin user (admin/admin) and a synthetic
+    dataset of users, movies and likes. The same seed and sizes always generate
+    the same dataset. Returns the number of rows and seconds taken by each table.
+    """
+    rng = np.random.default_rng(seed)
+    fake = Faker()
+    fake.seed_instance(seed)
+    stats = {}
+
+    started = time.perf_counter()
+    admin = {
+        "public_id": random_uuids(rng, 1)[0],
+        "username": "admin",
+        "password": "admin",
+        "name": "Admin",
+        "admin": True,
+    }
+    bulk_create_users([admin])
+    db.session.commit()
+
+    created = 0
+    for batch in batched(
+        generate_users(users, rng, fake, banned_ratio), config.BULK_INSERT_BATCH_SIZE
+    ):
+        created += len(bulk_create_users(batch))
+        db.session.commit()
+        if progress:
+            progress(f"Saved {created} users")
+    stats["users"] = {
+        "rows": created,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+    movie_stats = load_movies(generate_movies(movies, rng, fake), progress=progress)
+    stats["movies"] = {"rows": movie_stats["rows"], "seconds": movie_stats["seconds"]}
+
+    user_ids = [
+        user_id
+        for user_id, in db.session.query(UserProfile.id)
+        .filter(UserProfile.admin.is_(False))
+        .order_by(UserProfile.id)
+    ]
+    movie_ids = [
+        movie_id for movie_id, in db.session.query(Movie.id).order_by(Movie.id)
+    ]
+    likes = generate_likes(
+        user_ids, movie_ids, likes_per_user * len(user_ids), exponent, rng
+    )
+    like_stats = load_likes(*likes, progress=progress)
+    stats["likes"] = {"rows": like_stats["rows"], "seconds": like_stats["seconds"]}
+
+    return stats
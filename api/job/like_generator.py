@@ -0,0 +1,109 @@
+import time
+
+import numpy as np
+from sqlalchemy import bindparam, update
+
+import config
+from api.model.bulk import bulk_insert
+from api.model.movie import Movie, movie_like
+from app import db
+
+# extra pairs drawn in the first round to make up for the duplicates dropped
+OVERSAMPLING = 1.2
+MAX_ROUNDS = 50
+
+
+def popularity_weights(movies_count, exponent, rng):
+    """
+    Zipf-like probabilities of the movies being liked: the movie with popularity
+    rank r is liked with probability proportional to 1 / r ** exponent, and the
+    ranks are shuffled so popularity doesn't follow the ids
+    """
+    if not movies_count:
+        return np.empty(0, dtype=np.float64)
+
+    weights = 1.0 / np.arange(1, movies_count + 1, dtype=np.float64) ** exponent
+    weights /= weights.sum()
+    return rng.permutation(weights)
+
+
+def generate_likes(user_ids, movie_ids, count, exponent=1.0, seed=None):
+    """
+    Samples up to count distinct (user_id, movie_id) pairs, choosing the users
+    uniformly and the movies by a power-law popularity. Returns the user ids and
+    movie ids of the pairs as two arrays.
+    """
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    movie_ids = np.asarray(movie_ids, dtype=np.int64)
+    count = min(count, len(user_ids) * len(movie_ids))
+    rng = np.random.default_rng(seed)
+    weights = popularity_weights(len(movie_ids), exponent, rng)
+
+    # a pair is encoded as a single integer to dedupe them with np.unique
+    pairs = np.empty(0, dtype=np.int64)
+    new_pairs_rate = 1 / OVERSAMPLING
+    for _ in range(MAX_ROUNDS):
+        missing = count - len(pairs)
+        if missing <= 0:
+            break
+
+        # draw more as the popular pairs fill up and most draws are repeated
+        size = int(missing / max(new_pairs_rate, 0.01)) + 1
+        users = rng.integers(len(user_ids), size=size)
+        movies = rng.choice(len(movie_ids), size=size, p=weights)
+        previous_count = len(pairs)
+        pairs = np.unique(np.concatenate([pairs, users * len(movie_ids) + movies]))
+        new_pairs_rate = (len(pairs) - previous_count) / size
+
+    if len(pairs) > count:
+        pairs = rng.choice(pairs, size=count, replace=False)
+
+    users, movies = np.divmod(pairs, len(movie_ids))
+    return user_ids[users], movie_ids[movies]
+
+
+def load_likes(
+    user_ids, movie_ids, batch_size=config.BULK_INSERT_BATCH_SIZE, progress=print
+):
+    """
+    Inserts the likes in batches into movie_like and adds them to the like_count
+    of the movies. The likes must not exist yet, as when seeding new users.
+    """
+    started = time.perf_counter()
+    inserted = 0
+
+    for start in range(0, len(user_ids), batch_size):
+        batch = [
+            {"user_id": user_id, "movie_id": movie_id}
+            for user_id, movie_id in zip(
+                user_ids[start : start + batch_size].tolist(),
+                movie_ids[start : start + batch_size].tolist(),
+            )
+        ]
+        inserted += bulk_insert(movie_like, batch, batch_size)
+        db.session.commit()
+
+        if progress:
+            elapsed = time.perf_counter() - started
+            progress(f"Saved {inserted} likes ({inserted / elapsed:.0f} rows/s)")
+
+    liked_movies, likes = np.unique(movie_ids, return_counts=True)
+    if len(liked_movies):
+        movie = Movie.__table__
+        db.session.execute(
+            update(movie)
+            .where(movie.c.id == bindparam("movie_id"))
+            .values(like_count=movie.c.like_count + bindparam("likes")),
+            [
+                {"movie_id": movie_id, "likes": count}
+                for movie_id, count in zip(liked_movies.tolist(), likes.tolist())
+            ],
+        )
+        db.session.commit()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": inserted,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(inserted / elapsed) if elapsed else inserted,
+    }
@@ -0,0 +1,307 @@
+import csv
+import hashlib
+import os
+import time
+import uuid
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, update
+
+import config
+from api.model.bulk import batched, bulk_insert, bulk_upsert
+from api.model.facets import refresh_year_counts
+from api.model.movie import (
+    Movie,
+    get_or_create_genres,
+    movie_genre,
+    movie_like,
+    normalize_title,
+)
+from app import db
+
+# fields of the movies that come from IMDb, updated when syncing
+SYNCED_FIELDS = ["title", "release_year"]
+
+
+def bulk_public_ids(count):
+    """
+    Generates count uuid4 strings from a single read of random bytes
+    """
+    random_bytes = os.urandom(16 * count)
+    return [
+        str(uuid.UUID(bytes=random_bytes[start : start + 16], version=4))
+        for start in range(0, 16 * count, 16)
+    ]
+
+
+def content_hash(movie):
+    content = "\t".join(
+        [str(movie[field]) for field in SYNCED_FIELDS]
+        + [",".join(movie.get("genres", []))]
+    )
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def read_movies(path):
+    """
+    Streams the movies of a file written by load_movies_data.py, skipping the
+    ones without a valid release year
+    """
+    with open(path, newline="") as movies_file:
+        for movie in csv.DictReader(movies_file):
+            if movie["release_year"] == "\\N":
+                continue
+
+            try:
+                release_year = int(movie["release_year"])
+            except ValueError:
+                print(
+                    f'Skipping movie {movie["title"]} without release_year '
+                    f'{movie["release_year"]}'
+                )
+                continue
+
+            yield {
+                "tconst": movie.get("tconst") or None,
+                "title": movie["title"],
+                "release_year": release_year,
+                "poster_img_url": "",
+                "genres": [
+                    genre for genre in (movie.get("genres") or "").split(",") if genre
+                ],
+            }
+
+
+def save_movie_genres(key, values, genres, genre_ids, replace=False):
+    """
+    Inserts the genres of the movies found by the values of the key column,
+    replacing their previous genres if replace is set. genre_ids caches the
+    ids of the genres by lowercase name, the missing genres are created.
+    """
+    if not replace and not any(genres):
+        return
+
+    movie_ids = dict(db.session.query(key, Movie.id).filter(key.in_(values)))
+
+    missing = [
+        name for names in genres for name in names if name.lower() not in genre_ids
+    ]
+    if missing:
+        genre_ids.update(
+            (genre.name.lower(), genre.id) for genre in get_or_create_genres(missing)
+        )
+
+    if replace and movie_ids:
+        db.session.execute(
+            movie_genre.delete().where(
+                movie_genre.c.movie_id.in_(list(movie_ids.values()))
+            )
+        )
+    bulk_insert(
+        movie_genre,
+        (
+            {"movie_id": movie_ids[value], "genre_id": genre_id}
+            for value, names in zip(values, genres)
+            for genre_id in dict.fromkeys(genre_ids[name.lower()] for name in names)
+        ),
+    )
+
+
+def load_movies(movies, batch_size=config.BULK_INSERT_BATCH_SIZE, progress=print):
+    """
+    Inserts the movies in batches, committing each one, and reports the progress
+    with the insertion rate. A public_id is generated unless given. Returns the
+    number of movies inserted and the time taken.
+    """
+    started = time.perf_counter()
+    inserted = 0
+    genre_ids = {}
+
+    for batch in batched(movies, batch_size):
+        for movie, public_id in zip(batch, bulk_public_ids(len(batch))):
+            movie.setdefault("public_id", public_id)
+            movie["content_hash"] = content_hash(movie)
+            movie["normalized_title"] = normalize_title(movie["title"])
+            movie.setdefault("like_count", 0)
+        genres = [movie.pop("genres", []) for movie in batch]
+
+        inserted += bulk_insert(Movie.__table__, batch, batch_size)
+        save_movie_genres(
+            Movie.public_id,
+            [movie["public_id"] for movie in batch],
+            genres,
+            genre_ids,
+        )
+        db.session.commit()
+
+        if progress:
+            elapsed = time.perf_counter() - started
+            progress(f"Saved {inserted} movies ({inserted / elapsed:.0f} rows/s)")
+
+    refresh_year_counts()
+    db.session.commit()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": inserted,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(inserted / elapsed) if elapsed else inserted,
+    }
+
+
+def sync_movies(
+    movies,
+    batch_size=config.BULK_INSERT_BATCH_SIZE,
+    delete_missing=True,
+    progress=print,
+):
+    """
+    Applies the changes of the IMDb movies to the movie table, matching them by
+    tconst: new movies are inserted and the ones whose content hash changed are
+    updated, in batched upserts, while unchanged ones aren't written. Movies
+    loaded from IMDb that are no longer in it are deleted with their likes.
+    Movies without tconst, like the ones loaded before it was kept, are matched
+    by normalized title and release year and updated instead of inserted again;
+    the unmatched ones, like the ones added by admins, are never touched.
+    """
+    started = time.perf_counter()
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+    synced_tconsts = set()
+    genre_ids = {}
+
+    for batch in batched((movie for movie in movies if movie["tconst"]), batch_size):
+        tconsts = [movie["tconst"] for movie in batch]
+        synced_tconsts.update(tconsts)
+        existing_hashes = dict(
+            db.session.query(Movie.tconst, Movie.content_hash).filter(
+                Movie.tconst.in_(tconsts)
+            )
+        )
+
+        adopted = adopt_untracked_movies(
+            [movie for movie in batch if movie["tconst"] not in existing_hashes]
+        )
+        existing_hashes.update((tconst, None) for tconst in adopted)
+
+        changed = []
+        for movie in batch:
+            movie["content_hash"] = content_hash(movie)
+            if movie["tconst"] not in existing_hashes:
+                stats["inserted"] += 1
+            elif existing_hashes[movie["tconst"]] != movie["content_hash"]:
+                stats["updated"] += 1
+            else:
+                stats["unchanged"] += 1
+                continue
+            changed.append(movie)
+
+        for movie, public_id in zip(changed, bulk_public_ids(len(changed))):
+            movie["public_id"] = public_id
+            movie["normalized_title"] = normalize_title(movie["title"])
+            movie.setdefault("like_count", 0)
+        genres = [movie.pop("genres", []) for movie in changed]
+
+        bulk_upsert(
+            Movie.__table__,
+            changed,
+            "tconst",
+            SYNCED_FIELDS + ["normalized_title", "content_hash"],
+            batch_size,
+        )
+        save_movie_genres(
+            Movie.tconst,
+            [movie["tconst"] for movie in changed],
+            genres,
+            genre_ids,
+            replace=True,
+        )
+        db.session.commit()
+
+        if progress:
+            progress(
+                f"Synced {len(synced_tconsts)} movies "
+                f"({stats['inserted']} new, {stats['updated']} updated)"
+            )
+
+    if delete_missing:
+        stats["deleted"] = delete_missing_movies(synced_tconsts, batch_size)
+
+    refresh_year_counts()
+    db.session.commit()
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def adopt_untracked_movies(movies):
+    """
+    Gives the tconst of the movies to the movies without tconst that have their
+    normalized title and release year, one movie each. Returns the tconsts given.
+    """
+    tconsts = {}
+    for movie in movies:
+        key = (normalize_title(movie["title"]), movie["release_year"])
+        tconsts.setdefault(key, movie["tconst"])
+    if not tconsts:
+        return []
+
+    untracked = (
+        db.session.query(Movie.id, Movie.normalized_title, Movie.release_year)
+        .filter(
+            Movie.tconst.is_(None),
+            Movie.normalized_title.in_({title for title, _ in tconsts}),
+        )
+        .order_by(Movie.id)
+    )
+    adopted = []
+    for movie_id, normalized_title, release_year in untracked:
+        tconst = tconsts.pop((normalized_title, release_year), None)
+        if tconst is not None:
+            adopted.append({"movie_id": movie_id, "movie_tconst": tconst})
+
+    if adopted:
+        db.session.execute(
+            update(Movie.__table__)
+            .where(Movie.__table__.c.id == bindparam("movie_id"))
+            .values(tconst=bindparam("movie_tconst")),
+            adopted,
+        )
+    return [movie["movie_tconst"] for movie in adopted]
+
+
+def delete_missing_movies(synced_tconsts, batch_size=config.BULK_INSERT_BATCH_SIZE):
+    missing_ids = [
+        movie_id
+        for movie_id, tconst in db.session.query(Movie.id, Movie.tconst)
+        .filter(Movie.tconst.isnot(None))
+        .yield_per(batch_size)
+        if tconst not in synced_tconsts
+    ]
+
+    for batch in batched(missing_ids, batch_size):
+        db.session.execute(movie_like.delete().where(movie_like.c.movie_id.in_(batch)))
+        db.session.execute(
+            movie_genre.delete().where(movie_genre.c.movie_id.in_(batch))
+        )
+        Movie.query.filter(Movie.id.in_(batch)).delete(synchronize_session=False)
+        db.session.commit()
+
+    return len(missing_ids)
+
+
+@click.command("sync-movies")
+@click.argument("path", default="data/movies.tsv")
+@click.option(
+    "--keep-missing",
+    is_flag=True,
+    help="Don't delete the movies that are no longer in the file.",
+)
+@with_appcontext
+def sync_movies_command(path, keep_missing):
+    """Apply the changes of the movies file written by load_movies_data.py."""
+    stats = sync_movies(read_movies(path), delete_missing=not keep_missing)
+    click.echo(
+        "Inserted {inserted}, updated {updated}, deleted {deleted} and kept "
+        "{unchanged} unchanged movies in {seconds}s".format(**stats)
+    )
@@ -0,0 +1,141 @@
+import datetime
+import logging
+import threading
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+import config
+from api.model.auth import JWTWhitelist, TokenRevocation
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+def purge_expired_tokens(batch_size=config.TOKEN_PURGE_BATCH_SIZE):
+    """
+    Deletes the expired tokens of the whitelist, and the revocations older than
+    the token lifetime, in batches, so each delete only holds its locks briefly.
+    Returns the number of rows purged and the time taken.
+    """
+    started = time.perf_counter()
+    now = datetime.datetime.utcnow()
+    lifetime = datetime.timedelta(hours=config.JWT_LIFETIME_HOURS)
+
+    purged, batches = delete_in_batches(
+        JWTWhitelist, JWTWhitelist.expires_at < now, batch_size
+    )
+    revocations, revocation_batches = delete_in_batches(
+        TokenRevocation, TokenRevocation.revoked_at < now - lifetime, batch_size
+    )
+
+    stats = {
+        "purged": purged,
+        "revocations": revocations,
+        "batches": batches + revocation_batches,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    record_purge(stats)
+    logger.info(
+        "Purged %s expired tokens and %s revocations in %s batches in %ss",
+        stats["purged"],
+        stats["revocations"],
+        stats["batches"],
+        stats["seconds"],
+    )
+
+    return stats
+
+
+def delete_in_batches(model, condition, batch_size):
+    """
+    Deletes the rows of the model matching the condition, committing after each
+    batch. Returns the number of rows deleted and of batches.
+    """
+    deleted = 0
+    batches = 0
+
+    while True:
+        ids = [
+            row_id
+            for row_id, in db.session.query(model.id)
+            .filter(condition)
+            .limit(batch_size)
+            .all()
+        ]
+        if not ids:
+            break
+
+        model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+        batches += 1
+
+        if len(ids) < batch_size:
+            break
+
+    return deleted, batches
+
+
+def get_purge_totals():
+    return current_app.extensions.setdefault(
+        "token_purge",
+        {"runs": 0, "purged": 0, "revocations": 0, "seconds": 0.0, "last_run": None},
+    )
+
+
+def record_purge(stats):
+    totals = get_purge_totals()
+    totals["runs"] += 1
+    totals["purged"] += stats["purged"]
+    totals["revocations"] += stats["revocations"]
+    totals["seconds"] += stats["seconds"]
+    totals["last_run"] = stats
+
+
+def start_token_purger(app, interval=config.TOKEN_PURGE_INTERVAL):
+    """
+    Purges the expired tokens every interval seconds in a daemon thread, only
+    one for each app
+    """
+    purger = app.extensions.get("token_purger")
+    if purger is not None and purger.is_alive():
+        return purger
+
+    def purge_periodically():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    purge_expired_tokens()
+                except Exception:  # noqa
+                    logger.exception("Purging expired tokens failed")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+    purger = threading.Thread(
+        target=purge_periodically, name="token-purger", daemon=True
+    )
+    purger.start()
+    app.extensions["token_purger"] = purger
+    return purger
+
+
+@click.command("purge-tokens")
+@click.option(
+    "--batch-size",
+    default=config.TOKEN_PURGE_BATCH_SIZE,
+    show_default=True,
+    help="Number of expired tokens deleted per transaction.",
+)
+@with_appcontext
+def purge_tokens_command(batch_size):
+    """Delete the expired tokens of the jwt whitelist and old revocations."""
+    stats = purge_expired_tokens(batch_size)
+    click.echo(
+        "Purged %s expired tokens and %s revocations in %s batches in %ss"
+        % (stats["purged"], stats["revocations"], stats["batches"], stats["seconds"])
+    )
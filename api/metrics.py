@@ -0,0 +1,197 @@
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from collections import deque
+
+from flask import current_app, g, request
+
+import config
+from app import db
+
+
+class Histogram:
+    """
+    Counts of the observed values in each bucket, with their sum and count
+    """
+
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self, size):
+        self.buckets = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class ThreadMetrics:
+    """
+    Metrics recorded by a single thread, so recording them takes no lock
+    """
+
+    def __init__(self, buckets_count):
+        self.requests = {}
+        self.latencies = {}
+        self.queries = {}
+        self.pool_wait = Histogram(buckets_count)
+
+
+class Metrics:
+    """
+    Records the metrics of each thread apart and adds them up when they are
+    collected, the metrics of the threads that ended are folded into a retired
+    total so the counters never go back
+    """
+
+    def __init__(self, buckets=config.METRICS_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._local = threading.local()
+        self._threads = set()
+        self._ended = deque()
+        self._retired = ThreadMetrics(len(buckets) + 1)
+        self._lock = threading.Lock()
+
+    def thread(self):
+        metrics = getattr(self._local, "metrics", None)
+        if metrics is None:
+            metrics = self._local.metrics = ThreadMetrics(len(self.buckets) + 1)
+            # the finalizer may run in any thread, even one holding the lock,
+            # so it only queues the metrics to be retired
+            finalizer = weakref.finalize(
+                threading.current_thread(), self._ended.append, metrics
+            )
+            finalizer.atexit = False
+            with self._lock:
+                self._retire_ended()
+                self._threads.add(metrics)
+        return metrics
+
+    def _retire_ended(self):
+        while self._ended:
+            metrics = self._ended.popleft()
+            self._threads.discard(metrics)
+            add_metrics(self._retired, metrics)
+
+    def observe(self, histogram, seconds):
+        histogram.buckets[bisect_left(self.buckets, seconds)] += 1
+        histogram.sum += seconds
+        histogram.count += 1
+
+    def record_request(self, endpoint, method, status, seconds, query_counter=None):
+        metrics = self.thread()
+        key = (endpoint, method, status)
+        metrics.requests[key] = metrics.requests.get(key, 0) + 1
+
+        histogram = metrics.latencies.get(endpoint)
+        if histogram is None:
+            histogram = metrics.latencies[endpoint] = Histogram(len(self.buckets) + 1)
+        self.observe(histogram, seconds)
+
+        if query_counter is not None:
+            queries, query_seconds = metrics.queries.get(endpoint, (0, 0.0))
+            metrics.queries[endpoint] = (
+                queries + query_counter.queries,
+                query_seconds + query_counter.seconds,
+            )
+
+    def record_pool_wait(self, seconds):
+        self.observe(self.thread().pool_wait, seconds)
+
+    def collect(self):
+        """
+        Adds up the metrics of every running thread and the retired total
+        """
+        total = ThreadMetrics(len(self.buckets) + 1)
+        with self._lock:
+            self._retire_ended()
+            add_metrics(total, self._retired)
+            threads = list(self._threads)
+
+        for metrics in threads:
+            add_metrics(total, metrics)
+
+        return {
+            "requests": total.requests,
+            "latencies": total.latencies,
+            "queries": total.queries,
+            "pool_wait": total.pool_wait,
+        }
+
+
+def add_metrics(total, metrics):
+    # copying a dict is atomic, its thread may be changing it
+    for key, count in metrics.requests.copy().items():
+        total.requests[key] = total.requests.get(key, 0) + count
+    for endpoint, histogram in metrics.latencies.copy().items():
+        total_histogram = total.latencies.get(endpoint)
+        if total_histogram is None:
+            total_histogram = total.latencies[endpoint] = Histogram(
+                len(histogram.buckets)
+            )
+        add_histogram(total_histogram, histogram)
+    for endpoint, (count, seconds) in metrics.queries.copy().items():
+        total_count, total_seconds = total.queries.get(endpoint, (0, 0.0))
+        total.queries[endpoint] = (total_count + count, total_seconds + seconds)
+    add_histogram(total.pool_wait, metrics.pool_wait)
+
+
+def add_histogram(total, histogram):
+    total.buckets = [a + b for a, b in zip(total.buckets, list(histogram.buckets))]
+    total.sum += histogram.sum
+    total.count += histogram.count
+
+
+def get_metrics():
+    return current_app.extensions.setdefault("metrics", Metrics())
+
+
+def instrument_pool(pool, metrics):
+    """
+    Times how long the connections wait to be checked out of the pool
+    """
+    if getattr(pool, "_checkout_timed", False):
+        return
+
+    # the pool has no event before a checkout, so its getter is wrapped
+    do_get = pool._do_get
+
+    def timed_do_get():
+        started = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            metrics.record_pool_wait(time.perf_counter() - started)
+
+    pool._do_get = timed_do_get
+    pool._checkout_timed = True
+
+
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+def record_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        get_metrics().record_request(
+            request.endpoint or "unmatched",
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+            g.get("query_counter"),
+        )
+    return response
+
+
+def init_metrics(app):
+    """
+    Records the requests, their latency and queries per endpoint and the wait
+    for database connections, served at /metrics
+    """
+    metrics = app.extensions.setdefault("metrics", Metrics())
+
+    def instrument_engine():
+        instrument_pool(db.engine.pool, metrics)
+
+    app.before_request(instrument_engine)
+    app.before_request(start_request_timer)
+    app.after_request(record_request)
@@ -1,3 +1,5 @@
+import datetime
+
 from app import db
 
 
@@ -7,6 +9,26 @@ class JWTWhitelist(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, nullable=False, unique=True)
     token = db.Column(db.String(255), nullable=False, unique=True)
+    expires_at = db.Column(db.DateTime, index=True)
 
     def __str__(self):
         return f"user: '{self.user_id}'\ttoken: {self.token}"
+
+
+class TokenRevocation(db.Model):
+    """
+    Log of the token versions revoked in stateless token mode, the tokens of the
+    user with an older version than the revoked one are no longer valid
+    """
+
+    __tablename__ = "token_revocation"
+
+    id = db.Column(db.Integer, primary_key=True)
+    public_id = db.Column(db.String(50), nullable=False)
+    token_version = db.Column(db.Integer, nullable=False)
+    revoked_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.datetime.utcnow, index=True
+    )
+
+    def __str__(self):
+        return f"user: '{self.public_id}'\ttoken_version: {self.token_version}"
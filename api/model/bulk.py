@@ -0,0 +1,117 @@
+import csv
+import io
+from itertools import islice
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+import config
+from app import db
+
+COPY_NULL = "\\N"
+
+
+def batched(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def bulk_insert(table, rows, batch_size=config.BULK_INSERT_BATCH_SIZE):
+    """
+    Inserts the rows, dicts of column values, in batches skipping the ORM. Uses
+    COPY on PostgreSQL and executemany on other databases. Returns the number of
+    rows inserted.
+    """
+    connection = db.session.connection()
+    inserted = 0
+
+    for batch in batched(rows, batch_size):
+        if connection.dialect.name == "postgresql":
+            copy_rows(connection, table, batch)
+        else:
+            connection.execute(table.insert(), batch)
+        inserted += len(batch)
+
+    return inserted
+
+
+def copy_rows(connection, table, rows):
+    columns = list(rows[0].keys())
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(
+            [COPY_NULL if row[column] is None else row[column] for column in columns]
+        )
+    buffer.seek(0)
+
+    quote = connection.dialect.identifier_preparer.quote
+    statement = "COPY %s (%s) FROM STDIN WITH (FORMAT csv, NULL '%s')" % (
+        quote(table.name),
+        ", ".join(quote(column) for column in columns),
+        COPY_NULL,
+    )
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(statement, buffer)
+    finally:
+        cursor.close()
+
+
+def bulk_upsert(
+    table, rows, key, update_columns, batch_size=config.BULK_INSERT_BATCH_SIZE
+):
+    """
+    Inserts the rows, or updates the update_columns of the existing rows with the
+    same unique key column, in batches
+    """
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+    upserted = 0
+
+    for batch in batched(rows, batch_size):
+        if dialect in ("postgresql", "sqlite"):
+            insert = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+            connection.execute(
+                insert.on_conflict_do_update(
+                    index_elements=[key],
+                    set_={column: insert.excluded[column] for column in update_columns},
+                ),
+                batch,
+            )
+        else:
+            keys = [row[key] for row in batch]
+            existing = {
+                row_key
+                for row_key, in connection.execute(
+                    select(table.c[key]).where(table.c[key].in_(keys))
+                )
+            }
+            updates = [row for row in batch if row[key] in existing]
+            inserts = [row for row in batch if row[key] not in existing]
+            if updates:
+                # bound parameters can't be named after the updated columns
+                connection.execute(
+                    table.update()
+                    .where(table.c[key] == bindparam("_key"))
+                    .values(
+                        {column: bindparam("_" + column) for column in update_columns}
+                    ),
+                    [
+                        {
+                            "_key": row[key],
+                            **{"_" + column: row[column] for column in update_columns},
+                        }
+                        for row in updates
+                    ],
+                )
+            if inserts:
+                connection.execute(table.insert(), inserts)
+        upserted += len(batch)
+
+    return upserted
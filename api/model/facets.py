@@ -0,0 +1,109 @@
+from collections import Counter
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from api.model.movie import Movie
+from app import db
+
+
+class MovieYearCount(db.Model):
+    """
+    Number of movies released each year, so the release year facets don't
+    group the whole catalog per request. Adjusted by the admin movie routes
+    and recounted by the movie loaders.
+    """
+
+    __tablename__ = "movie_year_count"
+
+    release_year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    movies = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"MovieYearCount(release_year={self.release_year}, movies={self.movies})"
+
+
+def year_counts_insert(rows):
+    """
+    Inserts the (release_year, movies) rows, a list of dicts or a select,
+    returning the insert and its excluded row to update the existing years with
+    """
+    table = MovieYearCount.__table__
+    dialect = db.session.connection().dialect.name
+    insert = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+    if isinstance(rows, list):
+        insert = insert.values(rows)
+    else:
+        insert = insert.from_select(["release_year", "movies"], rows)
+    return insert, insert.excluded
+
+
+def refresh_year_counts(years=None):
+    """
+    Recounts the movies of the given release years, or of every year, from the
+    movie table. Years without movies are removed. The counts are upserted, so
+    concurrent refreshes of a year don't conflict.
+    """
+    table = MovieYearCount.__table__
+    counts = select(Movie.release_year, func.count()).group_by(Movie.release_year)
+    empty = table.delete().where(
+        table.c.release_year.notin_(select(Movie.release_year).distinct())
+    )
+
+    if years is not None:
+        years = set(years)
+        counts = counts.where(Movie.release_year.in_(years))
+        empty = empty.where(table.c.release_year.in_(years))
+
+    db.session.flush()
+    insert, excluded = year_counts_insert(counts)
+    db.session.execute(
+        insert.on_conflict_do_update(
+            index_elements=["release_year"], set_={"movies": excluded.movies}
+        )
+    )
+    db.session.execute(empty)
+
+
+def adjust_year_counts(added=(), removed=()):
+    """
+    Counts the movies added to and removed from the release years, without
+    recounting them, so concurrent changes of the same year add up
+    """
+    changes = Counter(int(year) for year in added)
+    changes.subtract(int(year) for year in removed)
+    # years in order, so concurrent changes lock their rows in the same order
+    rows = [
+        {"release_year": year, "movies": movies}
+        for year, movies in sorted(changes.items())
+        if movies
+    ]
+    if not rows:
+        return
+
+    table = MovieYearCount.__table__
+    db.session.flush()
+    insert, excluded = year_counts_insert(rows)
+    db.session.execute(
+        insert.on_conflict_do_update(
+            index_elements=["release_year"],
+            set_={"movies": table.c.movies + excluded.movies},
+        )
+    )
+    db.session.execute(
+        table.delete().where(
+            table.c.release_year.in_([row["release_year"] for row in rows]),
+            table.c.movies <= 0,
+        )
+    )
+
+
+def decade_counts(year_counts):
+    """
+    Adds up the (release year, movies) counts by decade
+    """
+    decades = {}
+    for release_year, movies in year_counts:
+        decade = release_year // 10 * 10
+        decades[decade] = decades.get(decade, 0) + movies
+    return sorted(decades.items())
@@ -1,18 +1,52 @@
 import uuid
 
 from sqlalchemy import event
+from unidecode import unidecode
 
 from app import db
 
 
+def normalize_title(title):
+    """
+    Lowercase ASCII transliteration of the title with single spaces, so "Amélie"
+    and "amelie" match
+    """
+    return " ".join(unidecode(title).lower().split())
+
+
 class Movie(db.Model):
     __tablename__ = "movie"
 
     id = db.Column(db.Integer, primary_key=True)
     public_id = db.Column(db.String(50), unique=True, nullable=False)
     title = db.Column(db.String(255), nullable=False)
+    # searched instead of the title, set whenever the title is
+    normalized_title = db.Column(db.String(255), nullable=False, server_default="")
     release_year = db.Column(db.Integer, nullable=False)
     poster_img_url = db.Column(db.String(255), default="")
+    # denormalized number of rows in movie_like, kept in sync on like and unlike
+    like_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0", index=True
+    )
+    # IMDb id and hash of the synced fields, for movies loaded from IMDb
+    tconst = db.Column(db.String(12), unique=True, index=True)
+    content_hash = db.Column(db.String(32))
+
+    genres = db.relationship("Genre", secondary="movie_genre", order_by="Genre.name")
+
+    # match the filter by release year and the sorts of the movie listing,
+    # ending with the id that breaks the ties; the likes are mostly sorted from
+    # the most liked
+    __table_args__ = (
+        db.Index("ix_movie_release_year_title", release_year, title, id),
+        db.Index(
+            "ix_movie_release_year_like_count",
+            release_year,
+            like_count.desc(),
+            id,
+        ),
+        db.Index("ix_movie_title", title, id),
+    )
 
     def __str__(self):
         return f"'title: {self.title}' id: {self.id}"
@@ -29,10 +63,64 @@ def hash_password(mapper, connection, target):
     target.public_id = str(uuid.uuid4())
 
 
+@event.listens_for(Movie.title, "set")
+def set_normalized_title(target, value, oldvalue, initiator):
+    target.normalized_title = normalize_title(value or "")
+
+
 movie_like = db.Table(
     "movie_like",
     db.Column("movie_id", db.Integer, db.ForeignKey("movie.id"), primary_key=True),
     db.Column(
         "user_id", db.Integer, db.ForeignKey("user_profile.id"), primary_key=True
     ),
+    # the primary key leads with the movie, the liked movies of a user need this
+    db.Index("ix_movie_like_user_id", "user_id", "movie_id"),
 )
+
+
+class Genre(db.Model):
+    __tablename__ = "genre"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+
+    # genres are filtered ignoring case, so "Drama" and "drama" are one genre
+    __table_args__ = (
+        db.Index("ix_genre_name_lower", db.func.lower(name), unique=True),
+    )
+
+    def __repr__(self):
+        return f"Genre(name='{self.name}')"
+
+
+movie_genre = db.Table(
+    "movie_genre",
+    db.Column("movie_id", db.Integer, db.ForeignKey("movie.id"), primary_key=True),
+    db.Column("genre_id", db.Integer, db.ForeignKey("genre.id"), primary_key=True),
+    # the primary key leads with the movie, the movies of a genre need this
+    db.Index("ix_movie_genre_genre_id", "genre_id", "movie_id"),
+)
+
+
+def get_or_create_genres(names):
+    """
+    Returns the genres with the names, ignoring case, in the same order without
+    repeats, creating the missing ones with the first spelling of their name
+    """
+    spellings = {}
+    for name in (name.strip() for name in names):
+        if name:
+            spellings.setdefault(name.lower(), name)
+
+    genres = {
+        genre.name.lower(): genre
+        for genre in Genre.query.filter(db.func.lower(Genre.name).in_(list(spellings)))
+    }
+    for key, name in spellings.items():
+        if key not in genres:
+            genres[key] = Genre(name=name)
+            db.session.add(genres[key])
+
+    db.session.flush()
+    return [genres[key] for key in spellings]
@@ -0,0 +1,109 @@
+import re
+
+from sqlalchemy import DDL, column, event, false, func, literal_column, table
+
+from api.model.movie import Movie, normalize_title
+from app import db
+
+# SQLite keeps the normalized titles in an FTS5 table, filled by triggers so the
+# bulk inserts skipping the ORM are indexed too
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS movie_search USING fts5(
+        normalized_title, content='movie', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS movie_search_insert AFTER INSERT ON movie BEGIN
+        INSERT INTO movie_search (rowid, normalized_title)
+        VALUES (new.id, new.normalized_title);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS movie_search_delete AFTER DELETE ON movie BEGIN
+        INSERT INTO movie_search (movie_search, rowid, normalized_title)
+        VALUES ('delete', old.id, old.normalized_title);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS movie_search_update
+    AFTER UPDATE OF normalized_title ON movie BEGIN
+        INSERT INTO movie_search (movie_search, rowid, normalized_title)
+        VALUES ('delete', old.id, old.normalized_title);
+        INSERT INTO movie_search (rowid, normalized_title)
+        VALUES (new.id, new.normalized_title);
+    END
+    """,
+]
+
+# PostgreSQL indexes the text search vector of the normalized titles, and their
+# trigrams for the title substring filter
+POSTGRESQL_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE INDEX IF NOT EXISTS ix_movie_search_vector ON movie
+    USING gin (to_tsvector('simple', normalized_title))
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_movie_normalized_title_trgm ON movie
+    USING gin (normalized_title gin_trgm_ops)
+    """,
+]
+
+for statement in SQLITE_SEARCH_DDL:
+    event.listen(
+        Movie.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite")
+    )
+for statement in POSTGRESQL_SEARCH_DDL:
+    event.listen(
+        Movie.__table__,
+        "after_create",
+        DDL(statement).execute_if(dialect="postgresql"),
+    )
+event.listen(
+    Movie.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS movie_search").execute_if(dialect="sqlite"),
+)
+
+movie_search = table(
+    "movie_search", column("rowid"), column("rank"), column("movie_search")
+)
+
+
+def search_terms(q):
+    return re.findall(r"[a-z0-9]+", normalize_title(q))
+
+
+def title_search(query, q):
+    """
+    Filters the movies whose normalized title has every word of the search, the
+    last one as a prefix. Returns the query, the expression ranking the matches
+    by relevance and whether the most relevant rank the highest.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return query.filter(false()), Movie.id, False
+
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        match = " ".join(f'"{term}"' for term in terms[:-1])
+        match = f'{match} "{terms[-1]}"*'.strip()
+        query = query.join(movie_search, movie_search.c.rowid == Movie.id).filter(
+            movie_search.c.movie_search.op("MATCH")(match)
+        )
+        # bm25 ranks, lower is more relevant
+        return query, movie_search.c.rank, False
+
+    if dialect == "postgresql":
+        vector = func.to_tsvector(literal_column("'simple'"), Movie.normalized_title)
+        tsquery = func.to_tsquery(
+            literal_column("'simple'"),
+            " & ".join(terms[:-1] + [terms[-1] + ":*"]),
+        )
+        query = query.filter(vector.op("@@")(tsquery))
+        return query, func.ts_rank(vector, tsquery), True
+
+    for term in terms:
+        query = query.filter(Movie.normalized_title.contains(term, autoescape=True))
+    return query, Movie.like_count, True
@@ -1,9 +1,14 @@
 import uuid
 
 from sqlalchemy.orm import backref
+from sqlalchemy.sql import ClauseElement
 from werkzeug.security import generate_password_hash
-from sqlalchemy import event
+from sqlalchemy import event, func, inspect, literal_column
 
+import config
+from api.model.bulk import bulk_insert
+from api.model.movie import Movie
+from api.password import hash_passwords
 from app import db
 
 
@@ -17,6 +22,21 @@ class UserProfile(db.Model):
     name = db.Column(db.String(50))
     banned = db.Column(db.Boolean, nullable=False, default=False)
     admin = db.Column(db.Boolean, nullable=False, default=False)
+    # version of the user's tokens, increased to revoke them in stateless token mode
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    # match the filters and the name sort of the users listing, the name is
+    # sorted as coalesce(name, '') so the index is on that expression
+    __table_args__ = (
+        db.Index("ix_user_profile_admin_banned", "admin", "banned", "id"),
+        db.Index("ix_user_profile_banned", "banned", "id"),
+        db.Index(
+            "ix_user_profile_name", func.coalesce(name, literal_column("''")), "id"
+        ),
+    )
+
+    # set when the password was already hashed before creating the user
+    password_hashed = False
 
     liked_movies = db.relationship(
         "Movie",
@@ -39,4 +59,59 @@ class UserProfile(db.Model):
 @event.listens_for(UserProfile, "before_insert")
 def hash_password(mapper, connection, target):
     target.public_id = str(uuid.uuid4())
-    target.password = generate_password_hash(password=target.password)
+    if not target.password_hashed:
+        target.password = generate_password_hash(password=target.password)
+
+
+def add_likes(movie, amount):
+    pending = movie.__dict__.get("like_count")
+
+    if not inspect(movie).persistent:
+        movie.like_count = (pending or 0) + amount
+    elif isinstance(pending, ClauseElement):
+        # the movie was liked or unliked more than once before flushing
+        movie.like_count = pending + amount
+    else:
+        # update the count in the database, so concurrent likes aren't lost
+        movie.like_count = Movie.like_count + amount
+
+
+@event.listens_for(UserProfile.liked_movies, "append")
+def count_like(target, value, initiator):
+    add_likes(value, 1)
+
+
+@event.listens_for(UserProfile.liked_movies, "remove")
+def count_unlike(target, value, initiator):
+    add_likes(value, -1)
+
+
+def bulk_create_users(users, batch_size=config.BULK_INSERT_BATCH_SIZE):
+    """
+    Inserts many users in batches, skipping the ORM. Each user is a dict with the
+    user fields and either a plaintext password, hashed in parallel, or an
+    already hashed password_hash. A public_id is generated unless given. Returns
+    the inserted rows.
+    """
+    users = list(users)
+    password_hashes = iter(
+        hash_passwords(
+            [user["password"] for user in users if not user.get("password_hash")]
+        )
+    )
+
+    rows = [
+        {
+            "public_id": user.get("public_id") or str(uuid.uuid4()),
+            "username": user["username"],
+            "password": user.get("password_hash") or next(password_hashes),
+            "name": user.get("name"),
+            "banned": user.get("banned", False),
+            "admin": user.get("admin", False),
+            "token_version": 0,
+        }
+        for user in users
+    ]
+    bulk_insert(UserProfile.__table__, rows, batch_size)
+
+    return rows
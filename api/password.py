@@ -0,0 +1,161 @@
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+import config
+
+
+class PasswordPoolSaturated(Exception):
+    pass
+
+
+def worker_context():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+class PasswordPool:
+    """
+    Hashes passwords in a pool of worker processes, so the deliberately slow
+    hashing doesn't hold the request threads. Refuses new work once max_pending
+    hashes are running or waiting for a worker.
+    """
+
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self):
+        return self._pending
+
+    def run(self, fn, *args):
+        with self._reserved(1):
+            if not self.workers:
+                return fn(*args)
+            return self._get_executor().submit(fn, *args).result()
+
+    def map(self, fn, items):
+        """
+        Runs fn on each item, taking a pending slot for each, so they are all
+        refused unless there are slots left for every one
+        """
+        items = list(items)
+        with self._reserved(len(items)):
+            if not self.workers:
+                return [fn(item) for item in items]
+            executor = self._get_executor()
+            futures = [executor.submit(fn, item) for item in items]
+            return [future.result() for future in futures]
+
+    @contextmanager
+    def _reserved(self, count):
+        acquired = 0
+        while acquired < count and self._slots.acquire(blocking=False):
+            acquired += 1
+        if acquired < count:
+            for _ in range(acquired):
+                self._slots.release()
+            raise PasswordPoolSaturated("Too many passwords waiting to be hashed")
+
+        with self._lock:
+            self._pending += count
+        try:
+            yield
+        except BrokenProcessPool:
+            # a worker died, start a new pool for the next requests
+            with self._lock:
+                self._executor = None
+            raise
+        finally:
+            with self._lock:
+                self._pending -= count
+            for _ in range(count):
+                self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # the workers are started while the request threads run, forking
+                # could copy a lock some other thread is holding
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=worker_context()
+                )
+            return self._executor
+
+
+password_pool = PasswordPool(
+    config.PASSWORD_HASH_WORKERS, config.PASSWORD_HASH_MAX_PENDING
+)
+
+
+def hash_passwords(passwords, workers=config.PASSWORD_HASH_WORKERS):
+    """
+    Hashes many passwords in parallel, in a pool apart from the one serving
+    requests so bulk jobs don't saturate it
+    """
+    passwords = list(passwords)
+    if not workers or len(passwords) < 2:
+        return [generate_password_hash(password) for password in passwords]
+
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(
+            executor.map(generate_password_hash, passwords, chunksize=chunksize)
+        )
+
+
+def hash_password(password):
+    return password_pool.run(generate_password_hash, password)
+
+
+def hash_request_passwords(passwords):
+    """
+    Hashes the passwords of a single request in the pool serving requests
+    """
+    return password_pool.map(generate_password_hash, passwords)
+
+
+def is_password_hash(value):
+    """
+    Checks the value is a pbkdf2 hash of generate_password_hash, written as
+    pbkdf2:<digest>[:<iterations>]$<salt>$<hex hash>
+    """
+    parts = value.split("$") if isinstance(value, str) else []
+    if len(parts) != 3 or not parts[1]:
+        return False
+
+    method, _, hash_value = parts
+    method = method.split(":")
+    if method[0] != "pbkdf2" or not 2 <= len(method) <= 3:
+        return False
+    if method[1] not in hashlib.algorithms_available:
+        return False
+    if len(method) == 3 and not method[2].isdigit():
+        return False
+
+    try:
+        bytes.fromhex(hash_value)
+    except ValueError:
+        return False
+    return bool(hash_value)
+
+
+def check_password(password_hash, password):
+    return password_pool.run(check_password_hash, password_hash, password)
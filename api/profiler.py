@@ -0,0 +1,187 @@
+import cProfile
+import datetime
+import io
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+import uuid
+
+from flask import current_app, g, request
+
+import config
+from api.route.auth import authenticate, get_token
+
+
+class ProfileStore:
+    """
+    Keeps the latest profiles of the requests, and limits how many requests
+    are profiled at once so profiling can stay enabled in production. The
+    profiles are kept in the memory of the process unless a directory is
+    given, shared by the processes serving the app, to write them to.
+    """
+
+    def __init__(
+        self,
+        max_concurrent=config.PROFILE_MAX_CONCURRENT,
+        size=config.PROFILE_STORE_SIZE,
+        directory=config.PROFILE_DIR,
+    ):
+        self.max_concurrent = max_concurrent
+        self.size = size
+        self.directory = directory
+        self._slots = threading.BoundedSemaphore(max(max_concurrent, 1))
+        self._profiles = {}
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def acquire(self):
+        return self.max_concurrent > 0 and self._slots.acquire(blocking=False)
+
+    def release(self):
+        self._slots.release()
+
+    def add(self, profile):
+        if self.directory:
+            self._write(profile)
+            return
+
+        with self._lock:
+            if len(self._profiles) >= self.size:
+                # drop the oldest profile, dicts keep insertion order
+                del self._profiles[next(iter(self._profiles))]
+            self._profiles[profile["id"]] = profile
+
+    def get(self, profile_id):
+        if self.directory:
+            return self._read(profile_id)
+
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def _path(self, profile_id):
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def _write(self, profile):
+        # written apart and renamed, so other processes never read half a profile
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(descriptor, "w") as profile_file:
+            json.dump(profile, profile_file)
+        os.replace(temporary_path, self._path(profile["id"]))
+
+        paths = [
+            entry.path
+            for entry in os.scandir(self.directory)
+            if entry.name.endswith(".json")
+        ]
+        if len(paths) > self.size:
+            paths.sort(key=modified_at)
+            for path in paths[: len(paths) - self.size]:
+                remove_file(path)
+
+    def _read(self, profile_id):
+        try:
+            # only the ids given to the profiles, never a path
+            profile_id = str(uuid.UUID(profile_id))
+        except ValueError:
+            return None
+
+        try:
+            with open(self._path(profile_id)) as profile_file:
+                return json.load(profile_file)
+        except FileNotFoundError:
+            return None
+
+
+def modified_at(path):
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        # removed by another process, it goes first and is removed again
+        return 0
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def get_profiles():
+    return current_app.extensions.setdefault("profiles", ProfileStore())
+
+
+def requested_by_admin():
+    token = get_token(request)
+    if type(token) is not str:
+        return False
+
+    authorized = authenticate(token)
+    return type(authorized) is dict and authorized["user"]["admin"]
+
+
+def start_profile():
+    if request.headers.get("X-Profile") != "1" or not requested_by_admin():
+        return
+
+    profiles = get_profiles()
+    if not profiles.acquire():
+        return
+
+    g.profile = cProfile.Profile()
+    g.profile_started = time.perf_counter()
+    g.profile.enable()
+
+
+def stop_profile(response):
+    profile = g.pop("profile", None)
+    if profile is None:
+        return response
+
+    profile.disable()
+    seconds = time.perf_counter() - g.pop("profile_started")
+    get_profiles().release()
+
+    output = io.StringIO()
+    stats = pstats.Stats(profile, stream=output)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(
+        config.PROFILE_TOP_FUNCTIONS
+    )
+
+    profile_id = str(uuid.uuid4())
+    get_profiles().add(
+        {
+            "id": profile_id,
+            "method": request.method,
+            "path": request.path,
+            "query_string": request.query_string.decode("utf-8", "replace"),
+            "status_code": response.status_code,
+            "seconds": round(seconds, 6),
+            "created_at": datetime.datetime.utcnow().isoformat(),
+            "stats": output.getvalue(),
+        }
+    )
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
+def discard_profile(exception):
+    # the response of a failed request may never reach stop_profile
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profile.disable()
+        get_profiles().release()
+
+
+def init_profiler(app):
+    """
+    Profiles the requests of admins sent with the X-Profile: 1 header, the
+    profile is served at /admin/profiles/<id> given by the X-Profile-Id header
+    """
+    app.before_request(start_profile)
+    app.after_request(stop_profile)
+    app.teardown_request(discard_profile)
@@ -0,0 +1,80 @@
+import threading
+import time
+
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import config
+
+_local = threading.local()
+
+
+class QueryCounter:
+    """
+    Counts the SQL statements run by the current thread, and the time spent on
+    them, while used as a context manager
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.statements = []
+
+    def record(self, statement, seconds):
+        self.queries += 1
+        self.seconds += seconds
+        self.statements.append(statement)
+
+    def __enter__(self):
+        active_counters().append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        active_counters().remove(self)
+
+
+def active_counters():
+    if not hasattr(_local, "counters"):
+        _local.counters = []
+    return _local.counters
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_started"].pop()
+
+    for counter in active_counters():
+        counter.record(statement, seconds)
+
+    if has_app_context() and "query_counter" in g:
+        g.query_counter.record(statement, seconds)
+
+
+def start_request_count():
+    g.query_counter = QueryCounter()
+
+
+def add_query_headers(response):
+    counter = g.get("query_counter")
+    if counter is not None and config.QUERY_STATS_HEADERS:
+        response.headers["X-DB-Queries"] = str(counter.queries)
+        response.headers["X-DB-Time"] = f"{counter.seconds * 1000:.3f}"
+    return response
+
+
+def init_query_stats(app):
+    """
+    Counts the queries of every request of the app, adding the count and the
+    milliseconds spent on them as X-DB-Queries and X-DB-Time response headers
+    when QUERY_STATS_HEADERS is set
+    """
+    if not event.contains(Engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+
+    app.before_request(start_request_count)
+    app.after_request(add_query_headers)
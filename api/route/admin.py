@@ -1,15 +1,37 @@
 import os
+from collections import Counter
 from functools import wraps
 
 from flask import Blueprint, jsonify, json, request, make_response
-from sqlalchemy import desc, asc
+from sqlalchemy import func, literal_column, select, update, bindparam
+from sqlalchemy.orm import selectinload
 
 import config
-from api.model.movie import Movie
-from api.model.user_profile import UserProfile
-from api.route.auth import authorized_admin, clear_user_jwt
+from api.model.facets import adjust_year_counts
+from api.model.movie import Movie, get_or_create_genres, movie_like
+from api.model.bulk import batched
+from api.model.user_profile import UserProfile, bulk_create_users
+from api.password import (
+    PasswordPoolSaturated,
+    hash_request_passwords,
+    is_password_hash,
+)
+from api.profiler import get_profiles
+from api.route.auth import (
+    authorized_admin,
+    clear_user_jwt,
+    password_pool_saturated,
+)
+from api.route.auth_cache import get_auth_cache
 from api.route.movie import find_movie
-from api.route.paginate import paginate
+from api.route.paginate import (
+    paginate,
+    paginate_cursor,
+    filter_key,
+    invalidate_total,
+    SortKey,
+)
+from api.route.movie_index import index_movie, unindex_movie
 from api.schema.movie import MovieSchema
 from api.schema.user_profile import UserProfileSchema
 from app import db
@@ -18,11 +40,26 @@ url_prefix = os.path.join(config.API_URL_PREFIX, "admin")
 admin_blueprint = Blueprint("admin", __name__, url_prefix=url_prefix)
 
 
+def get_user(public_id):
+    """
+    Returns the user with their liked movies and genres, loaded in three queries
+    instead of one per liked movie when the user is serialized. The liked movies
+    reloaded after a commit load their genres the same way.
+    """
+    return (
+        UserProfile.query.options(
+            selectinload(UserProfile.liked_movies).selectinload(Movie.genres)
+        )
+        .filter_by(public_id=public_id)
+        .first()
+    )
+
+
 def find_user(f):
     @wraps(f)
     def decorated(*args, **kwargs):
         public_id = kwargs.get("public_id", "")
-        user = UserProfile.query.filter_by(public_id=public_id).first()
+        user = get_user(public_id)
 
         if not user:
             return jsonify({"message": "User not found", "status_code": 404}), 404
@@ -42,36 +79,61 @@ def user_query_filter(query, args):
     return query
 
 
-def user_query_sort_by(query, args):
+def user_sort_keys(args):
+    sort_keys = []
     if "sort" in args:
         sorting = args.get("sort").split(",")
         for by in sorting:
-            order = desc if "-" in by else asc
+            descending = "-" in by
             if "username" in by:
-                query = query.order_by(order(UserProfile.username))
+                sort_keys.append(SortKey("username", UserProfile.username, descending))
             elif "name" in by:
-                query = query.order_by(order(UserProfile.name))
+                # name is optional, nulls can't be compared to find the next page;
+                # the empty string is literal to match ix_user_profile_name
+                name = func.coalesce(UserProfile.name, literal_column("''"))
+                sort_keys.append(SortKey("name", name, descending))
             elif "banned" in by:
-                query = query.order_by(order(UserProfile.banned))
+                sort_keys.append(SortKey("banned", UserProfile.banned, descending))
             elif "admin" in by:
-                query = query.order_by(order(UserProfile.admin))
+                sort_keys.append(SortKey("admin", UserProfile.admin, descending))
 
-    return query
+    # the id breaks ties, so every user has a single position in the listing
+    sort_keys.append(SortKey("id", UserProfile.id, False))
+    return sort_keys
+
+
+def user_query_sort_by(query, args):
+    return query.order_by(*[key.ordering for key in user_sort_keys(args)])
 
 
 @admin_blueprint.route("/users", methods=["GET"])
 @authorized_admin
 def get_all_users():
     users_schema = UserProfileSchema(many=True)
-    query = UserProfile.query
+    query = UserProfile.query.options(
+        selectinload(UserProfile.liked_movies).selectinload(Movie.genres)
+    )
 
     # filter by admin or banned
     query = user_query_filter(query, request.args)
     query = user_query_sort_by(query, request.args)
 
-    if "page" in request.args:
+    if "cursor" in request.args:
+        key = filter_key(request.args, ["admin", "banned"])
+        results = make_response(
+            paginate_cursor(
+                query,
+                users_schema,
+                request.args.get("cursor"),
+                "users",
+                user_sort_keys(request.args),
+                key,
+            )
+        )
+    elif "page" in request.args:
         page = request.args.get("page", 1, type=int)
-        results = make_response(paginate(query, users_schema, page, "users"))
+        key = filter_key(request.args, ["admin", "banned"])
+        results = make_response(paginate(query, users_schema, page, "users", key))
     else:
         users = query.all()
         results = make_response((jsonify(json.loads(users_schema.dumps(users))), 200))
@@ -86,6 +148,8 @@ def promote_to_admin(user, public_id):
     if not user.admin:
         user.admin = True
         db.session.commit()
+        invalidate_total("users")
+        get_auth_cache().invalidate_user(user.id)
 
     user_schema = UserProfileSchema()
     return (
@@ -106,6 +170,8 @@ def demote_to_normal(user, public_id):
     if user.admin:
         user.admin = False
         db.session.commit()
+        invalidate_total("users")
+        get_auth_cache().invalidate_user(user.id)
 
     user_schema = UserProfileSchema()
     return (
@@ -126,6 +192,7 @@ def ban_user(user, public_id):
     if not user.banned:
         user.banned = True
         db.session.commit()
+        invalidate_total("users")
         clear_user_jwt(user.id)
 
     user_schema = UserProfileSchema()
@@ -147,6 +214,8 @@ def unban_user(user, public_id):
     if user.banned:
         user.banned = False
         db.session.commit()
+        invalidate_total("users")
+        get_auth_cache().invalidate_user(user.id)
 
     user_schema = UserProfileSchema()
     return (
@@ -166,8 +235,20 @@ def unban_user(user, public_id):
 def delete_user(user, public_id):
     username = user.username
     clear_user_jwt(user.id)
+
+    # the user's likes are deleted with them, in the same transaction
+    liked_movie_ids = select(movie_like.c.movie_id).where(
+        movie_like.c.user_id == user.id
+    )
+    db.session.execute(
+        update(Movie)
+        .where(Movie.id.in_(liked_movie_ids))
+        .values(like_count=Movie.like_count - 1)
+        .execution_options(synchronize_session=False)
+    )
     db.session.delete(user)
     db.session.commit()
+    invalidate_total("users")
 
     return (
         jsonify({"message": "User '%s' deleted" % username}),
@@ -175,6 +256,134 @@ def delete_user(user, public_id):
     )
 
 
+@admin_blueprint.route("/users/bulk", methods=["POST"])
+@authorized_admin
+def bulk_import_users():
+    users_data = request.get_json().get("users", [])
+
+    if not users_data or len(users_data) > config.BULK_IMPORT_MAX_USERS:
+        return (
+            jsonify(
+                {
+                    "message": "Invalid number of users",
+                    "description": "Tried importing %s users, between 1 and %s "
+                    "users can be imported at once"
+                    % (len(users_data), config.BULK_IMPORT_MAX_USERS),
+                    "status_code": 422,
+                }
+            ),
+            422,
+        )
+
+    incomplete = [
+        position
+        for position, user_data in enumerate(users_data)
+        if not user_data.get("username")
+        or not (user_data.get("password") or user_data.get("password_hash"))
+    ]
+    if incomplete:
+        return (
+            jsonify(
+                {
+                    "message": "Missing user data",
+                    "description": "Tried importing users without username or "
+                    "password at the position(s) %s" % incomplete,
+                    "status_code": 422,
+                }
+            ),
+            422,
+        )
+
+    invalid_hashes = [
+        position
+        for position, user_data in enumerate(users_data)
+        if user_data.get("password_hash")
+        and not is_password_hash(user_data["password_hash"])
+    ]
+    if invalid_hashes:
+        return (
+            jsonify(
+                {
+                    "message": "Invalid password hash",
+                    "description": "Tried importing users with a password_hash "
+                    "that isn't a pbkdf2 hash at the position(s) %s" % invalid_hashes,
+                    "status_code": 422,
+                }
+            ),
+            422,
+        )
+
+    # plaintext passwords are hashed while the request waits, in the pool
+    # hashing the passwords of the logins
+    plaintext = [
+        user_data for user_data in users_data if not user_data.get("password_hash")
+    ]
+    if len(plaintext) > config.BULK_IMPORT_MAX_PASSWORDS:
+        return (
+            jsonify(
+                {
+                    "message": "Too many plaintext passwords",
+                    "description": "Tried importing %s users with a plaintext "
+                    "password, up to %s can be imported at once, the others need "
+                    "a password_hash"
+                    % (len(plaintext), config.BULK_IMPORT_MAX_PASSWORDS),
+                    "status_code": 422,
+                }
+            ),
+            422,
+        )
+
+    usernames = [user_data["username"] for user_data in users_data]
+    duplicated = {
+        username for username, count in Counter(usernames).items() if count > 1
+    }
+    for batch in batched(set(usernames), 1000):
+        duplicated.update(
+            username
+            for username, in db.session.query(UserProfile.username).filter(
+                UserProfile.username.in_(batch)
+            )
+        )
+    if duplicated:
+        return (
+            jsonify(
+                {
+                    "message": "Users with username already exist",
+                    "description": "Tried importing the existing or repeated "
+                    "username(s) %s" % sorted(duplicated),
+                    "status_code": 422,
+                }
+            ),
+            422,
+        )
+
+    try:
+        password_hashes = hash_request_passwords(
+            [user_data["password"] for user_data in plaintext]
+        )
+    except PasswordPoolSaturated:
+        return password_pool_saturated()
+    for user_data, password_hash in zip(plaintext, password_hashes):
+        user_data["password_hash"] = password_hash
+
+    users = bulk_create_users(users_data)
+    db.session.commit()
+    invalidate_total("users")
+
+    return (
+        jsonify(
+            {
+                "message": "%s users created" % len(users),
+                "users": [
+                    {"public_id": user["public_id"], "username": user["username"]}
+                    for user in users
+                ],
+            }
+        ),
+        201,
+    )
+
+
 @admin_blueprint.route("/movies", methods=["POST"])
 @authorized_admin
 def add_movie():
@@ -205,9 +414,13 @@ def add_movie():
         title=movie_data["title"],
         release_year=movie_data["release_year"],
         poster_img_url=movie_data.get("poster_img_url", ""),
+        genres=get_or_create_genres(movie_data.get("genres") or []),
     )
     db.session.add(movie)
+    adjust_year_counts(added=[movie.release_year])
     db.session.commit()
+    invalidate_total("movies")
+    index_movie(movie)
 
     movie_schema = MovieSchema()
     return jsonify(json.loads(movie_schema.dumps(movie))), 201
@@ -218,6 +431,7 @@ def add_movie():
 @authorized_admin
 def update_movie(movie, public_id):
     response = ""
+    release_year = movie.release_year
     if request.method == "PUT":
         movie_data = request.get_json()
 
@@ -242,14 +456,83 @@ def update_movie(movie, public_id):
         ):
             movie.poster_img_url = movie_data["poster_img_url"]
 
+        if movie_data.get("genres") is not None:
+            movie.genres = get_or_create_genres(movie_data["genres"])
+
+        adjust_year_counts(added=[movie.release_year], removed=[release_year])
         db.session.commit()
+        invalidate_total("movies")
+        index_movie(movie)
 
         movie_schema = MovieSchema()
         response = json.loads(movie_schema.dumps(movie))
 
     if request.method == "DELETE":
         response = {"message": "Movie '%s' deleted" % movie.title, "status_code": 200}
+        movie_id = movie.id
         db.session.delete(movie)
+        adjust_year_counts(removed=[release_year])
         db.session.commit()
+        invalidate_total("movies")
+        unindex_movie(movie_id)
 
     return jsonify(response), 200
+
+
+def reconcile_like_counts():
+    """
+    Recounts the likes of every movie from movie_like and fixes the movies whose
+    like_count drifted from it
+    """
+    likes = (
+        select(movie_like.c.movie_id, func.count().label("likes"))
+        .group_by(movie_like.c.movie_id)
+        .subquery()
+    )
+    actual_likes = func.coalesce(likes.c.likes, 0)
+    drifted = (
+        db.session.query(Movie.id, Movie.public_id, Movie.like_count, actual_likes)
+        .outerjoin(likes, likes.c.movie_id == Movie.id)
+        .filter(Movie.like_count != actual_likes)
+        .all()
+    )
+
+    if drifted:
+        db.session.execute(
+            update(Movie.__table__)
+            .where(Movie.__table__.c.id == bindparam("movie_id"))
+            .values(like_count=bindparam("likes")),
+            [
+                {"movie_id": movie_id, "likes": count}
+                for movie_id, _, _, count in drifted
+            ],
+        )
+    db.session.commit()
+
+    return {
+        "movies": Movie.query.count(),
+        "drifted": len(drifted),
+        "drift": sum(abs(count - like_count) for _, _, like_count, count in drifted),
+        "corrected": [
+            {"public_id": public_id, "like_count": like_count, "likes": count}
+            for _, public_id, like_count, count in drifted[:100]
+        ],
+    }
+
+
+@admin_blueprint.route("/movies/likes/reconcile", methods=["POST"])
+@authorized_admin
+def reconcile_likes():
+    report = reconcile_like_counts()
+    return jsonify({"message": "Movie likes reconciled", **report}), 200
+
+
+@admin_blueprint.route("/profiles/<profile_id>", methods=["GET"])
+@authorized_admin
+def get_profile(profile_id):
+    profile = get_profiles().get(profile_id)
+
+    if not profile:
+        return jsonify({"message": "Profile not found", "status_code": 404}), 404
+
+    return jsonify(profile), 200
@@ -6,11 +6,15 @@ from functools import wraps
 import jwt
 import sqlalchemy.exc
 from flask import Blueprint, request, jsonify, make_response, wrappers
-from werkzeug.security import check_password_hash
+from sqlalchemy.orm import make_transient_to_detached
 
 import config
+from api.password import PasswordPoolSaturated, check_password, hash_password
 from api.model.user_profile import UserProfile
 from api.model.auth import JWTWhitelist
+from api.route.auth_cache import get_auth_cache
+from api.route.paginate import invalidate_total
+from api.route.revocation import get_revocations, revoke_user_tokens
 from api.schema.user_profile import UserProfileSchema
 from app import db
 
@@ -26,13 +30,11 @@ def authorized_admin(f):
         if type(token) is not str:
             return token
 
-        data = decode_jwt(token)
-        if type(data) is not dict:
-            return data
-
-        user = UserProfile.query.filter_by(public_id=data.get("public_id")).first()
+        authorized = authenticate(token)
+        if authorized is not None and type(authorized) is not dict:
+            return authorized
 
-        if not user or not user.admin:
+        if not authorized or not authorized["user"]["admin"]:
             return make_response(
                 (
                     {
@@ -56,21 +58,69 @@ def authorized_user(f):
         if type(token) is not str:
             return token
 
-        data = decode_jwt(token)
-        if type(data) is not dict:
-            return data
+        authorized = authenticate(token)
+        if authorized is not None and type(authorized) is not dict:
+            return authorized
 
-        user = UserProfile.query.filter_by(public_id=data.get("public_id")).first()
-        if not user:
+        if not authorized:
             return make_response(
                 ({"message": "Unauthorized request", "status_code": 401}, 401)
             )
 
+        user = cached_user(authorized["user"])
         return f(user, *args, **kwargs)
 
     return decorated
 
 
+def authenticate(token):
+    """
+    Verifies the token and finds its user, unless they were recently cached.
+    Returns the cached claims and user, None if the user doesn't exist or the
+    error response of an invalid token.
+    """
+    auth_cache = get_auth_cache()
+    authorized = auth_cache.get(token)
+
+    if authorized is not None:
+        data = authorized["claims"]
+    else:
+        data = decode_jwt(token)
+        if type(data) is not dict:
+            return data
+
+    if config.STATELESS_TOKENS and get_revocations().is_revoked(data):
+        auth_cache.invalidate_token(token)
+        return make_response(
+            (
+                {
+                    "status_code": 401,
+                    "message": "Revoked authorization token",
+                },
+                401,
+            )
+        )
+
+    if authorized is not None:
+        return authorized
+
+    user = UserProfile.query.filter_by(public_id=data.get("public_id")).first()
+    if not user:
+        return None
+
+    return auth_cache.set(token, data, user)
+
+
+def cached_user(user_info):
+    """
+    Attaches the cached user to the session without querying the database,
+    the rest of the user attributes are loaded when accessed
+    """
+    user = UserProfile(**user_info)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
 @auth_blueprint.route("/login", methods=["GET"])
 def login():
     auth = request.authorization
@@ -90,12 +140,20 @@ def login():
     if not user_profile:
         return jsonify(error_response), 401
 
-    if check_password_hash(user_profile.password, auth.password):
+    try:
+        valid_password = check_password(user_profile.password, auth.password)
+    except PasswordPoolSaturated:
+        return password_pool_saturated()
+
+    if valid_password:
         if user_profile.banned:
             error_response["message"] = "User is banned from access"
             error_response["description"] = "Your account has been banned by an admin"
             return jsonify(error_response), 403
 
+        if config.STATELESS_TOKENS:
+            return jsonify({"token": encode_user_token(user_profile)})
+
         jwt_whited = JWTWhitelist.query.filter_by(user_id=user_profile.id).first()
 
         if not jwt_whited:
@@ -130,14 +188,21 @@ def register():
             "status_code": 422,
         }, 422
 
+    try:
+        password = hash_password(user_data["password"])
+    except PasswordPoolSaturated:
+        return password_pool_saturated()
+
     try:
         new_user_profile = UserProfile(
             username=user_data["username"],
-            password=user_data["password"],
+            password=password,
+            password_hashed=True,
             name=user_data.get("name", None),
         )
         db.session.add(new_user_profile)
         db.session.commit()
+        invalidate_total("users")
     except sqlalchemy.exc.IntegrityError:
         return {
             "message": "User with username already exists",
@@ -148,14 +213,14 @@ def register():
     token = get_token(request)
     if type(token) is str and user_data.get("admin"):
         try:
-            data = decode_jwt(token)
-            if type(data) is not dict:
-                return data
+            authorized = authenticate(token)
+            if authorized is not None and type(authorized) is not dict:
+                return authorized
 
-            user = UserProfile.query.filter_by(public_id=data["public_id"]).first()
-            if user.admin:
+            if authorized and authorized["user"]["admin"]:
                 new_user_profile.admin = True
                 db.session.commit()
+                invalidate_total("users")
         except:  # noqa
             pass
 
@@ -173,6 +238,11 @@ def logout():
     if type(token) is not str:
         return token
 
+    get_auth_cache().invalidate_token(token)
+
+    if config.STATELESS_TOKENS:
+        return stateless_logout(token)
+
     whited = JWTWhitelist.query.filter_by(token=token).first()
     if not whited:
         return {"message": "No user logged"}, 200
@@ -184,16 +254,55 @@ def logout():
     return {"message": "User logged out"}, 200
 
 
-def generate_user_token(user_profile: UserProfile):
-    token = jwt.encode(
+def password_pool_saturated():
+    return (
+        jsonify(
+            {
+                "status_code": 503,
+                "message": "Too many authentication requests",
+                "description": "Try again later",
+            }
+        ),
+        503,
+        {"Retry-After": str(config.PASSWORD_HASH_RETRY_AFTER)},
+    )
+
+
+def stateless_logout(token):
+    authorized = authenticate(token)
+    if type(authorized) is not dict:
+        return {"message": "No user logged"}, 200
+
+    user = UserProfile.query.get(authorized["user"]["id"])
+    revoke_user_tokens(user)
+    get_auth_cache().invalidate_user(user.id)
+
+    return {"message": "User logged out"}, 200
+
+
+def encode_user_token(user_profile: UserProfile, expires_at=None):
+    if expires_at is None:
+        lifetime = datetime.timedelta(hours=config.JWT_LIFETIME_HOURS)
+        expires_at = datetime.datetime.utcnow() + lifetime
+
+    return jwt.encode(
         {
             "public_id": user_profile.public_id,
-            "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=24),
+            "ver": user_profile.token_version,
+            "exp": expires_at,
         },
         config.SECRET_KEY,
         algorithm=config.JWT_ALGORITHMS,
     )
-    jwt_whited = JWTWhitelist(user_id=user_profile.id, token=token)
+
+
+def generate_user_token(user_profile: UserProfile):
+    lifetime = datetime.timedelta(hours=config.JWT_LIFETIME_HOURS)
+    expires_at = datetime.datetime.utcnow() + lifetime
+    token = encode_user_token(user_profile, expires_at)
+    jwt_whited = JWTWhitelist(
+        user_id=user_profile.id, token=token, expires_at=expires_at
+    )
     db.session.add(jwt_whited)
     db.session.commit()
 
@@ -201,12 +310,19 @@ def generate_user_token(user_profile: UserProfile):
 
 
 def clear_user_jwt(user_id: int):
+    if config.STATELESS_TOKENS:
+        revoke_user_tokens(UserProfile.query.get(user_id))
+        get_auth_cache().invalidate_user(user_id)
+        return
+
     jwt_token = JWTWhitelist.query.filter_by(user_id=user_id).first()
     # revoke user authorization
     if jwt_token:
         db.session.delete(jwt_token)
         db.session.commit()
 
+    get_auth_cache().invalidate_user(user_id)
+
 
 def get_token(current_request):
     error_response = make_response(
@@ -236,7 +352,9 @@ def decode_jwt(token):
         )
     except jwt.exceptions.ExpiredSignatureError:
         # TODO: refactor code related to adding and removing jwt from whitelist
-        whited = JWTWhitelist.query.filter_by(token=token).first()
+        whited = None
+        if not config.STATELESS_TOKENS:
+            whited = JWTWhitelist.query.filter_by(token=token).first()
         if whited:
             db.session.delete(whited)
             db.session.commit()
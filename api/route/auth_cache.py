@@ -0,0 +1,93 @@
+import hashlib
+import threading
+import time
+
+from flask import current_app
+
+import config
+
+
+class AuthCache:
+    """
+    Keeps the decoded claims of the tokens used recently, with the id and flags of
+    their user, so authorizing a repeat caller doesn't verify the token or query
+    the user again.
+    """
+
+    def __init__(self, max_size=config.AUTH_CACHE_SIZE, ttl=config.AUTH_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = {}
+        self._user_tokens = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token):
+        digest = token_digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry["expires_at"] < time.time():
+                self._remove(digest)
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return entry
+
+    def set(self, token, claims, user):
+        digest = token_digest(token)
+        # never keep a token past its own expiration
+        expires_at = min(time.time() + self.ttl, claims.get("exp", float("inf")))
+
+        with self._lock:
+            if digest not in self._entries and len(self._entries) >= self.max_size:
+                # drop the oldest entry, dicts keep insertion order
+                self._remove(next(iter(self._entries)))
+
+            entry = {
+                "claims": claims,
+                "user": {
+                    "id": user.id,
+                    "public_id": user.public_id,
+                    "admin": user.admin,
+                    "banned": user.banned,
+                },
+                "expires_at": expires_at,
+            }
+            self._entries[digest] = entry
+            self._user_tokens.setdefault(user.id, set()).add(digest)
+
+        return entry
+
+    def invalidate_token(self, token):
+        with self._lock:
+            self._remove(token_digest(token))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for digest in list(self._user_tokens.get(user_id, ())):
+                self._remove(digest)
+
+    def _remove(self, digest):
+        entry = self._entries.pop(digest, None)
+        if entry is None:
+            return
+
+        user_id = entry["user"]["id"]
+        digests = self._user_tokens.get(user_id, set())
+        digests.discard(digest)
+        if not digests:
+            self._user_tokens.pop(user_id, None)
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def get_auth_cache():
+    return current_app.extensions.setdefault("auth_cache", AuthCache())
@@ -0,0 +1,138 @@
+import threading
+import time
+
+import numpy as np
+
+import config
+from api.model.movie import Genre, Movie, movie_genre
+from app import db
+
+WORD_BITS = 64
+
+
+def pack_bits(bits):
+    """
+    Packs an array of booleans, whose length is a multiple of 64, in words
+    """
+    return np.packbits(bits, bitorder="little").view(np.uint64)
+
+
+def unpack_bits(words):
+    return np.unpackbits(words.view(np.uint8), bitorder="little")
+
+
+class GenreIndex:
+    """
+    A bitset of the ids of the movies of each genre, packed 64 movies to a numpy
+    word, and the release years of the movies by id. The genres of a filter,
+    and the release years, are combined with vectorized bitwise operations
+    instead of joining movie_genre once per genre.
+    """
+
+    def __init__(self, genres=(), movie_genres=(), release_years=()):
+        self._lock = threading.Lock()
+
+        release_years = np.array(list(release_years), dtype=np.int64).reshape(-1, 2)
+        movie_genres = np.array(list(movie_genres), dtype=np.int64).reshape(-1, 2)
+        movies = int(release_years[:, 0].max()) + 1 if len(release_years) else 0
+        self._size = -(-movies // WORD_BITS) * WORD_BITS
+        self._years = np.zeros(self._size, dtype=np.int32)
+        self._years[release_years[:, 0]] = release_years[:, 1]
+
+        self._genre_ids = {}
+        self._bits = {}
+        for genre_id, name in genres:
+            self._genre_ids[name.lower()] = genre_id
+            bits = np.zeros(self._size, dtype=bool)
+            bits[movie_genres[movie_genres[:, 1] == genre_id, 0]] = True
+            self._bits[genre_id] = pack_bits(bits)
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def from_database(cls):
+        batch_size = config.BULK_INSERT_BATCH_SIZE
+        return cls(
+            db.session.query(Genre.id, Genre.name),
+            db.session.query(movie_genre.c.movie_id, movie_genre.c.genre_id).yield_per(
+                batch_size
+            ),
+            db.session.query(Movie.id, Movie.release_year).yield_per(batch_size),
+        )
+
+    def movie_ids(
+        self, names, match_all=False, release_year_min=None, release_year_max=None
+    ):
+        """
+        Returns the sorted ids of the movies of any of the named genres, or of
+        all of them if match_all is set, released between the years given
+        """
+        with self._lock:
+            genre_ids = {self._genre_ids.get(name.lower()) for name in names}
+            if match_all and None in genre_ids:
+                return np.empty(0, dtype=np.int64)
+
+            genre_bits = [
+                self._bits[genre_id] for genre_id in genre_ids if genre_id is not None
+            ]
+            if not genre_bits:
+                return np.empty(0, dtype=np.int64)
+
+            if match_all:
+                bits = np.bitwise_and.reduce(genre_bits)
+            else:
+                bits = np.bitwise_or.reduce(genre_bits)
+
+            if release_year_min is not None or release_year_max is not None:
+                released = np.ones(self._size, dtype=bool)
+                if release_year_min is not None:
+                    released &= self._years >= release_year_min
+                if release_year_max is not None:
+                    released &= self._years <= release_year_max
+                bits &= pack_bits(released)
+
+        return np.flatnonzero(unpack_bits(bits))
+
+    def add(self, movie):
+        with self._lock:
+            self._grow(movie.id + 1)
+            self._years[movie.id] = movie.release_year
+
+            word, bit = divmod(movie.id, WORD_BITS)
+            mask = np.uint64(1 << bit)
+            for bits in self._bits.values():
+                bits[word] &= ~mask
+
+            for genre in movie.genres:
+                self._genre_ids[genre.name.lower()] = genre.id
+                if genre.id not in self._bits:
+                    self._bits[genre.id] = np.zeros(
+                        self._size // WORD_BITS, dtype=np.uint64
+                    )
+                self._bits[genre.id][word] |= mask
+
+    def remove(self, movie_id):
+        with self._lock:
+            if movie_id >= self._size:
+                return
+
+            word, bit = divmod(movie_id, WORD_BITS)
+            mask = np.uint64(1 << bit)
+            for bits in self._bits.values():
+                bits[word] &= ~mask
+
+    def _grow(self, movies):
+        if movies <= self._size:
+            return
+
+        # doubles the size, so adding movies one by one copies little
+        size = max(movies, 2 * self._size)
+        size = -(-size // WORD_BITS) * WORD_BITS
+        self._years = np.concatenate(
+            [self._years, np.zeros(size - self._size, dtype=np.int32)]
+        )
+        words = (size - self._size) // WORD_BITS
+        for genre_id, bits in self._bits.items():
+            self._bits[genre_id] = np.concatenate(
+                [bits, np.zeros(words, dtype=np.uint64)]
+            )
+        self._size = size
@@ -0,0 +1,144 @@
+from itertools import accumulate
+
+from flask import Blueprint, make_response, request
+
+import config
+from api import password
+from api.job.token_purge import get_purge_totals
+from api.metrics import get_metrics
+from api.route.auth_cache import get_auth_cache
+
+metrics_blueprint = Blueprint("metrics", __name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+forbidden_response = (
+    {
+        "message": "Forbidden access to the metrics",
+        "description": "The metrics are only served to the internal addresses.",
+        "status_code": 403,
+    },
+    403,
+)
+
+
+def labels(**values):
+    return ",".join(
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in values.items()
+    )
+
+
+def metric_header(name, kind, description):
+    return [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+
+
+def histogram_lines(name, histogram, buckets, **label_values):
+    lines = []
+    bucket_bounds = [str(bound) for bound in buckets] + ["+Inf"]
+    for bound, count in zip(bucket_bounds, accumulate(histogram.buckets)):
+        lines.append(f"{name}_bucket{{{labels(**label_values, le=bound)}}} {count}")
+
+    suffix = f"{{{labels(**label_values)}}}" if label_values else ""
+    lines.append(f"{name}_sum{suffix} {histogram.sum}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
+    return lines
+
+
+def exposition():
+    """
+    Renders the metrics in the Prometheus text exposition format
+    """
+    metrics = get_metrics()
+    collected = metrics.collect()
+    lines = []
+
+    lines += metric_header(
+        "http_requests_total", "counter", "Requests by endpoint, method and status."
+    )
+    for (endpoint, method, status), count in sorted(collected["requests"].items()):
+        lines.append(
+            "http_requests_total{%s} %s"
+            % (labels(endpoint=endpoint, method=method, status=status), count)
+        )
+
+    lines += metric_header(
+        "http_request_duration_seconds", "histogram", "Latency of the requests."
+    )
+    for endpoint, histogram in sorted(collected["latencies"].items()):
+        lines += histogram_lines(
+            "http_request_duration_seconds",
+            histogram,
+            metrics.buckets,
+            endpoint=endpoint,
+        )
+
+    lines += metric_header(
+        "db_queries_total", "counter", "SQL queries run by the requests."
+    )
+    for endpoint, (count, _) in sorted(collected["queries"].items()):
+        lines.append(f"db_queries_total{{{labels(endpoint=endpoint)}}} {count}")
+
+    lines += metric_header(
+        "db_query_seconds_total", "counter", "Time spent on the SQL queries."
+    )
+    for endpoint, (_, seconds) in sorted(collected["queries"].items()):
+        lines.append(f"db_query_seconds_total{{{labels(endpoint=endpoint)}}} {seconds}")
+
+    lines += metric_header(
+        "db_pool_checkout_wait_seconds",
+        "histogram",
+        "Wait for a connection of the database pool.",
+    )
+    lines += histogram_lines(
+        "db_pool_checkout_wait_seconds", collected["pool_wait"], metrics.buckets
+    )
+
+    auth_cache = get_auth_cache()
+    lines += metric_header(
+        "auth_cache_hits_total", "counter", "Authorizations found in the cache."
+    )
+    lines.append(f"auth_cache_hits_total {auth_cache.hits}")
+    lines += metric_header(
+        "auth_cache_misses_total", "counter", "Authorizations missing in the cache."
+    )
+    lines.append(f"auth_cache_misses_total {auth_cache.misses}")
+
+    lines += metric_header(
+        "password_hash_queue_depth",
+        "gauge",
+        "Passwords being hashed or waiting for a worker.",
+    )
+    lines.append(f"password_hash_queue_depth {password.password_pool.queue_depth}")
+
+    purge_totals = get_purge_totals()
+    lines += metric_header(
+        "token_purge_runs_total", "counter", "Runs of the expired tokens purge."
+    )
+    lines.append(f"token_purge_runs_total {purge_totals['runs']}")
+    lines += metric_header(
+        "token_purge_rows_total", "counter", "Rows deleted by the token purge."
+    )
+    for table, total in [
+        ("jwt_whitelist", "purged"),
+        ("token_revocation", "revocations"),
+    ]:
+        lines.append(
+            "token_purge_rows_total{%s} %s" % (labels(table=table), purge_totals[total])
+        )
+    lines += metric_header(
+        "token_purge_seconds_total", "counter", "Time spent on the token purge."
+    )
+    lines.append(f"token_purge_seconds_total {purge_totals['seconds']}")
+
+    return "\n".join(lines) + "\n"
+
+
+@metrics_blueprint.route("/metrics", methods=["GET"])
+def get_metrics_exposition():
+    if request.remote_addr not in config.METRICS_ALLOWED_ADDRESSES:
+        return make_response(forbidden_response)
+
+    response = make_response(exposition(), 200)
+    response.headers["Content-Type"] = CONTENT_TYPE
+    return response
@@ -3,15 +3,35 @@ import os
 from functools import wraps
 
 from flask import Blueprint, jsonify, json, request, make_response
-from sqlalchemy import desc, asc
+from sqlalchemy import case, false, func, select
+from sqlalchemy.orm import selectinload
 
 import config
-from api.model.movie import Movie
+from api.model.facets import MovieYearCount, decade_counts
+from api.model.movie import Genre, Movie, movie_genre, normalize_title
+from api.model.search import title_search
 from api.route.auth import authorized_user
-from api.route.paginate import paginate
+from api.route.paginate import paginate, paginate_cursor, filter_key, SortKey
+from api.route.movie_index import (
+    get_genre_index,
+    get_title_index,
+    get_trigram_index,
+)
 from api.schema.movie import MovieSchema
 from app import db
 
+# the listing filters, which tell apart the cached totals
+MOVIE_FILTERS = [
+    "release_year",
+    "release_year_min",
+    "release_year_max",
+    "title",
+    "title_fuzzy",
+    "q",
+    "genre",
+    "genre_match",
+]
+
 url_prefix = os.path.join(config.API_URL_PREFIX, "movies")
 movie_blueprint = Blueprint("movies", __name__, url_prefix=url_prefix)
 
@@ -30,69 +50,246 @@ def find_movie(f):
     return decorated
 
 
+def int_arg(args, name):
+    try:
+        return int(args[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def release_year_range(args):
+    """
+    Returns the lowest and highest release years of the filters, None if
+    unbounded
+    """
+    low = int_arg(args, "release_year_min")
+    high = int_arg(args, "release_year_max")
+
+    release_year = int_arg(args, "release_year")
+    if release_year is not None:
+        low = release_year if low is None else max(low, release_year)
+        high = release_year if high is None else min(high, release_year)
+
+    return low, high
+
+
+def release_year_filter(release_year, args):
+    """
+    Returns the criteria of the release year filters on the release year column
+    """
+    low, high = release_year_range(args)
+    if low is not None and low == high:
+        # a single year keeps the listing sorted by the release year indexes
+        return [release_year == low]
+
+    criteria = []
+    if low is not None:
+        criteria.append(release_year >= low)
+
+    if high is not None:
+        criteria.append(release_year <= high)
+
+    return criteria
+
+
+def genre_names(args):
+    return {name.strip().lower() for name in args.get("genre", "").split(",")} - {""}
+
+
+def genre_filter(args):
+    """
+    Returns the criterion of the genre filter: genre=A,B matches the movies of
+    any of the genres, or of all of them with genre_match=all. The movies are
+    found in the genre bitsets, already intersected with the release years; too
+    many to list are matched by joining the genres instead.
+    """
+    names = genre_names(args)
+    match_all = args.get("genre_match") == "all"
+
+    movie_ids = get_genre_index().movie_ids(names, match_all, *release_year_range(args))
+    if len(movie_ids) <= config.GENRE_FILTER_MAX_IDS:
+        return Movie.id.in_(movie_ids.tolist())
+
+    genre_movies = (
+        select(movie_genre.c.movie_id)
+        .join(Genre, Genre.id == movie_genre.c.genre_id)
+        .where(func.lower(Genre.name).in_(names))
+    )
+    if match_all:
+        genre_movies = genre_movies.group_by(movie_genre.c.movie_id).having(
+            func.count() == len(names)
+        )
+    return Movie.id.in_(genre_movies)
+
+
 def movie_query_filter(query, args):
-    if "release_year" in args and type(json.loads(args.get("release_year"))) is int:
-        query = query.filter_by(release_year=json.loads(args.get("release_year")))
+    query = query.filter(*release_year_filter(Movie.release_year, args))
+
+    if genre_names(args):
+        query = query.filter(genre_filter(args))
 
     if "title" in args:
-        query = query.filter(Movie.title.ilike(f"%{args.get('title').strip()}%"))
+        title = normalize_title(args.get("title"))
+        query = query.filter(Movie.normalized_title.contains(title, autoescape=True))
 
     return query
 
 
-def movie_query_sort_by(query, args):
+def title_fuzzy_search(query, title):
+    """
+    Filters the movies whose title contains the title with a few typos, returning
+    the query and the expression ranking them from the fewest typos. Titles too
+    short to have trigrams, or sharing them with too many titles to compare, are
+    matched without typos.
+    """
+    title = normalize_title(title)
+    movie_ids = get_trigram_index().match(title) if len(title) >= 3 else None
+    if movie_ids is None:
+        query = query.filter(Movie.normalized_title.contains(title, autoescape=True))
+        return query, Movie.id
+
+    if not movie_ids:
+        return query.filter(false()), Movie.id
+
+    closeness = case(
+        {movie_id: position for position, movie_id in enumerate(movie_ids)},
+        value=Movie.id,
+    )
+    return query.filter(Movie.id.in_(movie_ids)), closeness
+
+
+def movie_query_search(query, args):
+    """
+    Filters the movies matching the q search or the title_fuzzy filter,
+    returning the query and the sort key ranking them by relevance, or None
+    without a search
+    """
+    rank = None
+    if "title_fuzzy" in args:
+        query, closeness = title_fuzzy_search(query, args.get("title_fuzzy"))
+        rank = SortKey("rank", closeness, False)
+
+    if "q" in args:
+        query, relevance, descending = title_search(query, args.get("q"))
+        rank = SortKey("rank", relevance, descending)
+
+    return query, rank
+
+
+def movie_sort_keys(args, rank=None):
+    sort_keys = []
+    if rank is not None and "sort" not in args:
+        # search results go from the most relevant unless sorted otherwise
+        sort_keys.append(rank)
     if "sort" in args:
         sorting = args.get("sort").split(",")
         for by in sorting:
-            order = desc if "-" in by else asc
+            descending = "-" in by
             if "title" in by:
-                query = query.order_by(order(Movie.title))
+                sort_keys.append(SortKey("title", Movie.title, descending))
             elif "release_year" in by:
-                query = query.order_by(order(Movie.release_year))
-
-    return query
+                sort_keys.append(
+                    SortKey("release_year", Movie.release_year, descending)
+                )
+            elif "likes" in by:
+                sort_keys.append(SortKey("likes", Movie.like_count, descending))
 
+    # the id breaks ties, so every movie has a single position in the listing
+    sort_keys.append(SortKey("id", Movie.id, False))
+    return sort_keys
 
-def movie_sort_by_likes(movies, args):
-    order = True
-    if "-likes" in args["sort"]:
-        order = False  # False is asc
-    movies = sorted(movies, key=lambda m: m["likes"], reverse=order)
 
-    return json.loads(json.dumps(movies))
+def movie_query_sort_by(query, args, rank=None):
+    return query.order_by(*[key.ordering for key in movie_sort_keys(args, rank)])
 
 
 @movie_blueprint.route("", methods=["GET"])
 @authorized_user
 def get_all_movies(user):
     movie_schema = MovieSchema(many=True)
-    query = Movie.query
+    query = Movie.query.options(selectinload(Movie.genres))
     query = movie_query_filter(query, request.args)
-    query = movie_query_sort_by(query, request.args)
-
-    if "page" in request.args:
-        page = request.args.get("page", 1, type=int)
-
-        results = paginate(query, movie_schema, page, "movies")
-
-        # TODO: learn how to use sqlalchemy and use query instead
-        if "sort" in request.args and "likes" in request.args["sort"]:
-            results[0]["movies"] = movie_sort_by_likes(
-                json.loads(json.dumps(results[0]))["movies"], request.args
+    query, rank = movie_query_search(query, request.args)
+    query = movie_query_sort_by(query, request.args, rank)
+
+    if "cursor" in request.args or "page" in request.args:
+        key = filter_key(request.args, MOVIE_FILTERS)
+        if "cursor" in request.args:
+            results = paginate_cursor(
+                query,
+                movie_schema,
+                request.args.get("cursor"),
+                "movies",
+                movie_sort_keys(request.args, rank),
+                key,
             )
+        else:
+            page = request.args.get("page", 1, type=int)
+            results = paginate(query, movie_schema, page, "movies", key)
 
         results = make_response(results)
     else:
         movies = query.all()
-        movies = json.loads(movie_schema.dumps(movies))
-        # TODO: learn how to use sqlalchemy and use query instead
-        if "sort" in request.args and "likes" in request.args["sort"]:
-            movies = movie_sort_by_likes(movies, request.args)
-        results = make_response((jsonify(movies), 200))
+        results = make_response((jsonify(json.loads(movie_schema.dumps(movies))), 200))
 
     return results
 
 
+@movie_blueprint.route("/suggest", methods=["GET"])
+@authorized_user
+def suggest_movies(user):
+    prefix = request.args.get("prefix", "")
+    normalized_prefix = normalize_title(prefix)
+    if not normalized_prefix:
+        return (
+            jsonify({"message": "Missing suggestion prefix", "status_code": 422}),
+            422,
+        )
+
+    # a trailing space means the last word is complete
+    if prefix[-1].isspace():
+        normalized_prefix += " "
+
+    limit = request.args.get("limit", config.SUGGEST_LIMIT, type=int)
+    limit = min(max(limit, 1), config.SUGGEST_MAX_LIMIT)
+
+    suggestions = get_title_index().suggest(normalized_prefix, limit)
+    return jsonify({"prefix": normalized_prefix, "suggestions": suggestions}), 200
+
+
+@movie_blueprint.route("/facets", methods=["GET"])
+@authorized_user
+def get_movie_facets(user):
+    if any(name in request.args for name in ["title", "title_fuzzy", "q", "genre"]):
+        # the counts are by release year only, the other filters are grouped
+        query = db.session.query(Movie.release_year, func.count(Movie.id))
+        query = movie_query_filter(query, request.args)
+        query, _ = movie_query_search(query, request.args)
+        query = query.group_by(Movie.release_year)
+    else:
+        query = db.session.query(
+            MovieYearCount.release_year, MovieYearCount.movies
+        ).filter(*release_year_filter(MovieYearCount.release_year, request.args))
+
+    year_counts = sorted(query.all())
+    return (
+        jsonify(
+            {
+                "total": sum(movies for _, movies in year_counts),
+                "release_years": [
+                    {"release_year": release_year, "movies": movies}
+                    for release_year, movies in year_counts
+                ],
+                "decades": [
+                    {"decade": decade, "movies": movies}
+                    for decade, movies in decade_counts(year_counts)
+                ],
+            }
+        ),
+        200,
+    )
+
+
 @movie_blueprint.route("/<public_id>", methods=["GET"])
 @find_movie
 @authorized_user
@@ -105,8 +302,11 @@ def get_movie(user, movie, public_id):
 @find_movie
 @authorized_user
 def like_movie(user, movie, public_id):
-    movie_schema = MovieSchema(exclude=["release_year", "poster_img_url"])
-    user.liked_movies.append(movie)
+    movie_schema = MovieSchema(exclude=["release_year", "poster_img_url", "genres"])
+
+    if movie not in user.liked_movies:
+        user.liked_movies.append(movie)
+
     db.session.commit()
     return make_response(
         jsonify(
@@ -123,7 +323,7 @@ def like_movie(user, movie, public_id):
 @find_movie
 @authorized_user
 def unlike_movie(user, movie, public_id):
-    movie_schema = MovieSchema(exclude=["release_year", "poster_img_url"])
+    movie_schema = MovieSchema(exclude=["release_year", "poster_img_url", "genres"])
 
     if user.liked_movies.count(movie) > 0:
         user.liked_movies.remove(movie)
@@ -0,0 +1,74 @@
+import threading
+import time
+
+from flask import current_app
+
+import config
+from api.route.genre_index import GenreIndex
+from api.route.title_index import TitleIndex, TrigramIndex
+
+# the indexes kept in the app extensions, updated by the admin movie routes
+MOVIE_INDEXES = {
+    "title_index": TitleIndex,
+    "trigram_index": TrigramIndex,
+    "genre_index": GenreIndex,
+}
+
+
+def get_index(name):
+    """
+    Returns the movie index of the app, built on first use. An index older than
+    MOVIE_INDEX_TTL keeps serving while a new one, with the current movies and
+    likes, is built in the background.
+    """
+    app = current_app._get_current_object()
+    index = app.extensions.get(name)
+    if index is None:
+        index = app.extensions[name] = MOVIE_INDEXES[name].from_database()
+    elif time.monotonic() - index.built_at > config.MOVIE_INDEX_TTL:
+        rebuild_index(app, name, index)
+    return index
+
+
+def get_title_index():
+    return get_index("title_index")
+
+
+def get_trigram_index():
+    return get_index("trigram_index")
+
+
+def get_genre_index():
+    return get_index("genre_index")
+
+
+def rebuild_index(app, name, index):
+    # the stale index is only rebuilt once
+    index.built_at = float("inf")
+
+    def rebuild():
+        with app.app_context():
+            try:
+                app.extensions[name] = MOVIE_INDEXES[name].from_database()
+            except Exception:
+                index.built_at = time.monotonic()
+                raise
+
+    threading.Thread(target=rebuild, name=name, daemon=True).start()
+
+
+def index_movie(movie):
+    """
+    Adds or updates the movie in the movie indexes built already
+    """
+    for name in MOVIE_INDEXES:
+        index = current_app.extensions.get(name)
+        if index is not None:
+            index.add(movie)
+
+
+def unindex_movie(movie_id):
+    for name in MOVIE_INDEXES:
+        index = current_app.extensions.get(name)
+        if index is not None:
+            index.remove(movie_id)
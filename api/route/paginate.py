@@ -1,22 +1,199 @@
+import base64
+import binascii
 import math
+import threading
+import time
+from collections import namedtuple
 
-from flask import json
+from flask import json, current_app
+from sqlalchemy import and_, or_, tuple_
 
 import config
 
 
-def paginate(query, schema, page, name):
-    total_pages = math.ceil(len(query.all()) / config.ROWS_PER_PAGE)
-    # don't allow user to go past the last page
+class SortKey(namedtuple("SortKey", ["name", "column", "descending"])):
+    """
+    A column a listing is ordered by. Listings end with a unique key, so the
+    sort keys of the last row of a page tell where the next page starts.
+    """
+
+    @property
+    def ordering(self):
+        return self.column.desc() if self.descending else self.column.asc()
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class TotalCountCache:
+    """
+    Keeps the total number of rows of a paginated listing for each normalized
+    filter, so paging through a listing only counts the rows once.
+    """
+
+    def __init__(
+        self, max_size=config.TOTAL_COUNT_CACHE_SIZE, ttl=config.TOTAL_COUNT_CACHE_TTL
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._totals.get(key)
+            if entry is None:
+                return None
+
+            total, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._totals[key]
+                return None
+
+            return total
+
+    def set(self, key, total):
+        with self._lock:
+            if key not in self._totals and len(self._totals) >= self.max_size:
+                # drop the oldest entry, dicts keep insertion order
+                del self._totals[next(iter(self._totals))]
+            self._totals[key] = (total, time.monotonic() + self.ttl)
+
+    def invalidate(self, name):
+        with self._lock:
+            for key in [key for key in self._totals if key[0] == name]:
+                del self._totals[key]
+
+
+def get_total_cache():
+    return current_app.extensions.setdefault("total_count_cache", TotalCountCache())
+
+
+def invalidate_total(name):
+    """
+    Forgets every cached total of the listing, call it after writing to its table
+    """
+    get_total_cache().invalidate(name)
+
+
+def filter_key(args, filters):
+    """
+    Normalizes the filter arguments of a request so equivalent filters share
+    the same cached total
+    """
+    return tuple(
+        (arg, args.get(arg).strip().lower()) for arg in sorted(filters) if arg in args
+    )
+
+
+def count_total(query, name, key=None):
+    cache = get_total_cache()
+    cache_key = (name, key)
+
+    total = cache.get(cache_key) if key is not None else None
+    if total is None:
+        # count without the ordering, it doesn't change the number of rows
+        total = query.order_by(None).count()
+        if key is not None:
+            cache.set(cache_key, total)
+
+    return total
 
-    if page > total_pages:
+
+def paginate(query, schema, page, name, key=None):
+    total = count_total(query, name, key)
+    total_pages = math.ceil(total / config.ROWS_PER_PAGE)
+
+    # don't allow user to go past the last page
+    if page < 1 or page > total_pages:
         return {"message": "No more pages.", "status_code": 404}, 404
 
-    items = query.paginate(page=page, per_page=config.ROWS_PER_PAGE)
+    items = (
+        query.limit(config.ROWS_PER_PAGE)
+        .offset(config.ROWS_PER_PAGE * (page - 1))
+        .all()
+    )
 
     results = {
         "page": page,
-        "count": config.ROWS_PER_PAGE * (page - 1) + len(items.items),
-        name: json.loads(schema.dumps(items.items)),
+        "count": config.ROWS_PER_PAGE * (page - 1) + len(items),
+        "total": total,
+        "total_pages": total_pages,
+        name: json.loads(schema.dumps(items)),
+    }
+    return results, 200
+
+
+def encode_cursor(sort_keys, values):
+    cursor = {
+        "sort": [("-" if key.descending else "") + key.name for key in sort_keys],
+        "values": list(values),
+    }
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(sort_keys, cursor):
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        sort, values = cursor["sort"], cursor["values"]
+    except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError):
+        raise InvalidCursor("Malformed pagination cursor")
+
+    # a cursor only makes sense for the ordering it was created with
+    expected = [("-" if key.descending else "") + key.name for key in sort_keys]
+    if sort != expected or len(values) != len(sort_keys):
+        raise InvalidCursor("Pagination cursor doesn't match the requested sort")
+
+    return values
+
+
+def after_keys(sort_keys, values):
+    """
+    Filters the rows that come after the given sort key values
+    """
+    if len({key.descending for key in sort_keys}) == 1:
+        # same direction for every key, compare them as a row value
+        columns = tuple_(*[key.column for key in sort_keys])
+        if sort_keys[0].descending:
+            return columns < tuple_(*values)
+        return columns > tuple_(*values)
+
+    clauses = []
+    for i, key in enumerate(sort_keys):
+        equal = [k.column == v for k, v in zip(sort_keys[:i], values[:i])]
+        after = key.column < values[i] if key.descending else key.column > values[i]
+        clauses.append(and_(*equal, after))
+
+    return or_(*clauses)
+
+
+def paginate_cursor(query, schema, cursor, name, sort_keys, key=None):
+    """
+    Pages through a query ordered by its sort keys without an OFFSET, every
+    page starts right after the last row of the previous one.
+    """
+    try:
+        values = decode_cursor(sort_keys, cursor) if cursor else None
+    except InvalidCursor as error:
+        return {"message": str(error), "status_code": 400}, 400
+
+    total = count_total(query, name, key)
+    if values is not None:
+        query = query.filter(after_keys(sort_keys, values))
+
+    rows = (
+        query.add_columns(*[sort_key.column for sort_key in sort_keys])
+        .limit(config.ROWS_PER_PAGE + 1)
+        .all()
+    )
+    has_next = len(rows) > config.ROWS_PER_PAGE
+    rows = rows[: config.ROWS_PER_PAGE]
+
+    results = {
+        "count": len(rows),
+        "total": total,
+        "next_cursor": encode_cursor(sort_keys, rows[-1][1:]) if has_next else None,
+        name: json.loads(schema.dumps([row[0] for row in rows])),
     }
     return results, 200
@@ -0,0 +1,105 @@
+import datetime
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import update
+
+import config
+from api.model.auth import TokenRevocation
+from api.model.user_profile import UserProfile
+from app import db
+
+
+class RevocationMap:
+    """
+    In memory map of the token version each user's tokens must have, refreshed
+    incrementally from the revocation log. Revocations older than the token
+    lifetime are evicted, every token they revoked has expired already.
+    """
+
+    def __init__(self, refresh_interval=config.TOKEN_REVOCATION_REFRESH):
+        self.refresh_interval = refresh_interval
+        self._versions = {}
+        self._last_id = None
+        self._refreshed_at = 0
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        if not force and time.monotonic() - self._refreshed_at < self.refresh_interval:
+            return
+
+        # older revocations only revoked tokens that have expired already
+        lifetime = datetime.timedelta(hours=config.JWT_LIFETIME_HOURS)
+        since = datetime.datetime.utcnow() - lifetime
+
+        query = TokenRevocation.query
+        if self._last_id is None:
+            query = query.filter(TokenRevocation.revoked_at >= since)
+        else:
+            query = query.filter(TokenRevocation.id > self._last_id)
+
+        revocations = query.order_by(TokenRevocation.id).all()
+
+        with self._lock:
+            for revocation in revocations:
+                self._revoke(
+                    revocation.public_id,
+                    revocation.token_version,
+                    revocation.revoked_at,
+                )
+                self._last_id = max(self._last_id or 0, revocation.id)
+            self._evict(since)
+            if self._last_id is None:
+                self._last_id = 0
+            self._refreshed_at = time.monotonic()
+
+    def revoke(self, public_id, token_version):
+        with self._lock:
+            self._revoke(public_id, token_version, datetime.datetime.utcnow())
+
+    def is_revoked(self, claims):
+        self.refresh()
+        version, _ = self._versions.get(claims.get("public_id"), (0, None))
+        return claims.get("ver", 0) < version
+
+    def _revoke(self, public_id, token_version, revoked_at):
+        version, _ = self._versions.get(public_id, (0, None))
+        if token_version >= version:
+            self._versions[public_id] = (token_version, revoked_at)
+
+    def _evict(self, since):
+        expired = [
+            public_id
+            for public_id, (_, revoked_at) in self._versions.items()
+            if revoked_at < since
+        ]
+        for public_id in expired:
+            del self._versions[public_id]
+
+
+def get_revocations():
+    return current_app.extensions.setdefault("token_revocations", RevocationMap())
+
+
+def revoke_user_tokens(user):
+    """
+    Increases the user's token version, revoking every token issued before
+    """
+    db.session.execute(
+        update(UserProfile)
+        .where(UserProfile.id == user.id)
+        .values(token_version=UserProfile.token_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    token_version = (
+        db.session.query(UserProfile.token_version)
+        .filter(UserProfile.id == user.id)
+        .scalar()
+    )
+    db.session.add(
+        TokenRevocation(public_id=user.public_id, token_version=token_version)
+    )
+    db.session.commit()
+
+    get_revocations().revoke(user.public_id, token_version)
@@ -0,0 +1,266 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left
+
+import numpy as np
+
+import config
+from api.model.movie import Movie
+from app import db
+
+
+class TitleIndex:
+    """
+    Normalized titles of the movies in a sorted list, so the titles starting
+    with a prefix are a range found by binary search. The most liked movies of
+    the prefixes matching too many titles to rank per request are kept until a
+    movie under them changes.
+    """
+
+    def __init__(self, movies=()):
+        self._lock = threading.RLock()
+        self._movies = {}
+        self._top = {}
+        entries = []
+        for movie_id, public_id, title, normalized_title, like_count in movies:
+            self._movies[movie_id] = (public_id, title, normalized_title, like_count)
+            entries.append((normalized_title, movie_id))
+        entries.sort()
+        self._keys = [normalized_title for normalized_title, _ in entries]
+        self._ids = [movie_id for _, movie_id in entries]
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def from_database(cls):
+        query = db.session.query(
+            Movie.id,
+            Movie.public_id,
+            Movie.title,
+            Movie.normalized_title,
+            Movie.like_count,
+        )
+        return cls(query.yield_per(config.BULK_INSERT_BATCH_SIZE))
+
+    def __len__(self):
+        return len(self._ids)
+
+    def suggest(self, prefix, limit=config.SUGGEST_LIMIT):
+        """
+        Returns the public id, title and likes of the most liked movies whose
+        normalized title starts with the prefix
+        """
+        with self._lock:
+            start = bisect_left(self._keys, prefix)
+            end = bisect_left(self._keys, prefix + "\uffff", start)
+
+            if end - start > config.SUGGEST_SCAN_LIMIT:
+                top = self._top.get(prefix)
+                if top is None:
+                    top = self._top[prefix] = self._most_liked(
+                        start, end, config.SUGGEST_MAX_LIMIT
+                    )
+                top = top[:limit]
+            else:
+                top = self._most_liked(start, end, limit)
+
+            return [
+                {
+                    "public_id": self._movies[movie_id][0],
+                    "title": self._movies[movie_id][1],
+                    "likes": self._movies[movie_id][3],
+                }
+                for movie_id in top
+            ]
+
+    def add(self, movie):
+        with self._lock:
+            self._remove(movie.id)
+            self._movies[movie.id] = (
+                movie.public_id,
+                movie.title,
+                movie.normalized_title,
+                movie.like_count or 0,
+            )
+            position = bisect_left(self._keys, movie.normalized_title)
+            self._keys.insert(position, movie.normalized_title)
+            self._ids.insert(position, movie.id)
+            self._forget_top(movie.normalized_title)
+
+    def remove(self, movie_id):
+        with self._lock:
+            self._remove(movie_id)
+
+    def _remove(self, movie_id):
+        movie = self._movies.pop(movie_id, None)
+        if movie is None:
+            return
+
+        normalized_title = movie[2]
+        position = bisect_left(self._keys, normalized_title)
+        while self._ids[position] != movie_id:
+            position += 1
+        del self._keys[position]
+        del self._ids[position]
+        self._forget_top(normalized_title)
+
+    def _most_liked(self, start, end, limit):
+        return heapq.nlargest(
+            limit,
+            self._ids[start:end],
+            key=lambda movie_id: self._movies[movie_id][3],
+        )
+
+    def _forget_top(self, normalized_title):
+        for prefix in [
+            prefix for prefix in self._top if normalized_title.startswith(prefix)
+        ]:
+            del self._top[prefix]
+
+
+def trigrams(title):
+    """
+    Returns the codes of the distinct trigrams of a normalized title, sorted
+    """
+    codes = np.frombuffer(title.encode("ascii", "replace"), dtype=np.uint8)
+    codes = codes.astype(np.int32)
+    return np.unique(codes[:-2] << 16 | codes[1:-1] << 8 | codes[2:])
+
+
+def substring_distance(pattern, text):
+    """
+    Returns the fewest edits turning the pattern into a substring of the text,
+    with Myers' bit-parallel algorithm: the column of the edit distances of the
+    pattern prefixes is kept as the bits of its vertical differences
+    """
+    length = len(pattern)
+    if not length:
+        return 0
+
+    pattern_bits = {}
+    for position, char in enumerate(pattern):
+        pattern_bits[char] = pattern_bits.get(char, 0) | 1 << position
+    mask = (1 << length) - 1
+    last = 1 << (length - 1)
+
+    positive, negative = mask, 0
+    distance = best = length
+    for char in text:
+        equal = pattern_bits.get(char, 0)
+        vertical = equal | negative
+        horizontal = (((equal & positive) + positive) ^ positive) | equal
+        horizontal_positive = negative | ~(horizontal | positive) & mask
+        horizontal_negative = positive & horizontal
+
+        if horizontal_positive & last:
+            distance += 1
+        elif horizontal_negative & last:
+            distance -= 1
+        best = min(best, distance)
+
+        # the substring can start anywhere, the first row stays at zero
+        horizontal_positive = (horizontal_positive << 1) & mask
+        horizontal_negative = (horizontal_negative << 1) & mask
+        positive = horizontal_negative | ~(vertical | horizontal_positive) & mask
+        negative = horizontal_positive & vertical
+
+    return best
+
+
+class TrigramIndex:
+    """
+    Inverted index of the trigrams of the normalized titles. The postings of
+    all the trigrams are one numpy array sorted by trigram, so the titles
+    sharing trigrams with a misspelled filter are counted with a few array
+    operations, and only the titles sharing enough are compared with it.
+    Movies changed after the index was built are kept apart and compared
+    every time.
+    """
+
+    def __init__(self, movies=()):
+        self._lock = threading.Lock()
+        self._changed = {}
+        self._removed = set()
+
+        ids, titles = [], []
+        for movie_id, normalized_title in movies:
+            ids.append(movie_id)
+            titles.append(normalized_title)
+        self._ids = np.array(ids, dtype=np.int64)
+        self._titles = titles
+
+        # the titles joined by zeros, the trigrams with a zero cross two titles
+        codes = np.frombuffer(
+            "\0".join(titles).encode("ascii", "replace"), dtype=np.uint8
+        ).astype(np.int32)
+        grams = codes[:-2] << 16 | codes[1:-1] << 8 | codes[2:]
+        rows = np.cumsum(codes == 0, dtype=np.int32)[:-2]
+        valid = (codes[:-2] != 0) & (codes[1:-1] != 0) & (codes[2:] != 0)
+
+        # sorting by trigram then row also drops the repeated trigrams of a title
+        count = max(len(titles), 1)
+        postings = np.unique(grams[valid].astype(np.int64) * count + rows[valid])
+        self._grams = (postings // count).astype(np.int32)
+        self._rows = (postings % count).astype(np.int32)
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def from_database(cls):
+        query = db.session.query(Movie.id, Movie.normalized_title)
+        return cls(query.yield_per(config.BULK_INSERT_BATCH_SIZE))
+
+    def __len__(self):
+        return len(self._titles) - len(self._removed) + len(self._changed)
+
+    def match(self, title):
+        """
+        Returns the ids of all the movies whose normalized title contains the
+        normalized title with at most one edit every FUZZY_CHARS_PER_EDIT
+        characters, the fewest edits first, or None if more than
+        FUZZY_MAX_CANDIDATES titles share enough trigrams to be compared
+        """
+        grams = trigrams(title)
+        max_edits = len(title) // config.FUZZY_CHARS_PER_EDIT
+        # an edit changes at most three trigrams
+        min_shared = max(len(grams) - 3 * max_edits, 1)
+
+        starts = np.searchsorted(self._grams, grams)
+        ends = np.searchsorted(self._grams, grams, side="right")
+        rows = np.concatenate(
+            [self._rows[start:end] for start, end in zip(starts, ends)]
+            + [np.empty(0, dtype=np.int32)]
+        )
+        shared = np.bincount(rows, minlength=len(self._titles))
+        candidates = np.flatnonzero(shared >= min_shared)
+        if len(candidates) > config.FUZZY_MAX_CANDIDATES:
+            return None
+
+        with self._lock:
+            changed = dict(self._changed)
+            removed = set(self._removed)
+
+        matches = []
+        for row in candidates:
+            movie_id = int(self._ids[row])
+            if movie_id not in removed:
+                distance = substring_distance(title, self._titles[row])
+                if distance <= max_edits:
+                    matches.append((distance, -int(shared[row]), movie_id))
+
+        for movie_id, normalized_title in changed.items():
+            distance = substring_distance(title, normalized_title)
+            if distance <= max_edits:
+                common = np.intersect1d(grams, trigrams(normalized_title))
+                matches.append((distance, -len(common), movie_id))
+
+        return [movie_id for _, _, movie_id in sorted(matches)]
+
+    def add(self, movie):
+        with self._lock:
+            self._removed.add(movie.id)
+            self._changed[movie.id] = movie.normalized_title
+
+    def remove(self, movie_id):
+        with self._lock:
+            self._removed.add(movie_id)
+            self._changed.pop(movie_id, None)
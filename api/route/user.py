@@ -2,8 +2,10 @@ import os
 from functools import wraps
 
 from flask import Blueprint, make_response, jsonify, json, request
+from sqlalchemy.orm import selectinload
 
 import config
+from api.model.movie import Movie
 from api.model.user_profile import UserProfile
 from api.route.auth import authorized_user
 from api.schema.movie import MovieSchema
@@ -25,7 +27,8 @@ forbidden_response = (
 
 def profile_exists(f):
     """
-    Checks if the user with the provided public id exists
+    Checks if the user with the provided public id exists, passing it to the
+    route after the current user
     """
 
     @wraps(f)
@@ -39,7 +42,7 @@ def profile_exists(f):
                 404,
             )
 
-        return f(*args, **kwargs)
+        return f(queried_user, *args, **kwargs)
 
     return decorated
 
@@ -47,9 +50,7 @@ def profile_exists(f):
 @user_blueprint.route("/<public_id>", methods=["GET", "PUT"])
 @profile_exists
 @authorized_user
-def get_user_profile(current_user, public_id):
-    user_info = UserProfile.query.filter_by(public_id=public_id).first()
-
+def get_user_profile(current_user, user_info, public_id):
     # forbid anyone that is not the user or an admin from accessing the information
     if current_user.public_id != public_id and not current_user.admin:
         return make_response(forbidden_response)
@@ -71,14 +72,17 @@ def get_user_profile(current_user, public_id):
 @user_blueprint.route("/<public_id>/movies", methods=["GET"])
 @profile_exists
 @authorized_user
-def get_user_liked_movies(current_user, public_id):
-    user_info = UserProfile.query.filter_by(public_id=public_id).first()
-
+def get_user_liked_movies(current_user, user_info, public_id):
     # forbid anyone that is not the user or an admin from accessing the information
     if current_user.public_id != public_id and not current_user.admin:
         return make_response(forbidden_response)
 
     movie_schema = MovieSchema(many=True)
-    movies = movie_schema.dumps(user_info.liked_movies)
+    liked_movies = (
+        Movie.query.with_parent(user_info, UserProfile.liked_movies)
+        .options(selectinload(Movie.genres))
+        .order_by(Movie.title)
+    )
+    movies = movie_schema.dumps(liked_movies)
 
     return jsonify(json.loads(movies)), 200
@@ -8,12 +8,16 @@ class MovieSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = Movie
         load_instance = True
-        exclude = ("id",)
+        exclude = ("id", "like_count", "normalized_title", "tconst", "content_hash")
 
     likes = fields.Method("get_likes", deserialize="load_likes")
+    genres = fields.Method("get_genres")
 
     def get_likes(self, obj):
-        return len(obj.likes)
+        return obj.like_count
+
+    def get_genres(self, obj):
+        return [genre.name for genre in obj.genres]
 
     def load_likes(self, value):
         return int(value)
@@ -7,6 +7,6 @@ class UserProfileSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = UserProfile
         load_instance = True
-        exclude = ("id", "password")
+        exclude = ("id", "password", "token_version")
 
     liked_movies = ma.Nested(MovieSchema, many=True)
@@ -26,19 +26,37 @@ def create_app():
     migrate.init_app(app, db)
     ma.init_app(app)
 
-    from api.model import user_profile, auth, movie
+    from api.model import user_profile, auth, movie, search, facets
+    from api.metrics import init_metrics
+    from api.query_stats import init_query_stats
 
-    from api.route import auth, admin, user, movie
+    init_query_stats(app)
+    init_metrics(app)
+
+    from api.route import auth, admin, user, movie, metrics
 
     app.register_blueprint(auth.auth_blueprint)
     app.register_blueprint(admin.admin_blueprint)
     app.register_blueprint(user.user_blueprint)
     app.register_blueprint(movie.movie_blueprint)
+    app.register_blueprint(metrics.metrics_blueprint)
+
+    from api.profiler import init_profiler
+
+    init_profiler(app)
+
+    from api.job.movie_loader import sync_movies_command
+    from api.job.token_purge import purge_tokens_command, start_token_purger
+
+    app.cli.add_command(purge_tokens_command)
+    app.cli.add_command(sync_movies_command)
+
+    if config.TOKEN_PURGE_INTERVAL:
+        start_token_purger(app, config.TOKEN_PURGE_INTERVAL)
 
     return app
 
 
 if __name__ == "__main__":
     app = create_app()
-
     app.run(host=config.APP_HOST, port=config.APP_PORT)
@@ -0,0 +1,60 @@
+#! python3
+# compare - Compares two results files written by bench/run.py.
+#
+#   python -m bench.compare baseline.json results.json
+
+import argparse
+import json
+
+METRICS = ["p50_ms", "p99_ms", "queries_per_request", "peak_allocated_bytes"]
+
+
+def compare(baseline, results, threshold):
+    """
+    Returns the lines comparing the metrics of the cases in both results, and
+    whether any of them regressed over the threshold ratio
+    """
+    lines = []
+    regressed = False
+    for name, result in results["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+
+        changes = []
+        for metric in METRICS:
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+
+            ratio = new / old
+            flag = ""
+            if ratio > 1 + threshold:
+                flag = " !"
+                regressed = True
+            changes.append(f"{metric} {old} -> {new} ({ratio:.2f}x){flag}")
+        lines.append(f"{name}: " + ", ".join(changes))
+
+    return lines, regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare benchmark results.")
+    parser.add_argument("baseline")
+    parser.add_argument("results")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="ratio over the baseline reported as a regression",
+    )
+    args = parser.parse_args()
+
+    with open(args.baseline) as baseline_file, open(args.results) as results_file:
+        lines, regressed = compare(
+            json.load(baseline_file), json.load(results_file), args.threshold
+        )
+
+    print("\n".join(lines))
+    if regressed:
+        raise SystemExit(1)
@@ -0,0 +1,186 @@
+#! python3
+# query_plans - Compares the plans of the listing queries with and without the
+# indexes of the listing filters and sorts.
+#
+# The queries are built by the same functions the routes use, and are explained
+# and timed on a generated dataset first without the indexes and then with them.
+#
+#   python -m bench.query_plans --users 10000 --movies 100000
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+from sqlalchemy.engine import make_url
+
+import config
+from api.job.dataset import generate_dataset
+from api.model.movie import Movie, movie_like
+from api.model.user_profile import UserProfile
+from api.route.admin import user_query_filter, user_query_sort_by
+from api.route.movie import movie_query_filter, movie_query_sort_by
+from app import create_app, db
+
+LISTING_INDEXES = [
+    "ix_movie_release_year_title",
+    "ix_movie_release_year_like_count",
+    "ix_movie_title",
+    "ix_user_profile_admin_banned",
+    "ix_user_profile_banned",
+    "ix_user_profile_name",
+    "ix_movie_like_user_id",
+]
+
+
+def listing_queries(user_id):
+    def movies(args):
+        query = movie_query_sort_by(movie_query_filter(Movie.query, args), args)
+        return query.limit(config.ROWS_PER_PAGE)
+
+    def users(args):
+        query = user_query_sort_by(user_query_filter(UserProfile.query, args), args)
+        return query.limit(config.ROWS_PER_PAGE)
+
+    return {
+        "movies_by_year_sorted_by_title": movies(
+            {"release_year": "2000", "sort": "title"}
+        ),
+        "movies_by_year_sorted_by_likes": movies(
+            {"release_year": "2000", "sort": "-likes"}
+        ),
+        "movies_sorted_by_title": movies({"sort": "title"}),
+        "users_by_admin_and_banned": users({"admin": "false", "banned": "true"}),
+        "users_by_banned": users({"banned": "true"}),
+        "users_sorted_by_name": users({"sort": "name"}),
+        "user_liked_movies": Movie.query.join(
+            movie_like, movie_like.c.movie_id == Movie.id
+        )
+        .filter(movie_like.c.user_id == user_id)
+        .order_by(Movie.title),
+    }
+
+
+def literal_sql(query):
+    return str(
+        query.statement.compile(
+            dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def explain(sql):
+    if db.engine.dialect.name == "sqlite":
+        rows = db.session.execute("EXPLAIN QUERY PLAN " + sql)
+        return [row[-1] for row in rows]
+
+    return [row[0] for row in db.session.execute("EXPLAIN " + sql)]
+
+
+def time_query(sql, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        db.session.execute(sql).fetchall()
+        timings.append(time.perf_counter() - started)
+    return round(statistics.median(timings) * 1000, 3)
+
+
+def listing_indexes():
+    return [
+        index
+        for table in [Movie.__table__, UserProfile.__table__, movie_like]
+        for index in table.indexes
+        if index.name in LISTING_INDEXES
+    ]
+
+
+def measure_plans(queries, repeat):
+    return {
+        name: {"plan": explain(sql), "median_ms": time_query(sql, repeat)}
+        for name, sql in queries.items()
+    }
+
+
+def compare_plans(args):
+    config.SQLALCHEMY_DATABASE_URI = args.database_uri
+    app = create_app()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        print(f"Generating {args.users} users and {args.movies} movies...")
+        generate_dataset(
+            args.users,
+            args.movies,
+            args.likes_per_user,
+            args.seed,
+            banned_ratio=0.1,
+            progress=None,
+        )
+
+        user_id = UserProfile.query.filter_by(admin=False).first().id
+        queries = {
+            name: literal_sql(query) for name, query in listing_queries(user_id).items()
+        }
+
+        connection = db.session.connection()
+        for index in listing_indexes():
+            index.drop(connection)
+        db.session.commit()
+        without_indexes = measure_plans(queries, args.repeat)
+
+        connection = db.session.connection()
+        for index in listing_indexes():
+            index.create(connection)
+        if db.engine.dialect.name == "sqlite":
+            db.session.execute("ANALYZE")
+        db.session.commit()
+        with_indexes = measure_plans(queries, args.repeat)
+
+    results = {}
+    for name in queries:
+        before, after = without_indexes[name], with_indexes[name]
+        results[name] = {
+            "sql": queries[name],
+            "plan_changed": before["plan"] != after["plan"],
+            "without_indexes": before,
+            "with_indexes": after,
+        }
+        print(
+            f"{name}: {before['median_ms']}ms -> {after['median_ms']}ms"
+            + ("" if results[name]["plan_changed"] else " (same plan)")
+        )
+
+    return {
+        "database": make_url(args.database_uri).get_backend_name(),
+        "dataset": {
+            "users": args.users,
+            "movies": args.movies,
+            "likes_per_user": args.likes_per_user,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the listing plans.")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--movies", type=int, default=100000)
+    parser.add_argument("--likes-per-user", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument(
+        "--database-uri",
+        default=os.environ.get("BENCH_DATABASE_URI", "sqlite:///bench.db"),
+        help="the database is dropped and filled with the dataset",
+    )
+    parser.add_argument("--output", default="query-plans.json")
+    args = parser.parse_args()
+
+    report = compare_plans(args)
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"Saved results to {args.output}")
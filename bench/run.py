@@ -0,0 +1,309 @@
+#! python3
+# run - Benchmarks the API endpoints through the Flask test client.
+#
+# A synthetic dataset is generated once into the benchmark database, then every
+# case is requested repeatedly measuring its latency percentiles, the SQL
+# queries per request and the memory allocated per request. The results are
+# written as JSON to compare them across commits with bench/compare.py.
+#
+#   python -m bench.run --users 1000 --output results.json
+
+import argparse
+import base64
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+from sqlalchemy.engine import make_url
+
+import config
+from api.job.dataset import DATASET_PASSWORD, generate_dataset
+from api.model.movie import Movie
+from api.model.user_profile import UserProfile
+from api.query_stats import QueryCounter
+from app import create_app, db
+
+API = config.API_URL_PREFIX
+PERCENTILES = [50, 90, 95, 99]
+
+
+def basic_auth(username, password):
+    credentials = base64.b64encode(f"{username}:{password}".encode("utf-8"))
+    return {"Authorization": "Basic " + credentials.decode("utf-8")}
+
+
+def bearer(client, username, password):
+    res = client.get(API + "/auth/login", headers=basic_auth(username, password))
+    return {"Authorization": "Bearer " + res.json["token"]}
+
+
+def benchmark_cases(client, fixtures):
+    """
+    Returns the benchmarked cases as name and a function making the request of
+    the iteration number
+    """
+    user = fixtures["user_headers"]
+    admin = fixtures["admin_headers"]
+    movies = fixtures["movie_ids"]
+    user_id = fixtures["user_id"]
+
+    def movie(i):
+        return movies[i % len(movies)]
+
+    cursor = {"next": ""}
+
+    def movies_cursor(i):
+        # walks through the pages, starting over after the last one
+        res = client.get(
+            API + "/movies",
+            query_string={"cursor": cursor["next"], "sort": "-likes"},
+            headers=user,
+        )
+        cursor["next"] = res.json.get("next_cursor") or ""
+        return res
+
+    return [
+        (
+            "login",
+            lambda i: client.get(
+                API + "/auth/login",
+                headers=basic_auth(fixtures["username"], DATASET_PASSWORD),
+            ),
+        ),
+        (
+            "movies_page",
+            lambda i: client.get(
+                API + "/movies", query_string={"page": i % 10 + 1}, headers=user
+            ),
+        ),
+        (
+            "movies_filtered_sorted",
+            lambda i: client.get(
+                API + "/movies",
+                query_string={
+                    "release_year": 1990 + i % 30,
+                    "sort": "-likes,title",
+                    "page": 1,
+                },
+                headers=user,
+            ),
+        ),
+        (
+            "movies_title_search",
+            lambda i: client.get(
+                API + "/movies",
+                query_string={"title": "the", "sort": "title", "page": 1},
+                headers=user,
+            ),
+        ),
+        (
+            "movies_search",
+            lambda i: client.get(
+                API + "/movies",
+                query_string={"q": "the", "page": 1},
+                headers=user,
+            ),
+        ),
+        (
+            "movies_fuzzy",
+            lambda i: client.get(
+                API + "/movies",
+                query_string={"title_fuzzy": "teh lord", "page": 1},
+                headers=user,
+            ),
+        ),
+        (
+            "movies_suggest",
+            lambda i: client.get(
+                API + "/movies/suggest",
+                query_string={"prefix": "the"[: 1 + i % 3]},
+                headers=user,
+            ),
+        ),
+        (
+            "movies_genres",
+            lambda i: client.get(
+                API + "/movies",
+                query_string={
+                    "genre": "Drama,Comedy",
+                    "genre_match": "all" if i % 2 else "any",
+                    "release_year_min": 1990,
+                    "page": 1,
+                },
+                headers=user,
+            ),
+        ),
+        (
+            "movies_facets",
+            lambda i: client.get(
+                API + "/movies/facets",
+                query_string={"release_year_min": 1950 + i % 50},
+                headers=user,
+            ),
+        ),
+        ("movies_cursor", movies_cursor),
+        ("movie", lambda i: client.get(f"{API}/movies/{movie(i)}", headers=user)),
+        (
+            "like",
+            lambda i: client.put(f"{API}/movies/{movie(i)}/like", headers=user),
+        ),
+        (
+            "unlike",
+            lambda i: client.delete(f"{API}/movies/{movie(i)}/unlike", headers=user),
+        ),
+        (
+            "user_movies",
+            lambda i: client.get(f"{API}/users/{user_id}/movies", headers=user),
+        ),
+        (
+            "admin_users",
+            lambda i: client.get(
+                API + "/admin/users", query_string={"page": i % 10 + 1}, headers=admin
+            ),
+        ),
+    ]
+
+
+def percentile(sorted_values, percent):
+    index = round(percent / 100 * (len(sorted_values) - 1))
+    return sorted_values[index]
+
+
+def measure(request, iterations, warmup, allocation_iterations):
+    for i in range(warmup):
+        request(i)
+
+    statuses = set()
+    latencies = []
+    queries_count = 0
+    for i in range(iterations):
+        with QueryCounter() as counter:
+            started = time.perf_counter()
+            res = request(i)
+            latencies.append(time.perf_counter() - started)
+        queries_count += counter.queries
+        statuses.add(res.status_code)
+
+    # allocations are traced apart, tracing slows down the requests
+    allocated = []
+    tracemalloc.start()
+    try:
+        for i in range(allocation_iterations):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            request(i)
+            _, peak = tracemalloc.get_traced_memory()
+            allocated.append(peak - before)
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    result = {
+        "requests": iterations,
+        "status_codes": sorted(statuses),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "queries_per_request": round(queries_count / iterations, 2),
+        "peak_allocated_bytes": max(allocated) if allocated else None,
+    }
+    for percent in PERCENTILES:
+        result[f"p{percent}_ms"] = round(percentile(latencies, percent) * 1000, 3)
+
+    return result
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(args):
+    config.SQLALCHEMY_DATABASE_URI = args.database_uri
+    app = create_app()
+    app.config["TESTING"] = True
+    client = app.test_client()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        print(f"Generating {args.users} users and {args.movies} movies...")
+        generate_dataset(
+            args.users, args.movies, args.likes_per_user, args.seed, progress=None
+        )
+
+        user = UserProfile.query.filter_by(admin=False, banned=False).first()
+        fixtures = {
+            "username": user.username,
+            "user_id": user.public_id,
+            "movie_ids": [
+                public_id
+                for public_id, in db.session.query(Movie.public_id)
+                .order_by(Movie.id)
+                .limit(args.iterations + args.warmup)
+            ],
+        }
+
+    fixtures["user_headers"] = bearer(client, fixtures["username"], DATASET_PASSWORD)
+    fixtures["admin_headers"] = bearer(client, "admin", "admin")
+
+    results = {}
+    cases = benchmark_cases(client, fixtures)
+    for name, request in cases:
+        if args.cases and name not in args.cases:
+            continue
+
+        results[name] = measure(
+            request, args.iterations, args.warmup, args.allocation_iterations
+        )
+        print(
+            "{name}: p50 {p50_ms}ms p99 {p99_ms}ms, {queries_per_request} "
+            "queries".format(name=name, **results[name])
+        )
+
+    return {
+        "commit": current_commit(),
+        "python": platform.python_version(),
+        "database": make_url(args.database_uri).get_backend_name(),
+        "dataset": {
+            "users": args.users,
+            "movies": args.movies,
+            "likes_per_user": args.likes_per_user,
+            "seed": args.seed,
+        },
+        "iterations": args.iterations,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the API endpoints.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--movies", type=int, default=10000)
+    parser.add_argument("--likes-per-user", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--allocation-iterations", type=int, default=10)
+    parser.add_argument(
+        "--database-uri",
+        default=os.environ.get("BENCH_DATABASE_URI", "sqlite:///bench.db"),
+        help="the database is dropped and filled with the dataset",
+    )
+    parser.add_argument("--cases", nargs="*", help="only run these cases")
+    parser.add_argument("--output", default="bench-results.json")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args)
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"Saved results to {args.output}")
@@ -1,6 +1,6 @@
 """[General Configuration Params] """
 
-from os import path
+from os import path, cpu_count
 
 from dotenv import load_dotenv
 from environs import Env
@@ -19,13 +19,80 @@ APP_HOST = "localhost"
 APP_PORT = "5001"
 
 JWT_ALGORITHMS = "HS256"
+JWT_LIFETIME_HOURS = 24
+
+# stateless tokens are revoked by increasing the user's token version instead of
+# being kept in the jwt whitelist
+STATELESS_TOKENS = env.bool("STATELESS_TOKENS", False)
+TOKEN_REVOCATION_REFRESH = 5  # seconds
+
+# expired tokens are purged from the jwt whitelist every interval, 0 disables it
+TOKEN_PURGE_INTERVAL = env.int("TOKEN_PURGE_INTERVAL", 0)  # seconds
+TOKEN_PURGE_BATCH_SIZE = 1000
 
 ROWS_PER_PAGE = 25
 
+# adds the number of SQL queries of each request, and the milliseconds spent on
+# them, as the X-DB-Queries and X-DB-Time response headers
+QUERY_STATS_HEADERS = env.bool("QUERY_STATS_HEADERS", False)
+
 API_URL_PREFIX = "/api/v1"
 
+# title suggestions: prefixes matching more titles than the scan limit keep
+# their most liked movies
+SUGGEST_LIMIT = 10
+SUGGEST_MAX_LIMIT = 50
+SUGGEST_SCAN_LIMIT = 2000
+
+# fuzzy title filter: one edit is allowed every FUZZY_CHARS_PER_EDIT characters;
+# filters sharing trigrams with more titles than the max candidates are too broad
+# to compare them all, and match the titles containing them without typos
+FUZZY_CHARS_PER_EDIT = 4
+FUZZY_MAX_CANDIDATES = 5000
+
+# genre filters matching more movies than this are joined with the genres
+# instead of listing the movie ids
+GENRE_FILTER_MAX_IDS = 10000
+
+# the in-memory movie indexes are rebuilt from the database after their ttl,
+# with the likes and movies changed outside the admin routes
+MOVIE_INDEX_TTL = 300  # seconds
+
+# upper bounds of the buckets of the latency histograms served at /metrics
+METRICS_LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+# /metrics is only served to these client addresses, the loopback by default
+METRICS_ALLOWED_ADDRESSES = env.list("METRICS_ALLOWED_ADDRESSES", ["127.0.0.1", "::1"])
+
+# passwords are hashed in a pool of worker processes, 0 workers hashes them in
+# the request thread; hashing requests over the max pending get a 503
+PASSWORD_HASH_WORKERS = env.int("PASSWORD_HASH_WORKERS", cpu_count() or 1)
+PASSWORD_HASH_MAX_PENDING = env.int("PASSWORD_HASH_MAX_PENDING", 32)
+PASSWORD_HASH_RETRY_AFTER = 1  # seconds
+
+# requests of admins with the X-Profile: 1 header are profiled, up to the max
+# concurrent at once, 0 disables profiling
+PROFILE_MAX_CONCURRENT = env.int("PROFILE_MAX_CONCURRENT", 1)
+PROFILE_STORE_SIZE = 100
+# the profiles are kept in the memory of each process unless this directory,
+# shared by the processes serving the app, is set
+PROFILE_DIR = env.str("PROFILE_DIR", "")
+PROFILE_TOP_FUNCTIONS = 50
+
+BULK_INSERT_BATCH_SIZE = 5000
+BULK_IMPORT_MAX_USERS = 10000
+# imported users with a plaintext password take a password hashing slot each
+BULK_IMPORT_MAX_PASSWORDS = 16
+
 DATABASE_NAME = env.str("DATABASE_NAME")
 DB_USER = env.str("DB_USER")
 DB_PASSWORD = env.str("DB_PASSWORD")
 DB_HOST = env.str("DB_HOST")
 DB_PORT = env.str("DB_PORT")
+
+# cached totals of the paginated listings
+TOTAL_COUNT_CACHE_SIZE = 1024
+TOTAL_COUNT_CACHE_TTL = 60  # seconds
+
+# cached authorizations of recently used tokens
+AUTH_CACHE_SIZE = 4096
+AUTH_CACHE_TTL = 60  # seconds
@@ -0,0 +1,70 @@
+#! python3
+# generate_dataset - Fills the database with a reproducible synthetic dataset.
+#
+# The same seed and sizes always generate the same users, movies and likes, so
+# performance measurements can be repeated on equal data. The database is taken
+# from SQLALCHEMY_DATABASE_URI unless --database-uri is passed, and its tables
+# are dropped and created again.
+
+import argparse
+import os
+import sys
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import config
+from api.job.dataset import generate_dataset
+from app import create_app, db
+
+SCALES = {
+    "small": {"users": 1000, "movies": 10000, "likes_per_user": 20},
+    "medium": {"users": 100000, "movies": 100000, "likes_per_user": 20},
+    "large": {"users": 1000000, "movies": 300000, "likes_per_user": 10},
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset.")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--users", type=int, help="overrides the scale")
+    parser.add_argument("--movies", type=int, help="overrides the scale")
+    parser.add_argument("--likes-per-user", type=int, help="overrides the scale")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--exponent",
+        type=float,
+        default=1.0,
+        help="power-law exponent of the movies popularity",
+    )
+    parser.add_argument("--banned-ratio", type=float, default=0.0)
+    parser.add_argument("--database-uri", default=config.SQLALCHEMY_DATABASE_URI)
+    args = parser.parse_args()
+
+    sizes = dict(SCALES[args.scale])
+    for size in sizes:
+        if getattr(args, size) is not None:
+            sizes[size] = getattr(args, size)
+
+    config.SQLALCHEMY_DATABASE_URI = args.database_uri
+    app = create_app()
+    with app.app_context():
+        print("Dropping tables...")
+        db.drop_all()
+        print("Creating tables...")
+        db.create_all()
+
+        print(
+            "Generating {users} users, {movies} movies and {likes_per_user} likes "
+            "per user with seed {seed}".format(seed=args.seed, **sizes)
+        )
+        stats = generate_dataset(
+            seed=args.seed,
+            exponent=args.exponent,
+            banned_ratio=args.banned_ratio,
+            **sizes,
+        )
+
+    for table, table_stats in stats.items():
+        print(f"Saved {table_stats['rows']} {table} in {table_stats['seconds']}s")
+    print("\nAdmin user credentials:")
+    print("username='admin' password='admin'")
@@ -1,41 +1,180 @@
 #! python3
-# load_movies_data - Loads movies data from .tsv file.
-# Download the .tsv file from: https://datasets.imdbws.com/title.basics.tsv.gz
+# load_movies_data - Loads movies data from the IMDb title basics file.
+# Download the file from: https://datasets.imdbws.com/title.basics.tsv.gz
+#
+# The file can be read compressed or already decompressed. Its lines are split
+# in chunks parsed by a pool of processes, and the movies are written to
+# movies.tsv as they are parsed, so the dataset is never held in memory.
 
+import argparse
 import csv
+import gzip
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
+FIELDNAMES = [
+    "tconst",
+    "titleType",
+    "primaryTitle",
+    "originalTitle",
+    "isAdult",
+    "startYear",
+    "endYear",
+    "runtimeMinutes",
+    "genres",
+]
+OUTPUT_FIELDNAMES = ["tconst", "title", "release_year", "runtime_minutes", "genres"]
 
-if __name__ == "__main__":
-    try:
-        with open("data.tsv", newline="\n") as tsv_file:
-            dict_reader = csv.DictReader(
-                tsv_file,
-                fieldnames=[
-                    "tconst",
-                    "titleType",
-                    "primaryTitle",
-                    "originalTitle",
-                    "isAdult",
-                    "startYear",
-                    "endYear",
-                    "runtimeMinutes",
-                    "genres",
-                ],
-                delimiter="\t",
+IMDB_NULL = "\\N"
+CHUNK_SIZE = 4 * 1024 * 1024  # bytes
+
+
+def parse_movies(chunk):
+    """
+    Parses a chunk of whole lines, returning the rows of the movies in it
+    """
+    movies = []
+    for line in chunk.decode("utf-8").split("\n"):
+        columns = line.split("\t")
+        if len(columns) != len(FIELDNAMES) or columns[1] != "movie":
+            continue
+
+        tconst, _, _, title, _, start_year, _, runtime, genres = columns
+        movies.append(
+            (
+                tconst,
+                title,
+                start_year,
+                "" if runtime == IMDB_NULL else runtime,
+                "" if genres == IMDB_NULL else genres,
             )
+        )
+
+    return movies
+
+
+def parse_range(byte_range):
+    """
+    Parses the lines starting between the start and end offsets of the file
+    """
+    path, start, end = byte_range
+    with open(path, "rb") as tsv_file:
+        if start:
+            # the line crossing the start belongs to the previous range
+            tsv_file.seek(start - 1)
+            tsv_file.readline()
+
+        lines = []
+        while tsv_file.tell() < end:
+            line = tsv_file.readline()
+            if not line:
+                break
+            lines.append(line)
+
+    return parse_movies(b"".join(lines))
+
+
+def byte_ranges(path, chunk_size):
+    size = os.path.getsize(path)
+    for start in range(0, size, chunk_size):
+        yield path, start, min(start + chunk_size, size)
+
+
+def line_chunks(stream, chunk_size):
+    """
+    Splits a binary stream in chunks of about chunk_size bytes of whole lines
+    """
+    remainder = b""
+    while True:
+        block = stream.read(chunk_size)
+        if not block:
+            if remainder:
+                yield remainder
+            return
+
+        block = remainder + block
+        end = block.rfind(b"\n") + 1
+        if end:
+            # a line longer than the chunk size is kept until it ends
+            yield block[:end]
+        remainder = block[end:]
+
+
+def parallel_map(executor, fn, items, window):
+    """
+    Like executor.map, but only keeps window items submitted at once so a
+    large input isn't read ahead into memory
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
+
+
+def load_movies_data(input_path, output_path, workers=None, chunk_size=CHUNK_SIZE):
+    workers = workers or os.cpu_count() or 1
+    movies_count = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor, open(
+        output_path, "w", newline=""
+    ) as output_file:
+        output_writer = csv.writer(output_file)
+        output_writer.writerow(OUTPUT_FIELDNAMES)
+
+        if input_path.endswith(".gz"):
+            # a compressed stream can only be split after decompressing it
+            tsv_file = gzip.open(input_path, "rb")
+            parsed_chunks = parallel_map(
+                executor, parse_movies, line_chunks(tsv_file, chunk_size), workers * 2
+            )
+        else:
+            tsv_file = None
+            parsed_chunks = parallel_map(
+                executor, parse_range, byte_ranges(input_path, chunk_size), workers * 2
+            )
+
+        try:
+            for movies in parsed_chunks:
+                output_writer.writerows(movies)
+                movies_count += len(movies)
+        finally:
+            if tsv_file is not None:
+                tsv_file.close()
+
+    return movies_count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract the movies of IMDb.")
+    parser.add_argument(
+        "input",
+        nargs="?",
+        help="title.basics.tsv.gz or its decompressed data.tsv "
+        "(default: whichever is in the current directory)",
+    )
+    parser.add_argument("--output", default="movies.tsv")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    input_path = args.input
+    if input_path is None:
+        input_path = next(
+            (
+                path
+                for path in ["title.basics.tsv.gz", "data.tsv"]
+                if os.path.exists(path)
+            ),
+            None,
+        )
 
-            outputFile = open("movies.tsv", "w", newline="")
-            outputDictWriter = csv.DictWriter(outputFile, ["title", "release_year"])
-            outputDictWriter.writeheader()
-
-            for row in dict_reader:
-                if row["titleType"] == "movie":
-                    outputDictWriter.writerow(
-                        {
-                            "title": row["originalTitle"],
-                            "release_year": row["startYear"],
-                        }
-                    )
-            outputFile.close()
-    except OSError:
-        print("Download the IMDB file and rename it to data.tsv")
+    if input_path is None or not os.path.exists(input_path):
+        print("Download the IMDB file title.basics.tsv.gz into this directory")
+    else:
+        count = load_movies_data(input_path, args.output, args.workers, args.chunk_size)
+        print(f"Saved {count} movies to {args.output}")
@@ -1,27 +1,19 @@
-import csv
-import random
 import sys
 sys.path.insert(1, '../technical_challenge')
 
 from faker import Faker
 from werkzeug.security import generate_password_hash
 
+from api.job.like_generator import generate_likes, load_likes
+from api.job.movie_loader import load_movies, read_movies
 from api.model.movie import Movie
 from app import create_app, db
-from api.model.user_profile import UserProfile
+from api.model.user_profile import UserProfile, bulk_create_users
 
 app = create_app()
 fake = Faker()
 
 
-def like_movie(users_arr, movies_arr):
-    for user in users_arr:
-        movie = random.choice(movies_arr)
-        if not user.liked_movies.count(movie):
-            # print(f"{user.username} liking movie {movie.title}")
-            user.liked_movies.append(movie)
-
-
 print("Seeding database")
 with app.app_context():
     print("Dropping tables...")
@@ -40,55 +32,53 @@ with app.app_context():
     db.session.add(admin)
     db.session.commit()
 
+    # hash the shared password once, the users are created with the hash
     password = generate_password_hash("12345")
-    admin = False
     print("Saving 100 new users, all with password=12345")
+    new_users = []
+    names = set()
     banned = True
     for _ in range(100):
         name = fake.name()
         # prevent duplicate name from faker
-        while UserProfile.query.filter_by(name=name).first():
+        while name in names:
             name = fake.name()
+        names.add(name)
         username = "_".join(name.lower().split())
 
-        new_user = UserProfile(
-            username=username,
-            password=password,
-            name=name,
-            admin=False,
-            banned=banned,
+        new_users.append(
+            {
+                "username": username,
+                "password_hash": password,
+                "name": name,
+                "admin": False,
+                "banned": banned,
+            }
         )
-        db.session.add(new_user)
         if _ == 50:
             banned = False
+    bulk_create_users(new_users)
     db.session.commit()
 
-    with open("data/movies.tsv") as movies_file:
-        movies_reader = csv.DictReader(movies_file, ["title", "release_year"])
-        movies_reader = [
-            movie for movie in movies_reader if movie["release_year"] != "\\N"
-        ][1:]
-
-        print("\nSaving all movies")
-        print("This will take a while...")
-        for movie in movies_reader:
-            try:
-                new_movie = Movie(
-                    title=movie["title"], release_year=int(movie["release_year"]),
-                    poster_img_url=""
-                )
-                db.session.add(new_movie)
-            except ValueError:
-                print(f'Skipping movie {movie["title"]} without release_year {movie["release_year"]}')
-        db.session.commit()
+    print("\nSaving all movies")
+    stats = load_movies(read_movies("data/movies.tsv"))
+    print(
+        f"Saved {stats['rows']} movies in {stats['seconds']}s "
+        f"({stats['rows_per_second']} rows/s)"
+    )
 
-    users = UserProfile.query.filter(UserProfile.username != "admin").all()
-    movies = Movie.query.all()
+    user_ids = [
+        user_id
+        for user_id, in db.session.query(UserProfile.id).filter(
+            UserProfile.username != "admin"
+        )
+    ]
+    movie_ids = [movie_id for movie_id, in db.session.query(Movie.id)]
 
     print("\nMaking users like movies")
-    for _ in range(20):
-        like_movie(users, movies)
-    db.session.commit()
+    # up to 20 likes per user, mostly of the popular movies
+    likes = generate_likes(user_ids, movie_ids, 20 * len(user_ids))
+    load_likes(*likes)
 
 print("\nAdmin user credentials:")
 print("username='admin' password='admin'")
@@ -0,0 +1,63 @@
+"""jwt whitelist expiration
+
+Revision ID: 22f60799dda1
+Revises: 58ccc6f7740f
+Create Date: 2026-10-18 12:36:52.390127
+
+"""
+import datetime
+
+import jwt
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "22f60799dda1"
+down_revision = "58ccc6f7740f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "jwt_whitelist", sa.Column("expires_at", sa.DateTime(), nullable=True)
+    )
+    op.create_index(
+        op.f("ix_jwt_whitelist_expires_at"),
+        "jwt_whitelist",
+        ["expires_at"],
+        unique=False,
+    )
+
+    # backfill the expiration of the whitelisted tokens from their exp claim
+    jwt_whitelist = sa.table(
+        "jwt_whitelist",
+        sa.column("id", sa.Integer),
+        sa.column("token", sa.String),
+        sa.column("expires_at", sa.DateTime),
+    )
+    connection = op.get_bind()
+    tokens = connection.execute(sa.select(jwt_whitelist.c.id, jwt_whitelist.c.token))
+    expirations = []
+    for token_id, token in tokens:
+        try:
+            claims = jwt.decode(token, options={"verify_signature": False})
+            expires_at = datetime.datetime.utcfromtimestamp(claims["exp"])
+        except (jwt.InvalidTokenError, KeyError):
+            # unreadable tokens can't be used anymore, purge them right away
+            expires_at = datetime.datetime.utcfromtimestamp(0)
+        expirations.append({"token_id": token_id, "expires_at": expires_at})
+
+    if expirations:
+        connection.execute(
+            jwt_whitelist.update()
+            .where(jwt_whitelist.c.id == sa.bindparam("token_id"))
+            .values(expires_at=sa.bindparam("expires_at")),
+            expirations,
+        )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_jwt_whitelist_expires_at"), table_name="jwt_whitelist")
+    op.drop_column("jwt_whitelist", "expires_at")
@@ -0,0 +1,43 @@
+"""stateless token revocation
+
+Revision ID: 58ccc6f7740f
+Revises: 92b9b2c5924b
+Create Date: 2026-10-18 11:47:05.614092
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "58ccc6f7740f"
+down_revision = "92b9b2c5924b"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "token_revocation",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("public_id", sa.String(length=50), nullable=False),
+        sa.Column("token_version", sa.Integer(), nullable=False),
+        sa.Column("revoked_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_token_revocation_revoked_at"),
+        "token_revocation",
+        ["revoked_at"],
+        unique=False,
+    )
+    op.add_column(
+        "user_profile",
+        sa.Column("token_version", sa.Integer(), server_default="0", nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_column("user_profile", "token_version")
+    op.drop_index(op.f("ix_token_revocation_revoked_at"), table_name="token_revocation")
+    op.drop_table("token_revocation")
@@ -0,0 +1,30 @@
+"""movie imdb sync
+
+Revision ID: 6a1f0c3d9e27
+Revises: 22f60799dda1
+Create Date: 2026-10-18 13:20:41.208355
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "6a1f0c3d9e27"
+down_revision = "22f60799dda1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("movie", sa.Column("tconst", sa.String(length=12), nullable=True))
+    op.add_column(
+        "movie", sa.Column("content_hash", sa.String(length=32), nullable=True)
+    )
+    op.create_index(op.f("ix_movie_tconst"), "movie", ["tconst"], unique=True)
+
+
+def downgrade():
+    op.drop_index(op.f("ix_movie_tconst"), table_name="movie")
+    op.drop_column("movie", "content_hash")
+    op.drop_column("movie", "tconst")
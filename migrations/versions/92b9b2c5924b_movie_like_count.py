@@ -0,0 +1,36 @@
+"""movie like count
+
+Revision ID: 92b9b2c5924b
+Revises: 325df50e5a19
+Create Date: 2026-10-18 10:12:41.283519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "92b9b2c5924b"
+down_revision = "325df50e5a19"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "movie",
+        sa.Column("like_count", sa.Integer(), server_default="0", nullable=False),
+    )
+
+    # backfill the counts of the existing likes
+    op.execute(
+        "UPDATE movie SET like_count = "
+        "(SELECT count(*) FROM movie_like WHERE movie_like.movie_id = movie.id)"
+    )
+
+    op.create_index(op.f("ix_movie_like_count"), "movie", ["like_count"], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f("ix_movie_like_count"), table_name="movie")
+    op.drop_column("movie", "like_count")
@@ -0,0 +1,46 @@
+"""listing indexes
+
+Revision ID: b41d7e0c2a95
+Revises: 6a1f0c3d9e27
+Create Date: 2026-10-18 15:02:17.530418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b41d7e0c2a95"
+down_revision = "6a1f0c3d9e27"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_movie_release_year_title", "movie", ["release_year", "title", "id"]),
+    (
+        "ix_movie_release_year_like_count",
+        "movie",
+        ["release_year", sa.text("like_count DESC"), "id"],
+    ),
+    ("ix_movie_title", "movie", ["title", "id"]),
+    ("ix_user_profile_admin_banned", "user_profile", ["admin", "banned", "id"]),
+    ("ix_user_profile_banned", "user_profile", ["banned", "id"]),
+    ("ix_user_profile_name", "user_profile", [sa.text("coalesce(name, '')"), "id"]),
+    ("ix_movie_like_user_id", "movie_like", ["user_id", "movie_id"]),
+]
+
+
+def upgrade():
+    # built concurrently on PostgreSQL so the tables aren't locked for writes,
+    # which can't be done inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False, postgresql_concurrently=True
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
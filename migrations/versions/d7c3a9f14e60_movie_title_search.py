@@ -0,0 +1,135 @@
+"""movie title search
+
+Revision ID: d7c3a9f14e60
+Revises: b41d7e0c2a95
+Create Date: 2026-10-18 16:11:48.904215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from unidecode import unidecode
+
+
+# revision identifiers, used by Alembic.
+revision = "d7c3a9f14e60"
+down_revision = "b41d7e0c2a95"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+SQLITE_UPGRADE = [
+    """
+    CREATE VIRTUAL TABLE movie_search USING fts5(
+        normalized_title, content='movie', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER movie_search_insert AFTER INSERT ON movie BEGIN
+        INSERT INTO movie_search (rowid, normalized_title)
+        VALUES (new.id, new.normalized_title);
+    END
+    """,
+    """
+    CREATE TRIGGER movie_search_delete AFTER DELETE ON movie BEGIN
+        INSERT INTO movie_search (movie_search, rowid, normalized_title)
+        VALUES ('delete', old.id, old.normalized_title);
+    END
+    """,
+    """
+    CREATE TRIGGER movie_search_update
+    AFTER UPDATE OF normalized_title ON movie BEGIN
+        INSERT INTO movie_search (movie_search, rowid, normalized_title)
+        VALUES ('delete', old.id, old.normalized_title);
+        INSERT INTO movie_search (rowid, normalized_title)
+        VALUES (new.id, new.normalized_title);
+    END
+    """,
+    "INSERT INTO movie_search (movie_search) VALUES ('rebuild')",
+]
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER movie_search_update",
+    "DROP TRIGGER movie_search_delete",
+    "DROP TRIGGER movie_search_insert",
+    "DROP TABLE movie_search",
+]
+
+POSTGRESQL_UPGRADE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE INDEX CONCURRENTLY ix_movie_search_vector ON movie
+    USING gin (to_tsvector('simple', normalized_title))
+    """,
+    """
+    CREATE INDEX CONCURRENTLY ix_movie_normalized_title_trgm ON movie
+    USING gin (normalized_title gin_trgm_ops)
+    """,
+]
+POSTGRESQL_DOWNGRADE = [
+    "DROP INDEX CONCURRENTLY ix_movie_normalized_title_trgm",
+    "DROP INDEX CONCURRENTLY ix_movie_search_vector",
+]
+
+
+def normalize_title(title):
+    return " ".join(unidecode(title).lower().split())
+
+
+def upgrade():
+    op.add_column(
+        "movie",
+        sa.Column(
+            "normalized_title", sa.String(length=255), server_default="", nullable=False
+        ),
+    )
+
+    movie = sa.table(
+        "movie",
+        sa.column("id", sa.Integer),
+        sa.column("title", sa.String),
+        sa.column("normalized_title", sa.String),
+    )
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(movie.c.id, movie.c.title)
+            .where(movie.c.id > last_id)
+            .order_by(movie.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+
+        connection.execute(
+            movie.update()
+            .where(movie.c.id == sa.bindparam("movie_id"))
+            .values(normalized_title=sa.bindparam("normalized")),
+            [
+                {"movie_id": movie_id, "normalized": normalize_title(title)}
+                for movie_id, title in rows
+            ],
+        )
+        last_id = rows[-1][0]
+
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+    elif dialect == "postgresql":
+        with op.get_context().autocommit_block():
+            for statement in POSTGRESQL_UPGRADE:
+                op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_DOWNGRADE:
+            op.execute(statement)
+    elif dialect == "postgresql":
+        with op.get_context().autocommit_block():
+            for statement in POSTGRESQL_DOWNGRADE:
+                op.execute(statement)
+
+    op.drop_column("movie", "normalized_title")
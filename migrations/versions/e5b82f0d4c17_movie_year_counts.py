@@ -0,0 +1,33 @@
+"""movie year counts
+
+Revision ID: e5b82f0d4c17
+Revises: d7c3a9f14e60
+Create Date: 2026-10-18 17:42:06.518337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e5b82f0d4c17"
+down_revision = "d7c3a9f14e60"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "movie_year_count",
+        sa.Column("release_year", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("movies", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("release_year"),
+    )
+    op.execute(
+        "INSERT INTO movie_year_count (release_year, movies) "
+        "SELECT release_year, count(*) FROM movie GROUP BY release_year"
+    )
+
+
+def downgrade():
+    op.drop_table("movie_year_count")
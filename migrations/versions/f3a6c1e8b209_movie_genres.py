@@ -0,0 +1,45 @@
+"""movie genres
+
+Revision ID: f3a6c1e8b209
+Revises: e5b82f0d4c17
+Create Date: 2026-10-18 18:05:31.042719
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f3a6c1e8b209"
+down_revision = "e5b82f0d4c17"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "genre",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=50), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    op.create_index(
+        "ix_genre_name_lower", "genre", [sa.text("lower(name)")], unique=True
+    )
+    op.create_table(
+        "movie_genre",
+        sa.Column("movie_id", sa.Integer(), nullable=False),
+        sa.Column("genre_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["genre_id"], ["genre.id"]),
+        sa.ForeignKeyConstraint(["movie_id"], ["movie.id"]),
+        sa.PrimaryKeyConstraint("movie_id", "genre_id"),
+    )
+    op.create_index("ix_movie_genre_genre_id", "movie_genre", ["genre_id", "movie_id"])
+
+
+def downgrade():
+    op.drop_index("ix_movie_genre_genre_id", table_name="movie_genre")
+    op.drop_table("movie_genre")
+    op.drop_index("ix_genre_name_lower", table_name="genre")
+    op.drop_table("genre")
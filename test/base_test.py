@@ -1,9 +1,11 @@
 import base64
 import unittest
+from contextlib import contextmanager
 
 from app import create_app, db
 
 from api.model.user_profile import UserProfile
+from api.query_stats import QueryCounter
 from api.route.auth import url_prefix as auth_prefix
 
 
@@ -54,6 +56,20 @@ class BaseTest(unittest.TestCase):
 
             self.user_public_id = user.public_id
 
+    @contextmanager
+    def assertMaxQueries(self, budget):
+        """
+        Fails if the code in the block runs more than budget SQL queries
+        """
+        with QueryCounter() as counter:
+            yield counter
+
+        if counter.queries > budget:
+            self.fail(
+                f"{counter.queries} queries run, over the budget of {budget}:\n"
+                + "\n".join(counter.statements)
+            )
+
     def _set_login_info(self):
         login_auth = get_basic_auth("%s:%s" % (self.username, self.password))
         res = self.client.get(
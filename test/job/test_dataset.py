@@ -0,0 +1,40 @@
+from api.job.dataset import generate_dataset
+from api.model.movie import Movie, movie_like
+from api.model.user_profile import UserProfile
+from app import db
+from test.base_test import BaseTest
+
+
+class TestDataset(BaseTest):
+    def generate_snapshot(self, seed):
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            stats = generate_dataset(50, 30, 5, seed=seed, progress=None)
+
+            users = [
+                (user.public_id, user.username, user.banned)
+                for user in UserProfile.query.order_by(UserProfile.id)
+            ]
+            movies = [
+                (movie.public_id, movie.title, movie.release_year, movie.like_count)
+                for movie in Movie.query.order_by(Movie.id)
+            ]
+            likes = sorted(db.session.query(movie_like).all())
+
+        return stats, users, movies, likes
+
+    def test_generate_dataset_creates_the_requested_sizes(self):
+        stats, users, movies, likes = self.generate_snapshot(seed=1)
+
+        self.assertEqual(50, stats["users"]["rows"])
+        self.assertEqual(51, len(users), "An admin user is created too")
+        self.assertEqual(51, len({username for _, username, _ in users}))
+        self.assertEqual(30, len(movies))
+        self.assertEqual(250, len(likes))
+        self.assertEqual(250, sum(movie[3] for movie in movies))
+
+    def test_generate_dataset_is_reproducible(self):
+        first = self.generate_snapshot(seed=1)[1:]
+        self.assertEqual(first, self.generate_snapshot(seed=1)[1:])
+        self.assertNotEqual(first, self.generate_snapshot(seed=2)[1:])
@@ -0,0 +1,60 @@
+import numpy as np
+
+from api.job.like_generator import generate_likes, load_likes
+from api.model.movie import Movie, movie_like
+from api.model.user_profile import UserProfile
+from app import db
+from test.base_test import BaseTest
+
+
+class TestLikeGenerator(BaseTest):
+    def test_generate_likes_returns_distinct_pairs(self):
+        user_ids, movie_ids = generate_likes(
+            range(1, 1001), range(1, 51), 2000, exponent=1.2, seed=7
+        )
+
+        self.assertEqual(2000, len(user_ids))
+        pairs = set(zip(user_ids.tolist(), movie_ids.tolist()))
+        self.assertEqual(2000, len(pairs), "Likes must not repeat")
+        self.assertTrue(set(movie_ids.tolist()) <= set(range(1, 51)))
+
+        likes = np.bincount(movie_ids)
+        self.assertGreater(likes.max(), 4 * np.median(likes[1:]), "Likes are skewed")
+
+        again = generate_likes(range(1, 1001), range(1, 51), 2000, 1.2, seed=7)
+        self.assertEqual(user_ids.tolist(), again[0].tolist(), "Seeds are repeatable")
+
+    def test_generate_likes_is_capped_by_the_possible_pairs(self):
+        user_ids, movie_ids = generate_likes([1, 2], [1, 2, 3], 100, seed=1)
+        self.assertEqual(6, len(set(zip(user_ids.tolist(), movie_ids.tolist()))))
+
+    def test_no_likes_are_generated_or_loaded_without_movies(self):
+        user_ids, movie_ids = generate_likes([1, 2], [], 100, seed=1)
+        self.assertEqual(0, len(user_ids))
+        self.assertEqual(0, len(movie_ids))
+
+        with self.app.app_context():
+            stats = load_likes(user_ids, movie_ids, progress=None)
+            self.assertEqual(0, stats["rows"])
+
+    def test_load_likes_inserts_likes_and_counts_them(self):
+        with self.app.app_context():
+            for index in range(3):
+                db.session.add(UserProfile(username=f"user{index}", password="1234"))
+                db.session.add(Movie(title=f"Movie {index}", release_year=2000))
+            db.session.commit()
+            user_ids = [user.id for user in UserProfile.query]
+            movie_ids = [movie.id for movie in Movie.query]
+
+            likes = generate_likes(user_ids, movie_ids, 6, seed=3)
+            stats = load_likes(*likes, batch_size=4, progress=None)
+
+            self.assertEqual(6, stats["rows"])
+            self.assertEqual(6, db.session.query(movie_like).count())
+            for movie in Movie.query:
+                self.assertEqual(
+                    db.session.query(movie_like)
+                    .filter(movie_like.c.movie_id == movie.id)
+                    .count(),
+                    movie.like_count,
+                )
@@ -0,0 +1,97 @@
+import csv
+import gzip
+import io
+import os
+import tempfile
+import unittest
+
+from data.load_movies_data import (
+    FIELDNAMES,
+    OUTPUT_FIELDNAMES,
+    byte_ranges,
+    line_chunks,
+    load_movies_data,
+    parse_movies,
+    parse_range,
+)
+
+CHUNK_SIZES = [97, 1000, 65536]
+
+
+def imdb_line(index):
+    title_type = ["movie", "short", "tvSeries"][index % 3]
+    runtime = "\\N" if index % 4 == 0 else str(80 + index % 60)
+    genres = "\\N" if index % 5 == 0 else "Drama,Romance"
+    return "\t".join(
+        [
+            "tt%07d" % index,
+            title_type,
+            "Title %s" % index,
+            "Película número %s" % index,
+            "0",
+            str(1950 + index % 70),
+            "\\N",
+            runtime,
+            genres,
+        ]
+    )
+
+
+class TestLoadMoviesData(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        lines = ["\t".join(FIELDNAMES)] + [imdb_line(i) for i in range(300)]
+        self.data = ("\n".join(lines) + "\n").encode("utf-8")
+        self.tsv_path = os.path.join(self.directory, "data.tsv")
+        with open(self.tsv_path, "wb") as tsv_file:
+            tsv_file.write(self.data)
+        self.gz_path = os.path.join(self.directory, "title.basics.tsv.gz")
+        with gzip.open(self.gz_path, "wb") as gz_file:
+            gz_file.write(self.data)
+
+        self.movies = parse_movies(self.data)
+
+    def test_parse_movies_skips_the_header_and_other_title_types(self):
+        self.assertEqual(100, len(self.movies))
+        self.assertEqual(
+            ("tt0000000", "Película número 0", "1950", "", ""), self.movies[0]
+        )
+        self.assertEqual(
+            ("tt0000003", "Película número 3", "1953", "83", "Drama,Romance"),
+            self.movies[1],
+        )
+
+    def test_line_chunks_keep_the_lines_crossing_the_chunks_whole(self):
+        for chunk_size in CHUNK_SIZES:
+            chunks = list(line_chunks(io.BytesIO(self.data), chunk_size))
+            self.assertEqual(self.data, b"".join(chunks))
+            self.assertTrue(all(chunk.endswith(b"\n") for chunk in chunks))
+
+        chunks = list(line_chunks(io.BytesIO(b"a\tb\nc\td"), 3))
+        self.assertEqual([b"a\tb\n", b"c\td"], chunks, "Last line without newline")
+
+    def test_parse_range_parses_each_line_in_a_single_range(self):
+        for chunk_size in CHUNK_SIZES:
+            movies = [
+                movie
+                for byte_range in byte_ranges(self.tsv_path, chunk_size)
+                for movie in parse_range(byte_range)
+            ]
+            self.assertEqual(self.movies, movies, "Chunk size %s" % chunk_size)
+
+    def test_load_movies_data_reads_plain_and_gzip_files(self):
+        for input_path in [self.tsv_path, self.gz_path]:
+            for chunk_size in CHUNK_SIZES:
+                output_path = os.path.join(self.directory, "movies.tsv")
+                count = load_movies_data(
+                    input_path, output_path, workers=2, chunk_size=chunk_size
+                )
+
+                with open(output_path, newline="") as output_file:
+                    rows = list(csv.reader(output_file))
+                self.assertEqual(100, count)
+                self.assertEqual(OUTPUT_FIELDNAMES, rows[0])
+                self.assertEqual([list(movie) for movie in self.movies], rows[1:])
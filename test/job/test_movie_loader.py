@@ -0,0 +1,208 @@
+import os
+import tempfile
+import uuid
+
+from api.job.movie_loader import (
+    bulk_public_ids,
+    load_movies,
+    read_movies,
+    sync_movies,
+)
+from api.model.facets import MovieYearCount
+from api.model.movie import Genre, Movie
+from api.model.user_profile import UserProfile
+from app import db
+from test.base_test import BaseTest
+
+
+class TestMovieLoader(BaseTest):
+    def setUp(self) -> None:
+        super().setUp()
+        movies_file = tempfile.NamedTemporaryFile("w", suffix=".tsv", delete=False)
+        movies_file.write(
+            "title,release_year\n"
+            "The Lord of the Rings,2001\n"
+            "Unreleased,\\N\n"
+            '"Crouching Tiger, Hidden Dragon",2000\n'
+            "Spirited Away,2001\n"
+        )
+        movies_file.close()
+        self.movies_path = movies_file.name
+        self.addCleanup(os.remove, self.movies_path)
+
+    def test_bulk_public_ids_are_unique_uuid4(self):
+        public_ids = bulk_public_ids(100)
+        self.assertEqual(100, len(set(public_ids)))
+        for public_id in public_ids:
+            self.assertEqual(4, uuid.UUID(public_id).version)
+
+    def test_load_movies_inserts_movies_with_release_year(self):
+        progress = []
+        with self.app.app_context():
+            stats = load_movies(
+                read_movies(self.movies_path), batch_size=2, progress=progress.append
+            )
+
+            self.assertEqual(3, stats["rows"])
+            self.assertEqual(2, len(progress), "Progress is reported per batch")
+            movies = Movie.query.order_by(Movie.title).all()
+            self.assertEqual(
+                [
+                    "Crouching Tiger, Hidden Dragon",
+                    "Spirited Away",
+                    "The Lord of the Rings",
+                ],
+                [movie.title for movie in movies],
+            )
+            self.assertEqual(0, movies[0].like_count)
+            self.assertEqual(2000, movies[0].release_year)
+            self.assertEqual(
+                [(2000, 1), (2001, 2)],
+                sorted(
+                    db.session.query(MovieYearCount.release_year, MovieYearCount.movies)
+                ),
+                "Movies are counted by release year once loaded",
+            )
+
+    def test_sync_movies_applies_only_the_changes(self):
+        def imdb_movies(*movies):
+            return [
+                {"tconst": tconst, "title": title, "release_year": year}
+                for tconst, title, year in movies
+            ]
+
+        self.create_user("normal_user", "1234", "Normal User")
+        with self.app.app_context():
+            sync_movies(
+                imdb_movies(
+                    ("tt0120737", "The Lord of the Rings", 2001),
+                    ("tt0190332", "Crouching Tiger", 2000),
+                    ("tt0245429", "Spirited Away", 2001),
+                ),
+                progress=None,
+            )
+            user = UserProfile.query.filter_by(username=self.username).first()
+            user.liked_movies.append(Movie.query.filter_by(tconst="tt0190332").one())
+            user.liked_movies.append(Movie.query.filter_by(tconst="tt0245429").one())
+            db.session.commit()
+
+            stats = sync_movies(
+                imdb_movies(
+                    ("tt0190332", "Crouching Tiger, Hidden Dragon", 2000),
+                    ("tt0245429", "Spirited Away", 2001),
+                    ("tt0317248", "City of God", 2002),
+                ),
+                batch_size=2,
+                progress=None,
+            )
+
+            self.assertEqual(1, stats["inserted"])
+            self.assertEqual(1, stats["updated"])
+            self.assertEqual(1, stats["unchanged"])
+            self.assertEqual(1, stats["deleted"])
+            movies = Movie.query.order_by(Movie.title).all()
+            self.assertEqual(
+                ["City of God", "Crouching Tiger, Hidden Dragon", "Spirited Away"],
+                [movie.title for movie in movies],
+            )
+            self.assertEqual(
+                [0, 1, 1],
+                [movie.like_count for movie in movies],
+                "Synced movies keep their likes",
+            )
+
+    def test_sync_movies_adopts_the_movies_without_tconst(self):
+        self.create_user("normal_user", "1234", "Normal User")
+        with self.app.app_context():
+            legacy = Movie(title="Spirited  Away", release_year=2001)
+            db.session.add(legacy)
+            db.session.add(Movie(title="Spirited Away", release_year=2002))
+            db.session.add(Movie(title="Home Movie", release_year=2001))
+            db.session.commit()
+            user = UserProfile.query.filter_by(username=self.username).first()
+            user.liked_movies.append(legacy)
+            db.session.commit()
+            legacy_id = legacy.id
+
+            stats = sync_movies(
+                [
+                    {
+                        "tconst": "tt0245429",
+                        "title": "Spirited Away",
+                        "release_year": 2001,
+                    },
+                    {
+                        "tconst": "tt0317248",
+                        "title": "City of God",
+                        "release_year": 2002,
+                    },
+                ],
+                progress=None,
+            )
+
+            self.assertEqual(1, stats["inserted"])
+            self.assertEqual(1, stats["updated"])
+            self.assertEqual(0, stats["deleted"])
+            movie = Movie.query.filter_by(tconst="tt0245429").one()
+            self.assertEqual(legacy_id, movie.id)
+            self.assertEqual("Spirited Away", movie.title)
+            self.assertEqual(1, movie.like_count)
+            self.assertEqual(
+                2,
+                Movie.query.filter(Movie.tconst.is_(None)).count(),
+                "Movies that don't match are kept",
+            )
+
+    def test_movies_are_loaded_and_synced_with_their_genres(self):
+        with open(self.movies_path, "w") as movies_file:
+            movies_file.write(
+                "tconst,title,release_year,runtime_minutes,genres\n"
+                'tt0245429,Spirited Away,2001,125,"Adventure,Animation,Family"\n'
+                "tt0317248,City of God,2002,130,\n"
+            )
+
+        def genres(tconst):
+            movie = Movie.query.filter_by(tconst=tconst).one()
+            return [genre.name for genre in movie.genres]
+
+        with self.app.app_context():
+            load_movies(read_movies(self.movies_path), progress=None)
+            self.assertEqual(["Adventure", "Animation", "Family"], genres("tt0245429"))
+            self.assertEqual([], genres("tt0317248"))
+
+            stats = sync_movies(
+                [
+                    {
+                        "tconst": "tt0245429",
+                        "title": "Spirited Away",
+                        "release_year": 2001,
+                        "genres": ["Animation", "Fantasy"],
+                    },
+                    {
+                        "tconst": "tt0317248",
+                        "title": "City of God",
+                        "release_year": 2002,
+                        "genres": [],
+                    },
+                ],
+                progress=None,
+            )
+            self.assertEqual(1, stats["updated"], "Genres are synced content")
+            self.assertEqual(1, stats["unchanged"])
+            self.assertEqual(["Animation", "Fantasy"], genres("tt0245429"))
+            self.assertEqual(4, Genre.query.count())
+
+            sync_movies(
+                [
+                    {
+                        "tconst": "tt0317248",
+                        "title": "City of God",
+                        "release_year": 2002,
+                        "genres": ["crime", "Drama", "DRAMA", "fantasy"],
+                    },
+                ],
+                delete_missing=False,
+                progress=None,
+            )
+            self.assertEqual(["Drama", "Fantasy", "crime"], genres("tt0317248"))
+            self.assertEqual(6, Genre.query.count())
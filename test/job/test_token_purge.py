@@ -0,0 +1,91 @@
+import datetime
+from unittest import mock
+
+import config
+
+from api.job.token_purge import purge_expired_tokens, start_token_purger
+from app import create_app
+from api.model.auth import JWTWhitelist, TokenRevocation
+from api.model.user_profile import UserProfile
+from test.base_test import BaseTest
+
+
+class TestTokenPurge(BaseTest):
+    def setUp(self) -> None:
+        super().setUp()
+        now = datetime.datetime.utcnow()
+
+        with self.app.app_context():
+            for user_id in range(100, 105):
+                self.db.session.add(
+                    JWTWhitelist(
+                        user_id=user_id,
+                        token="expired-%s" % user_id,
+                        expires_at=now - datetime.timedelta(hours=1),
+                    )
+                )
+            self.db.session.add(
+                JWTWhitelist(
+                    user_id=105,
+                    token="valid",
+                    expires_at=now + datetime.timedelta(hours=1),
+                )
+            )
+            self.db.session.commit()
+
+    def test_purge_deletes_only_expired_tokens(self):
+        with self.app.app_context():
+            stats = purge_expired_tokens(batch_size=2)
+
+            self.assertEqual(5, stats["purged"])
+            self.assertEqual(3, stats["batches"], "Tokens should be purged in batches")
+            tokens = [token.token for token in JWTWhitelist.query.all()]
+            self.assertEqual(["valid"], tokens)
+
+    def test_purge_deletes_revocations_older_than_the_token_lifetime(self):
+        now = datetime.datetime.utcnow()
+        with self.app.app_context():
+            for hours, public_id in [(25, "old"), (1, "recent")]:
+                self.db.session.add(
+                    TokenRevocation(
+                        public_id=public_id,
+                        token_version=1,
+                        revoked_at=now - datetime.timedelta(hours=hours),
+                    )
+                )
+            self.db.session.commit()
+
+            with mock.patch.object(config, "JWT_LIFETIME_HOURS", 24):
+                stats = purge_expired_tokens()
+
+            self.assertEqual(1, stats["revocations"])
+            revocations = [r.public_id for r in TokenRevocation.query.all()]
+            self.assertEqual(["recent"], revocations)
+
+    def test_purge_records_totals(self):
+        with self.app.app_context():
+            purge_expired_tokens()
+            purge_expired_tokens()
+
+            totals = self.app.extensions["token_purge"]
+            self.assertEqual(2, totals["runs"])
+            self.assertEqual(5, totals["purged"])
+            self.assertEqual(0, totals["last_run"]["purged"])
+
+    def test_create_app_starts_a_single_purger(self):
+        with mock.patch.object(config, "TOKEN_PURGE_INTERVAL", 3600):
+            app = create_app()
+
+        purger = app.extensions["token_purger"]
+        self.assertTrue(purger.is_alive())
+        self.assertIs(purger, start_token_purger(app), "Purger started twice")
+        self.assertNotIn("token_purger", self.app.extensions, "Purge is disabled")
+
+    def test_login_whitelists_token_with_its_expiration(self):
+        self.create_user("user", "1234")
+        self._set_login_info()
+
+        with self.app.app_context():
+            user = UserProfile.query.filter_by(username="user").first()
+            token = JWTWhitelist.query.filter_by(user_id=user.id).first()
+            self.assertGreater(token.expires_at, datetime.datetime.utcnow())
@@ -2,7 +2,9 @@ import unittest
 import uuid
 
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 
+from api.model.facets import MovieYearCount, adjust_year_counts, refresh_year_counts
 from api.model.movie import Movie
 from api.model.user_profile import UserProfile
 from api.schema.movie import MovieSchema
@@ -134,3 +136,55 @@ class TestMovieInt(BaseTest):
             self.assertEqual(3, len(user.liked_movies))
             self.assertEqual(3, len(result["liked_movies"]))
             self.assertEqual(2001, result["liked_movies"][0]["release_year"])
+
+    def test_movie_schema_reads_the_like_count_of_many_movies(self):
+        with self.app.app_context():
+            self.db.session.add(Movie(title="Another Movie", release_year=2001))
+            self.db.session.commit()
+
+            movie = Movie.query.filter_by(title="The Lord of the Rings").first()
+            for user in UserProfile.query.all():
+                user.liked_movies.append(movie)
+            self.db.session.commit()
+
+            movies = Movie.query.options(selectinload(Movie.genres))
+            # the movies and their genres, the likes aren't counted per movie
+            with self.assertMaxQueries(2):
+                result = MovieSchema(many=True).dump(movies.order_by(Movie.title))
+            self.assertEqual([0, 3], [m["likes"] for m in result])
+
+    def test_movie_like_count_follows_likes_and_unlikes(self):
+        with self.app.app_context():
+            movie = Movie.query.first()
+            users = UserProfile.query.all()
+            for user in users:
+                user.liked_movies.append(movie)
+            self.db.session.commit()
+            self.assertEqual(3, movie.like_count)
+
+            users[0].liked_movies.remove(movie)
+            self.db.session.commit()
+            self.assertEqual(2, movie.like_count)
+
+    def test_year_counts_are_upserted_and_adjusted(self):
+        with self.app.app_context():
+            refresh_year_counts([2001])
+            # rows already written, like by a concurrent admin, are updated
+            refresh_year_counts([2001])
+            self.db.session.commit()
+            self.assertEqual(1, MovieYearCount.query.get(2001).movies)
+
+            # a concurrent change of the year counted in between is kept
+            MovieYearCount.query.get(2001).movies = 5
+            adjust_year_counts(added=[2001, 1999])
+            adjust_year_counts(added=[2002], removed=[1999])
+            adjust_year_counts(added=["2002"], removed=[2002])
+            self.db.session.commit()
+            self.assertEqual(
+                [(2001, 6), (2002, 1)],
+                [
+                    (count.release_year, count.movies)
+                    for count in MovieYearCount.query.order_by("release_year")
+                ],
+                "Years left without movies are removed",
+            )
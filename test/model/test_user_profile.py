@@ -2,8 +2,10 @@ import unittest
 import sqlalchemy.exc
 import uuid
 
+from werkzeug.security import generate_password_hash, check_password_hash
+
 from test.base_test import BaseTest
-from api.model.user_profile import UserProfile
+from api.model.user_profile import UserProfile, bulk_create_users
 
 
 class TestUserProfileUnit(unittest.TestCase):
@@ -112,3 +114,23 @@ class TestUserProfileInt(BaseTest):
                 uuid.UUID(created_user.public_id, version=4)
             except ValueError:
                 self.fail("UserProfile.public_id must be a valid uuid4 string")
+
+    def test_bulk_create_users_hashes_plaintext_passwords_once(self):
+        with self.app.app_context():
+            password_hash = generate_password_hash("12345")
+            bulk_create_users(
+                [
+                    {"username": "plain", "password": "12345"},
+                    {"username": "hashed", "password_hash": password_hash},
+                ],
+                batch_size=1,
+            )
+            self.db.session.commit()
+
+            plain = UserProfile.query.filter_by(username="plain").first()
+            hashed = UserProfile.query.filter_by(username="hashed").first()
+            self.assertTrue(check_password_hash(plain.password, "12345"))
+            self.assertEqual(
+                password_hash, hashed.password, "Hashed passwords are kept as is"
+            )
+            uuid.UUID(hashed.public_id, version=4)
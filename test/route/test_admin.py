@@ -1,7 +1,17 @@
+import os
+import tempfile
+from unittest import mock
+
 from flask import json
+from werkzeug.security import generate_password_hash
 
-from api.model.movie import Movie
+import config
+from api import password
+from api.model.movie import Genre, Movie, get_or_create_genres
+from api.password import PasswordPool
+from api.profiler import ProfileStore
 from api.route.admin import url_prefix
+from api.route.movie import url_prefix as movie_prefix
 from test.base_test import BaseTest
 from api.model.user_profile import UserProfile
 from test.route.test_auth import get_basic_auth, url_prefix as auth_prefix
@@ -43,6 +53,48 @@ class TestAdmin(BaseTest):
         self.assertEqual(len(users), 4, "")
 
     # @unittest.skip
+    def test_get_all_users_queries_do_not_grow_with_the_users(self):
+        with self.app.app_context():
+            movie = Movie(title="Movie Title", release_year=2010)
+            for i in range(10):
+                user = UserProfile(username="user%s" % i, password="1234")
+                user.liked_movies.append(movie)
+                self.db.session.add(user)
+            self.db.session.commit()
+
+        # token and admin, total count, page of users and their liked movies
+        with self.assertMaxQueries(5):
+            res = self.client.get(
+                url_prefix + "/users?page=1",
+                headers={"Authorization": f"Bearer {self.admin_token}"},
+            )
+        self.assertEqual(11, res.json["total"])
+
+    def test_user_changes_queries_do_not_grow_with_the_liked_movies(self):
+        self.create_user("not_admin", "1234", "Not Admin", admin=False)
+        with self.app.app_context():
+            user = UserProfile.query.filter_by(public_id=self.user_public_id).one()
+            for i in range(10):
+                movie = Movie(title="Movie %s" % i, release_year=2010)
+                movie.genres = get_or_create_genres(["Drama", "Genre %s" % i])
+                user.liked_movies.append(movie)
+            self.db.session.commit()
+
+        headers = {"Authorization": f"Bearer {self.admin_token}"}
+        for action in ["promote", "demote", "ban", "unban"]:
+            # token and admin, the user, liked movies and genres, the commit, the
+            # reloaded user, liked movies and genres, and the tokens of a ban
+            with self.assertMaxQueries(9):
+                res = self.client.put(
+                    url_prefix + "/users/%s/%s" % (self.user_public_id, action),
+                    headers=headers,
+                )
+            self.assertEqual(200, res.status_code)
+            self.assertEqual(10, len(res.json["user"]["liked_movies"]))
+            self.assertEqual(
+                ["Drama", "Genre 0"], res.json["user"]["liked_movies"][0]["genres"]
+            )
+
     def test_promote_existing_user_to_admin_returns_ok(self):
         self.create_user("not_admin", "1234", "Not Admin", admin=False)
         res = self.client.put(
@@ -250,6 +302,99 @@ class TestAdmin(BaseTest):
             404, res.status_code, "Admin modifying non existing movie should return 404"
         )
 
+    def test_admin_movie_changes_are_indexed_and_counted(self):
+        headers = {"Authorization": f"Bearer {self.admin_token}"}
+        suggest = movie_prefix + "/suggest?prefix=%s"
+
+        res = self.client.get(suggest % "sev", headers=headers)
+        self.assertEqual([], res.json["suggestions"])
+        res = self.client.get(movie_prefix + "?title_fuzzy=samurai", headers=headers)
+        self.assertEqual([], res.json)
+        res = self.client.get(movie_prefix + "?genre=Drama", headers=headers)
+        self.assertEqual([], res.json)
+
+        res = self.client.post(
+            url_prefix + "/movies",
+            json={
+                "title": "Seven Samurai",
+                "release_year": 1954,
+                "genres": ["Action", "Drama"],
+            },
+            headers=headers,
+        )
+        movie_id = res.json["public_id"]
+        self.assertEqual(["Action", "Drama"], res.json["genres"])
+        res = self.client.get(suggest % "sev", headers=headers)
+        self.assertEqual(
+            ["Seven Samurai"], [movie["title"] for movie in res.json["suggestions"]]
+        )
+
+        self.client.put(
+            url_prefix + "/movies/%s" % movie_id,
+            json={"title": "Shichinin no Samurai"},
+            headers=headers,
+        )
+        self.assertEqual(
+            [], self.client.get(suggest % "sev", headers=headers).json["suggestions"]
+        )
+        res = self.client.get(suggest % "shi", headers=headers)
+        self.assertEqual(
+            ["Shichinin no Samurai"],
+            [movie["title"] for movie in res.json["suggestions"]],
+        )
+        res = self.client.get(movie_prefix + "?title_fuzzy=shichinim", headers=headers)
+        self.assertEqual(["Shichinin no Samurai"], [m["title"] for m in res.json])
+
+        res = self.client.get(movie_prefix + "/facets", headers=headers)
+        self.assertEqual(
+            [{"release_year": 1954, "movies": 1}], res.json["release_years"]
+        )
+
+        res = self.client.get(movie_prefix + "?genre=Drama", headers=headers)
+        self.assertEqual(["Shichinin no Samurai"], [m["title"] for m in res.json])
+
+        self.client.put(
+            url_prefix + "/movies/%s" % movie_id,
+            json={"release_year": 1955, "genres": ["Action"]},
+            headers=headers,
+        )
+        res = self.client.get(movie_prefix + "?genre=Drama", headers=headers)
+        self.assertEqual([], res.json)
+        res = self.client.get(movie_prefix + "/facets", headers=headers)
+        self.assertEqual(
+            [{"release_year": 1955, "movies": 1}], res.json["release_years"]
+        )
+
+        self.client.delete(url_prefix + "/movies/%s" % movie_id, headers=headers)
+        res = self.client.get(suggest % "shi", headers=headers)
+        self.assertEqual([], res.json["suggestions"])
+        res = self.client.get(movie_prefix + "/facets", headers=headers)
+        self.assertEqual([], res.json["release_years"])
+        res = self.client.get(movie_prefix + "?genre=Action", headers=headers)
+        self.assertEqual([], res.json)
+
+    def test_admin_movie_genres_ignore_case(self):
+        headers = {"Authorization": f"Bearer {self.admin_token}"}
+        for title, genre in [("A", "Drama"), ("B", "drama"), ("C", "DRAMA")]:
+            res = self.client.post(
+                url_prefix + "/movies",
+                json={"title": title, "release_year": 2000, "genres": [genre]},
+                headers=headers,
+            )
+            self.assertEqual(["Drama"], res.json["genres"])
+
+        with self.app.app_context():
+            self.assertEqual(1, Genre.query.count())
+
+        res = self.client.get(movie_prefix + "?genre=drama&sort=title", headers=headers)
+        self.assertEqual(["A", "B", "C"], [m["title"] for m in res.json])
+        with mock.patch.object(config, "GENRE_FILTER_MAX_IDS", 0):
+            res = self.client.get(
+                movie_prefix + "?genre=DRAMA,drama&genre_match=all&sort=title",
+                headers=headers,
+            )
+        self.assertEqual(["A", "B", "C"], [m["title"] for m in res.json])
+
     def test_admin_delete_existing_movie_returns_ok(self):
         self.movie_id = ""
         with self.app.app_context():
@@ -306,3 +451,246 @@ class TestAdmin(BaseTest):
             headers={"Authorization": f"Bearer {token}"},
         )
         self.assertEqual(403, res.status_code, "Normal user should not access admin")
+
+    def test_get_users_page_total_is_refreshed_after_admin_writes(self):
+        self.create_user("user1", "1234", "User 1", False)
+        res = self.client.get(
+            url_prefix + "/users?page=1&admin=false",
+            headers={"Authorization": f"Bearer {self.admin_token}"},
+        )
+        self.assertEqual(1, res.json["total"])
+
+        self.client.put(
+            url_prefix + "/users/%s/promote" % self.user_public_id,
+            headers={"Authorization": f"Bearer {self.admin_token}"},
+        )
+        res = self.client.get(
+            url_prefix + "/users?page=1&admin=true",
+            headers={"Authorization": f"Bearer {self.admin_token}"},
+        )
+        self.assertEqual(2, res.json["total"], "Promoted user should be counted")
+        res = self.client.get(
+            url_prefix + "/users?page=1&admin=false",
+            headers={"Authorization": f"Bearer {self.admin_token}"},
+        )
+        self.assertEqual(404, res.status_code, "Cached total should be invalidated")
+
+    def test_get_users_with_cursor_returns_next_cursor(self):
+        for i in range(30):
+            self.create_user("user%s" % i, "1234")
+
+        res = self.client.get(
+            url_prefix + "/users?sort=username&cursor=",
+            headers={"Authorization": f"Bearer {self.admin_token}"},
+        )
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(25, len(res.json["users"]))
+        self.assertEqual("admin", res.json["users"][0]["username"])
+
+        res = self.client.get(
+            url_prefix + "/users?sort=username&cursor=%s" % res.json["next_cursor"],
+            headers={"Authorization": f"Bearer {self.admin_token}"},
+        )
+        self.assertEqual(6, len(res.json["users"]))
+        self.assertEqual(None, res.json["next_cursor"], "Last page has no cursor")
+
+    def test_delete_user_removes_their_likes_from_movies(self):
+        self.create_user("created", "1234", "created")
+        with self.app.app_context():
+            movie = Movie(title="Movie Title", release_year=2011)
+            user = UserProfile.query.filter_by(username="created").first()
+            user.liked_movies.append(movie)
+            self.db.session.commit()
+            movie_id = movie.id
+
+        self.client.delete(
+            url_prefix + "/users/%s" % self.user_public_id,
+            headers={"Authorization": f"Bearer {self.admin_token}"},
+        )
+
+        with self.app.app_context():
+            movie = Movie.query.get(movie_id)
+            self.assertEqual(0, movie.like_count, "Deleted user's like should go")
+
+    def test_reconcile_likes_fixes_drifted_counts(self):
+        with self.app.app_context():
+            movie = Movie(title="Movie Title", release_year=2011)
+            admin = UserProfile.query.filter_by(username="admin").first()
+            admin.liked_movies.append(movie)
+            self.db.session.add(Movie(title="Another Title", release_year=2011))
+            self.db.session.commit()
+            movie.like_count = 5
+            self.db.session.commit()
+            movie_id = movie.id
+
+        res = self.client.post(
+            url_prefix + "/movies/likes/reconcile",
+            headers={"Authorization": f"Bearer {self.admin_token}"},
+        )
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(2, res.json["movies"])
+        self.assertEqual(1, res.json["drifted"])
+        self.assertEqual(4, res.json["drift"])
+
+        with self.app.app_context():
+            self.assertEqual(1, Movie.query.get(movie_id).like_count)
+
+    def test_demoted_admin_loses_access_with_same_token(self):
+        self.create_user("other_admin", "1234", "Other Admin", admin=True)
+        res = self.client.get(
+            auth_prefix + "/login",
+            headers={"Authorization": get_basic_auth("other_admin:1234")},
+        )
+        token = res.json["token"]
+
+        res = self.client.get(
+            url_prefix + "/users",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        self.assertEqual(200, res.status_code)
+
+        self.client.put(
+            url_prefix + "/users/%s/demote" % self.user_public_id,
+            headers={"Authorization": f"Bearer {self.admin_token}"},
+        )
+        res = self.client.get(
+            url_prefix + "/users",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        self.assertEqual(403, res.status_code, "Demoted user's token isn't admin")
+
+    def test_bulk_import_users_returns_created(self):
+        users = [
+            {"username": "user%s" % i, "password": "1234", "name": "User %s" % i}
+            for i in range(3)
+        ]
+        res = self.client.post(
+            url_prefix + "/users/bulk",
+            headers={"Authorization": f"Bearer {self.admin_token}"},
+            json={"users": users},
+        )
+        self.assertEqual(201, res.status_code, "Bulk import should return 201")
+        self.assertEqual(3, len(res.json["users"]))
+
+        authorization = get_basic_auth("user1:1234")
+        res = self.client.get(
+            auth_prefix + "/login", headers={"Authorization": authorization}
+        )
+        self.assertEqual(200, res.status_code, "Imported user should be able to login")
+
+    def test_bulk_import_existing_users_returns_error(self):
+        users = [
+            {"username": "admin", "password": "1234"},
+            {"username": "new", "password": "1234"},
+            {"username": "new", "password": "1234"},
+        ]
+        res = self.client.post(
+            url_prefix + "/users/bulk",
+            headers={"Authorization": f"Bearer {self.admin_token}"},
+            json={"users": users},
+        )
+        self.assertEqual(422, res.status_code)
+        self.assertIn("'admin', 'new'", res.json["description"])
+
+        with self.app.app_context():
+            self.assertEqual(1, UserProfile.query.count(), "No user should be created")
+
+    def test_bulk_import_users_checks_the_passwords(self):
+        headers = {"Authorization": f"Bearer {self.admin_token}"}
+        res = self.client.post(
+            url_prefix + "/users/bulk",
+            headers=headers,
+            json={
+                "users": [
+                    {"username": "a", "password_hash": generate_password_hash("1")},
+                    {"username": "b", "password_hash": "1234"},
+                    {"username": "c", "password_hash": "md5$salt$abc"},
+                ]
+            },
+        )
+        self.assertEqual(422, res.status_code)
+        self.assertIn("[1, 2]", res.json["description"])
+
+        users = [
+            {"username": "user%s" % i, "password": "1234"}
+            for i in range(config.BULK_IMPORT_MAX_PASSWORDS + 1)
+        ]
+        res = self.client.post(
+            url_prefix + "/users/bulk", headers=headers, json={"users": users}
+        )
+        self.assertEqual(422, res.status_code, "Too many plaintext passwords")
+
+        with mock.patch.object(
+            password, "password_pool", PasswordPool(workers=0, max_pending=1)
+        ):
+            res = self.client.post(
+                url_prefix + "/users/bulk", headers=headers, json={"users": users[:2]}
+            )
+        self.assertEqual(503, res.status_code, "Over the password hashing slots")
+
+        with self.app.app_context():
+            self.assertEqual(1, UserProfile.query.count(), "No user should be created")
+
+    def test_admin_request_with_profile_header_is_profiled(self):
+        admin_auth = {"Authorization": f"Bearer {self.admin_token}"}
+        res = self.client.get(
+            movie_prefix + "?sort=title", headers={"X-Profile": "1", **admin_auth}
+        )
+        self.assertEqual(200, res.status_code)
+        self.assertIn("X-Profile-Id", res.headers)
+
+        res = self.client.get(
+            url_prefix + "/profiles/%s" % res.headers["X-Profile-Id"],
+            headers=admin_auth,
+        )
+        self.assertEqual(200, res.status_code)
+        self.assertEqual("sort=title", res.json["query_string"])
+        self.assertIn("get_all_movies", res.json["stats"])
+
+        res = self.client.get(url_prefix + "/profiles/unknown", headers=admin_auth)
+        self.assertEqual(404, res.status_code)
+
+    def test_profiles_in_a_directory_are_shared_by_the_processes(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        admin_auth = {"Authorization": f"Bearer {self.admin_token}"}
+
+        self.app.extensions["profiles"] = ProfileStore(size=2, directory=directory.name)
+        profile_ids = [
+            self.client.get(
+                movie_prefix, headers={"X-Profile": "1", **admin_auth}
+            ).headers["X-Profile-Id"]
+            for _ in range(3)
+        ]
+        self.assertEqual(2, len(os.listdir(directory.name)), "Latest profiles kept")
+
+        # a store of another process, reading the same directory
+        self.app.extensions["profiles"] = ProfileStore(directory=directory.name)
+        res = self.client.get(
+            url_prefix + "/profiles/%s" % profile_ids[-1], headers=admin_auth
+        )
+        self.assertEqual(200, res.status_code)
+        self.assertIn("get_all_movies", res.json["stats"])
+
+        for profile_id in ["../" + profile_ids[-1], "unknown"]:
+            res = self.client.get(
+                url_prefix + "/profiles/%s" % profile_id, headers=admin_auth
+            )
+            self.assertEqual(404, res.status_code)
+
+    def test_profile_header_is_ignored_for_users_and_over_the_cap(self):
+        self.create_user("user", "1234")
+        self._set_login_info()
+        res = self.client.get(
+            movie_prefix,
+            headers={"X-Profile": "1", "Authorization": self.authorization},
+        )
+        self.assertNotIn("X-Profile-Id", res.headers, "Only admins are profiled")
+
+        self.app.extensions["profiles"] = ProfileStore(max_concurrent=0)
+        res = self.client.get(
+            movie_prefix,
+            headers={"X-Profile": "1", "Authorization": f"Bearer {self.admin_token}"},
+        )
+        self.assertEqual(200, res.status_code)
+        self.assertNotIn("X-Profile-Id", res.headers, "Profiles over the cap")
@@ -1,11 +1,20 @@
+import datetime
+from unittest import mock
+
 import jwt
 
 import config
 
 from flask import json
+from werkzeug.security import generate_password_hash, check_password_hash
 
+from api import password
+from api.password import PasswordPool, PasswordPoolSaturated
 from api.route.auth import url_prefix
+from api.route.revocation import RevocationMap
+from api.route.movie import url_prefix as movie_prefix
 from test.base_test import BaseTest, get_bearer, get_basic_auth
+from api.model.auth import JWTWhitelist
 from api.model.user_profile import UserProfile
 
 
@@ -32,6 +41,7 @@ class TestAuth(BaseTest):
         )
         self.assertEqual(new_user["username"], payload["username"])
         self.assertEqual(new_user["name"], payload["name"])
+        self.assertNotIn("token_version", new_user, "Token version is internal")
 
     def test_register_user_with_same_username_returns_integrity_error(self):
         payload = {
@@ -194,3 +204,122 @@ class TestAuth(BaseTest):
             url_prefix + "/logout", headers={"Authorization": authorization}
         )
         self.assertEqual(200, res.status_code)
+
+
+class TestStatelessAuth(BaseTest):
+    def setUp(self) -> None:
+        super().setUp()
+        patcher = mock.patch.object(config, "STATELESS_TOKENS", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.create_user("normal_user", "1234", "Normal User")
+        self._set_login_info()
+
+    def test_login_does_not_whitelist_the_token(self):
+        with self.app.app_context():
+            self.assertEqual(0, JWTWhitelist.query.count())
+
+        res = self.client.get(
+            movie_prefix, headers={"Authorization": self.authorization}
+        )
+        self.assertEqual(200, res.status_code, "Stateless token should be valid")
+
+    def test_logout_revokes_the_token(self):
+        res = self.client.get(
+            url_prefix + "/logout", headers={"Authorization": self.authorization}
+        )
+        self.assertEqual(200, res.status_code)
+        self.assertEqual("User logged out", res.json["message"])
+
+        res = self.client.get(
+            movie_prefix, headers={"Authorization": self.authorization}
+        )
+        self.assertEqual(401, res.status_code, "Logged out token should be revoked")
+
+        self._set_login_info()
+        res = self.client.get(
+            movie_prefix, headers={"Authorization": self.authorization}
+        )
+        self.assertEqual(200, res.status_code, "New login should issue a valid token")
+
+    def test_revocations_are_loaded_from_the_database(self):
+        self.client.get(
+            url_prefix + "/logout", headers={"Authorization": self.authorization}
+        )
+
+        with self.app.app_context():
+            # a fresh process only knows the revocations through the database
+            self.app.extensions.pop("token_revocations")
+            self.app.extensions.pop("auth_cache")
+
+        res = self.client.get(
+            movie_prefix, headers={"Authorization": self.authorization}
+        )
+        self.assertEqual(401, res.status_code, "Logged out token should be revoked")
+
+    def test_revocations_older_than_the_token_lifetime_are_evicted(self):
+        revocations = RevocationMap(refresh_interval=0)
+        now = datetime.datetime.utcnow()
+        with self.app.app_context():
+            revocations.refresh()
+            revocations._revoke("old", 1, now - datetime.timedelta(hours=25))
+            revocations.revoke("recent", 1)
+
+            with mock.patch.object(config, "JWT_LIFETIME_HOURS", 24):
+                revocations.refresh()
+
+            self.assertEqual(["recent"], list(revocations._versions))
+            self.assertTrue(revocations.is_revoked({"public_id": "recent", "ver": 0}))
+
+
+class TestPasswordPool(BaseTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.create_user("normal_user", "1234", "Normal User")
+
+    def test_password_pool_hashes_in_worker_processes(self):
+        pool = PasswordPool(workers=1, max_pending=2)
+        self.addCleanup(pool.shutdown)
+
+        password_hash = pool.run(generate_password_hash, "1234")
+        self.assertTrue(check_password_hash(password_hash, "1234"))
+        self.assertEqual(0, pool.queue_depth)
+        self.assertNotEqual(
+            "fork",
+            pool._get_executor()._mp_context.get_start_method(),
+            "Forking the threaded server could copy a held lock",
+        )
+
+    def test_password_pool_maps_only_with_a_slot_for_each_item(self):
+        pool = PasswordPool(workers=1, max_pending=2)
+        self.addCleanup(pool.shutdown)
+
+        password_hashes = pool.map(generate_password_hash, ["12", "34"])
+        self.assertTrue(check_password_hash(password_hashes[1], "34"))
+        with self.assertRaises(PasswordPoolSaturated):
+            pool.map(generate_password_hash, ["12", "34", "56"])
+        self.assertEqual(0, pool.queue_depth)
+        self.assertEqual(1, len(pool.map(generate_password_hash, ["78"])))
+
+    def test_saturated_password_pool_returns_service_unavailable(self):
+        with mock.patch.object(
+            password, "password_pool", PasswordPool(workers=0, max_pending=0)
+        ):
+            authorization = get_basic_auth("%s:%s" % (self.username, self.password))
+            res = self.client.get(
+                url_prefix + "/login", headers={"Authorization": authorization}
+            )
+            self.assertEqual(503, res.status_code, "Saturated login should be 503")
+            self.assertEqual(
+                str(config.PASSWORD_HASH_RETRY_AFTER), res.headers["Retry-After"]
+            )
+
+            payload = {"username": "another_user", "password": "1234"}
+            res = self.client.post(url_prefix + "/register", json=payload)
+            self.assertEqual(503, res.status_code, "Saturated register should be 503")
+
+        with self.app.app_context():
+            self.assertEqual(
+                None, UserProfile.query.filter_by(username="another_user").first()
+            )
@@ -0,0 +1,105 @@
+import threading
+
+from api.job.token_purge import purge_expired_tokens
+from api.metrics import Metrics
+from api.route.movie import url_prefix as movie_prefix
+from test.base_test import BaseTest
+
+
+class TestMetrics(BaseTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.create_user("User", "1234")
+        self._set_login_info()
+
+    def test_metrics_count_the_requests_per_endpoint(self):
+        for _ in range(2):
+            self.client.get(movie_prefix, headers={"Authorization": self.authorization})
+        self.client.get(movie_prefix)
+
+        res = self.client.get("/metrics")
+        self.assertEqual(200, res.status_code)
+        self.assertTrue(res.content_type.startswith("text/plain"))
+
+        lines = res.get_data(as_text=True).splitlines()
+        self.assertIn(
+            'http_requests_total{endpoint="movies.get_all_movies",method="GET",'
+            'status="200"} 2',
+            lines,
+        )
+        self.assertIn(
+            'http_requests_total{endpoint="movies.get_all_movies",method="GET",'
+            'status="401"} 1',
+            lines,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_count{endpoint="movies.get_all_movies"} 3',
+            lines,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_bucket{endpoint="movies.get_all_movies",'
+            'le="+Inf"} 3',
+            lines,
+        )
+        self.assertIn("auth_cache_hits_total 1", lines)
+        self.assertIn("auth_cache_misses_total 1", lines)
+        self.assertIn("password_hash_queue_depth 0", lines)
+        self.assertIn("token_purge_runs_total 0", lines)
+        self.assertTrue(
+            any(
+                line.startswith("db_pool_checkout_wait_seconds_count") for line in lines
+            )
+        )
+
+    def test_metrics_of_every_thread_are_added_up(self):
+        metrics = Metrics(buckets=[0.1, 1])
+
+        def record():
+            for seconds in [0.05, 0.5, 5]:
+                metrics.record_request("movies.get_movie", "GET", 200, seconds)
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        collected = metrics.collect()
+        self.assertEqual(12, collected["requests"][("movies.get_movie", "GET", 200)])
+        histogram = collected["latencies"]["movies.get_movie"]
+        self.assertEqual([4, 4, 4], histogram.buckets)
+        self.assertEqual(12, histogram.count)
+
+    def test_metrics_of_ended_threads_are_retired(self):
+        metrics = Metrics(buckets=[0.1, 1])
+
+        def record():
+            metrics.record_request("movies.get_movie", "GET", 200, 0.05)
+
+        for _ in range(50):
+            thread = threading.Thread(target=record)
+            thread.start()
+            thread.join()
+            del thread
+
+        collected = metrics.collect()
+        self.assertLessEqual(len(metrics._threads), 1)
+        self.assertEqual(50, collected["requests"][("movies.get_movie", "GET", 200)])
+        self.assertEqual(50, collected["latencies"]["movies.get_movie"].count)
+
+    def test_metrics_are_forbidden_to_other_addresses(self):
+        res = self.client.get("/metrics", environ_base={"REMOTE_ADDR": "10.0.0.7"})
+        self.assertEqual(403, res.status_code)
+
+    def test_metrics_expose_the_token_purge_totals(self):
+        with self.app.app_context():
+            purge_expired_tokens()
+
+        res = self.client.get("/metrics")
+        lines = res.get_data(as_text=True).splitlines()
+        self.assertIn("token_purge_runs_total 1", lines)
+        self.assertIn('token_purge_rows_total{table="jwt_whitelist"} 0', lines)
+        self.assertIn('token_purge_rows_total{table="token_revocation"} 0', lines)
+        self.assertTrue(
+            any(line.startswith("token_purge_seconds_total ") for line in lines)
+        )
@@ -1,4 +1,8 @@
-from api.model.movie import Movie
+from unittest import mock
+
+import config
+from api.model.facets import refresh_year_counts
+from api.model.movie import Movie, get_or_create_genres
 from api.route.movie import url_prefix
 from test.base_test import BaseTest
 
@@ -46,6 +50,9 @@ class TestMovie(BaseTest):
         )
         movie = res.get_json()
         self.assertEqual(self.movie_title, movie["title"])
+        self.assertNotIn("tconst", movie, "The sync columns are internal")
+        self.assertNotIn("content_hash", movie)
+        self.assertNotIn("normalized_title", movie, "The search column is internal")
 
     def test_unauthenticated_user_fetch_one_movie_returns_unauthorized(self):
         res = self.client.get(
@@ -174,3 +181,475 @@ class TestMovie(BaseTest):
             res.status_code,
             "Liking a movie that doesn't exist should return 404",
         )
+
+    def test_user_get_movies_page_returns_totals(self):
+        with self.app.app_context():
+            for i in range(30):
+                self.db.session.add(Movie(title="Movie %s" % i, release_year=2010))
+            self.db.session.commit()
+
+        res = self.client.get(
+            url_prefix + "?page=2", headers={"Authorization": self.authorization}
+        )
+        self.assertEqual(200, res.status_code, "Fetching a page should return 200")
+        page = res.get_json()
+        self.assertEqual(31, page["total"], "Page should include the total of movies")
+        self.assertEqual(2, page["total_pages"])
+        self.assertEqual(6, len(page["movies"]))
+
+        res = self.client.get(
+            url_prefix + "?page=3", headers={"Authorization": self.authorization}
+        )
+        self.assertEqual(404, res.status_code, "Fetching past the last page is 404")
+
+    def test_user_get_filtered_movies_page_counts_only_matches(self):
+        res = self.client.get(
+            url_prefix + "?page=1&title=%20LORD%20",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(1, res.get_json()["total"])
+
+        res = self.client.get(
+            url_prefix + "?page=1&title=Matrix",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(404, res.status_code, "No matches should have no pages")
+
+    def test_user_get_movies_with_cursor_walks_every_movie_once(self):
+        with self.app.app_context():
+            for i in range(30):
+                self.db.session.add(Movie(title="Movie %s" % (i % 3), release_year=i))
+            self.db.session.commit()
+
+        titles = []
+        cursor = ""
+        while cursor is not None:
+            res = self.client.get(
+                url_prefix + "?sort=-title,release_year&cursor=%s" % cursor,
+                headers={"Authorization": self.authorization},
+            )
+            self.assertEqual(200, res.status_code, "Fetching a cursor returns 200")
+            page = res.get_json()
+            self.assertEqual(31, page["total"])
+            titles += [(m["title"], m["release_year"]) for m in page["movies"]]
+            cursor = page["next_cursor"]
+
+        self.assertEqual(31, len(titles), "Every movie should be listed once")
+        self.assertEqual(
+            sorted(titles, key=lambda m: (m[0], -m[1]), reverse=True), titles
+        )
+
+    def test_user_get_movies_with_invalid_cursor_returns_bad_request(self):
+        res = self.client.get(
+            url_prefix + "?cursor=not-a-cursor",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(400, res.status_code, "Invalid cursor should return 400")
+
+    def test_user_get_movies_sorted_by_likes_orders_every_page(self):
+        with self.app.app_context():
+            for i in range(30):
+                self.db.session.add(Movie(title="Movie %s" % i, release_year=2010))
+            self.db.session.commit()
+            liked_id = Movie.query.filter_by(title="Movie 29").first().public_id
+
+        self.client.put(
+            url_prefix + "/%s/like" % liked_id,
+            headers={"Authorization": self.authorization},
+        )
+
+        res = self.client.get(
+            url_prefix + "?page=1&sort=-likes",
+            headers={"Authorization": self.authorization},
+        )
+        movies = res.get_json()["movies"]
+        self.assertEqual("Movie 29", movies[0]["title"], "Most liked movie goes first")
+        self.assertEqual(1, movies[0]["likes"])
+
+        res = self.client.get(
+            url_prefix + "?sort=likes", headers={"Authorization": self.authorization}
+        )
+        movies = res.get_json()
+        self.assertEqual(31, len(movies))
+        self.assertEqual("Movie 29", movies[-1]["title"], "Most liked movie goes last")
+
+    def test_movie_routes_run_a_fixed_number_of_queries(self):
+        with self.app.app_context():
+            for i in range(30):
+                self.db.session.add(Movie(title="Movie %s" % i, release_year=2010))
+            self.db.session.commit()
+
+        # authorizing the first request queries the token and its user, the
+        # genres of the page are loaded at once
+        with self.assertMaxQueries(5):
+            self.client.get(
+                url_prefix + "?page=1&sort=-likes",
+                headers={"Authorization": self.authorization},
+            )
+
+        with self.assertMaxQueries(2):
+            self.client.get(url_prefix, headers={"Authorization": self.authorization})
+
+        # the movie, the liked movies, the like and its count, the reloaded movie
+        with self.assertMaxQueries(5):
+            self.client.put(
+                url_prefix + "/%s/like" % self.movie_id,
+                headers={"Authorization": self.authorization},
+            )
+
+    def test_query_stats_headers_are_added_when_enabled(self):
+        res = self.client.get(url_prefix, headers={"Authorization": self.authorization})
+        self.assertNotIn("X-DB-Queries", res.headers)
+
+        with mock.patch.object(config, "QUERY_STATS_HEADERS", True):
+            res = self.client.get(
+                url_prefix, headers={"Authorization": self.authorization}
+            )
+
+        self.assertEqual("2", res.headers["X-DB-Queries"])
+        self.assertGreaterEqual(float(res.headers["X-DB-Time"]), 0)
+
+    def test_user_search_movies_ignores_accents_and_case(self):
+        with self.app.app_context():
+            self.db.session.add(
+                Movie(title="Le Fabuleux Destin d'Amélie Poulain", release_year=2001)
+            )
+            self.db.session.add(Movie(title="AMELIA", release_year=2009))
+            self.db.session.add(Movie(title="The Lord of War", release_year=2005))
+            self.db.session.commit()
+
+        res = self.client.get(
+            url_prefix + "?q=amelie", headers={"Authorization": self.authorization}
+        )
+        self.assertEqual(
+            ["Le Fabuleux Destin d'Amélie Poulain"],
+            [movie["title"] for movie in res.get_json()],
+        )
+
+        res = self.client.get(
+            url_prefix + "?title=AMÉL", headers={"Authorization": self.authorization}
+        )
+        self.assertEqual(2, len(res.get_json()), "Title filter ignores accents too")
+
+    def test_user_search_movies_ranks_by_relevance(self):
+        with self.app.app_context():
+            self.db.session.add(
+                Movie(title="Return of the King of the Lord", release_year=2003)
+            )
+            self.db.session.add(Movie(title="Lord Lord Lord", release_year=2010))
+            self.db.session.commit()
+
+        res = self.client.get(
+            url_prefix + "?q=lord&page=1",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(3, res.json["total"])
+        self.assertEqual("Lord Lord Lord", res.json["movies"][0]["title"])
+
+        res = self.client.get(
+            url_prefix + "?q=lord%20of%20the%20ri",
+            headers={"Authorization": self.authorization},
+        )
+        titles = [movie["title"] for movie in res.get_json()]
+        self.assertEqual(["The Lord of the Rings"], titles, "Last word is a prefix")
+
+        res = self.client.get(
+            url_prefix + "?q=lord&cursor=",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(3, res.json["count"])
+
+    def test_user_suggest_movies_ranks_prefix_matches_by_likes(self):
+        with self.app.app_context():
+            self.db.session.add(
+                Movie(title="The Lord of War", release_year=2005, like_count=3)
+            )
+            self.db.session.add(
+                Movie(title="Thé Lobster", release_year=2015, like_count=7)
+            )
+            self.db.session.add(Movie(title="Lord Jim", release_year=1965))
+            self.db.session.commit()
+
+        res = self.client.get(
+            url_prefix + "/suggest?prefix=THE%20LO",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(200, res.status_code)
+        self.assertEqual("the lo", res.json["prefix"])
+        self.assertEqual(
+            ["Thé Lobster", "The Lord of War", "The Lord of the Rings"],
+            [suggestion["title"] for suggestion in res.json["suggestions"]],
+        )
+
+        res = self.client.get(
+            url_prefix + "/suggest?prefix=the%20lord%20&limit=1",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(
+            ["The Lord of War"],
+            [suggestion["title"] for suggestion in res.json["suggestions"]],
+        )
+
+        res = self.client.get(
+            url_prefix + "/suggest?prefix=%20",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(422, res.status_code, "Suggestions need a prefix")
+
+    def test_user_filter_movies_by_fuzzy_title_tolerates_typos(self):
+        with self.app.app_context():
+            self.db.session.add(Movie(title="The Lord of War", release_year=2005))
+            self.db.session.add(Movie(title="The Godfather", release_year=1972))
+            self.db.session.commit()
+
+        res = self.client.get(
+            url_prefix + "?title=lord%20of%20the%20rngs",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual([], res.get_json(), "The title filter is exact")
+
+        res = self.client.get(
+            url_prefix + "?title_fuzzy=LORD%20OF%20THE%20RNGS",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(
+            ["The Lord of the Rings"], [movie["title"] for movie in res.get_json()]
+        )
+
+        res = self.client.get(
+            url_prefix + "?title_fuzzy=lord%20of%20wr&page=1",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(2, res.json["total"])
+        self.assertEqual(
+            ["The Lord of War", "The Lord of the Rings"],
+            [movie["title"] for movie in res.json["movies"]],
+            "Fewest typos first",
+        )
+
+        res = self.client.get(
+            url_prefix + "?title_fuzzy=godfater&cursor=",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(["The Godfather"], [m["title"] for m in res.json["movies"]])
+
+    def test_user_filter_movies_by_fuzzy_title_returns_every_match(self):
+        with self.app.app_context():
+            for number in range(150):
+                self.db.session.add(Movie(title=f"Lovers {number}", release_year=2000))
+            self.db.session.add(Movie(title="Lobers Lane", release_year=2000))
+            self.db.session.commit()
+
+        res = self.client.get(
+            url_prefix + "?title_fuzzy=lovers&page=7",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(151, res.json["total"])
+        self.assertEqual(["Lobers Lane"], [m["title"] for m in res.json["movies"]])
+
+        with mock.patch.object(config, "FUZZY_MAX_CANDIDATES", 100):
+            res = self.client.get(
+                url_prefix + "?title_fuzzy=overs&page=6",
+                headers={"Authorization": self.authorization},
+            )
+        self.assertEqual(150, res.json["total"], "Too broad, matched without typos")
+        self.assertEqual(
+            ["Lovers %d" % number for number in range(125, 150)],
+            [m["title"] for m in res.json["movies"]],
+        )
+
+    def test_user_filter_movies_by_release_year_range(self):
+        with self.app.app_context():
+            self.db.session.add(Movie(title="The Godfather", release_year=1972))
+            self.db.session.add(Movie(title="Spirited Away", release_year=2001))
+            self.db.session.commit()
+
+        res = self.client.get(
+            url_prefix + "?release_year_min=1980&release_year_max=2001&sort=title",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(
+            ["Spirited Away", "The Lord of the Rings"],
+            [movie["title"] for movie in res.get_json()],
+        )
+
+        res = self.client.get(
+            url_prefix + "?release_year=abc",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(200, res.status_code, "Invalid years are ignored")
+        self.assertEqual(3, len(res.get_json()))
+
+    def test_user_pages_release_year_range_after_the_unfiltered_listing(self):
+        with self.app.app_context():
+            for number in range(30):
+                self.db.session.add(
+                    Movie(title="Movie %s" % number, release_year=1990 + number)
+                )
+            self.db.session.commit()
+
+        headers = {"Authorization": self.authorization}
+        res = self.client.get(url_prefix + "?page=1", headers=headers)
+        self.assertEqual(31, res.json["total"])
+
+        res = self.client.get(
+            url_prefix + "?page=1&release_year_min=2015", headers=headers
+        )
+        self.assertEqual(5, res.json["total"], "Filtered totals aren't shared")
+        self.assertEqual(1, res.json["total_pages"])
+        self.assertEqual(5, len(res.json["movies"]))
+
+        res = self.client.get(
+            url_prefix + "?cursor=&release_year_min=2001&release_year_max=2005",
+            headers=headers,
+        )
+        self.assertEqual(6, res.json["total"])
+
+    def test_user_get_movie_facets_counts_by_year_and_decade(self):
+        with self.app.app_context():
+            for title, release_year in [
+                ("The Godfather", 1972),
+                ("The Godfather Part II", 1974),
+                ("Spirited Away", 2001),
+            ]:
+                self.db.session.add(Movie(title=title, release_year=release_year))
+            self.db.session.flush()
+            refresh_year_counts()
+            self.db.session.commit()
+
+        res = self.client.get(
+            url_prefix + "/facets", headers={"Authorization": self.authorization}
+        )
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(4, res.json["total"])
+        self.assertEqual(
+            [
+                {"release_year": 1972, "movies": 1},
+                {"release_year": 1974, "movies": 1},
+                {"release_year": 2001, "movies": 2},
+            ],
+            res.json["release_years"],
+        )
+        self.assertEqual(
+            [{"decade": 1970, "movies": 2}, {"decade": 2000, "movies": 2}],
+            res.json["decades"],
+        )
+
+        res = self.client.get(
+            url_prefix + "/facets?release_year_max=2000",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual([{"decade": 1970, "movies": 2}], res.json["decades"])
+
+        res = self.client.get(
+            url_prefix + "/facets?title=godfather&release_year_min=1973",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(
+            [{"release_year": 1974, "movies": 1}], res.json["release_years"]
+        )
+
+        res = self.client.get(
+            url_prefix + "/facets?q=spirited",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(1, res.json["total"])
+
+    def test_user_pages_genres_after_the_unfiltered_listing(self):
+        with self.app.app_context():
+            for number in range(30):
+                genres = ["Drama", "Crime"] if number < 3 else ["Comedy"]
+                if number == 0:
+                    genres = ["Drama"]
+                self.db.session.add(
+                    Movie(
+                        title="Movie %s" % number,
+                        release_year=2000,
+                        genres=get_or_create_genres(genres),
+                    )
+                )
+            self.db.session.commit()
+
+        headers = {"Authorization": self.authorization}
+        res = self.client.get(url_prefix + "?page=1", headers=headers)
+        self.assertEqual(31, res.json["total"])
+
+        for query_string, total in [
+            ("genre=Drama", 3),
+            ("genre=Drama,Crime&genre_match=all", 2),
+            ("genre=Drama,Crime", 3),
+        ]:
+            res = self.client.get(
+                url_prefix + "?page=1&" + query_string, headers=headers
+            )
+            self.assertEqual(total, res.json["total"], query_string)
+            self.assertEqual(total, len(res.json["movies"]), query_string)
+
+            res = self.client.get(
+                url_prefix + "?cursor=&" + query_string, headers=headers
+            )
+            self.assertEqual(total, res.json["total"], query_string)
+
+        res = self.client.get(url_prefix + "?page=1&genre=x", headers=headers)
+        self.assertEqual(404, res.status_code, "No movies of an unknown genre")
+        res = self.client.get(url_prefix + "?cursor=&genre=x", headers=headers)
+        self.assertEqual(0, res.json["total"])
+
+    def test_user_filter_movies_by_genres(self):
+        with self.app.app_context():
+            for title, release_year, genres in [
+                ("The Godfather", 1972, ["Crime", "Drama"]),
+                ("Spirited Away", 2001, ["Animation", "Family"]),
+                ("City of God", 2002, ["Crime", "Drama"]),
+                ("Amores Perros", 2000, ["Drama"]),
+            ]:
+                self.db.session.add(
+                    Movie(
+                        title=title,
+                        release_year=release_year,
+                        genres=get_or_create_genres(genres),
+                    )
+                )
+            self.db.session.commit()
+
+        def titles(query_string):
+            res = self.client.get(
+                url_prefix + "?sort=title&" + query_string,
+                headers={"Authorization": self.authorization},
+            )
+            return [movie["title"] for movie in res.get_json()]
+
+        self.assertEqual(
+            ["Amores Perros", "City of God", "Spirited Away", "The Godfather"],
+            titles("genre=drama,Family"),
+        )
+        self.assertEqual(
+            ["City of God", "The Godfather"],
+            titles("genre=Drama,Crime&genre_match=all"),
+        )
+        self.assertEqual([], titles("genre=Drama,Western&genre_match=all"))
+        self.assertEqual(
+            ["Amores Perros", "City of God"],
+            titles("genre=Drama&release_year_min=2000&release_year_max=2002"),
+        )
+
+        with mock.patch.object(config, "GENRE_FILTER_MAX_IDS", 0):
+            self.assertEqual(
+                ["City of God", "The Godfather"],
+                titles("genre=Drama,Crime&genre_match=all"),
+                "Too many movies to list join the genres",
+            )
+            self.assertEqual(["City of God"], titles("genre=crime&release_year=2002"))
+
+        res = self.client.get(
+            url_prefix + "?genre=Animation",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(["Animation", "Family"], res.get_json()[0]["genres"])
+
+        res = self.client.get(
+            url_prefix + "/facets?genre=Drama",
+            headers={"Authorization": self.authorization},
+        )
+        self.assertEqual(3, res.json["total"])
@@ -190,3 +190,24 @@ class TestUser(BaseTest):
 
         movies = res.get_json()
         self.assertEqual(1, len(movies))
+
+    def test_retrieve_liked_movies_queries_do_not_grow_with_the_movies(self):
+        with self.app.app_context():
+            user = UserProfile.query.filter_by(username=self.username).first()
+            for i in range(10):
+                user.liked_movies.append(Movie(title="Movie %s" % i, release_year=2010))
+            self.db.session.commit()
+
+        # the token and its user are queried once, then cached
+        with self.assertMaxQueries(4):
+            res = self.client.get(
+                url_prefix + "/%s/movies" % self.user_public_id,
+                headers={"Authorization": self.authorization},
+            )
+        self.assertEqual(10, len(res.get_json()))
+
+        with self.assertMaxQueries(1):
+            self.client.get(
+                url_prefix + "/%s" % self.user_public_id,
+                headers={"Authorization": self.authorization},
+            )